@@ -0,0 +1,154 @@
+"""
+Buffered access counters for public handover and welcome-pack tokens.
+
+Public pages used to save the token on every view, turning each read into a
+write. With buffering enabled, a page view only appends (id, time) to an
+access log in the shared cache: ``cache.incr`` hands out a sequence number and
+the entry is stored under it. ``flush_access_counts`` (run periodically by the
+``flush_token_access`` command) reads all entries written since the last flush
+and applies them with one UPDATE per token model, so the stored numbers lag by
+at most the flush interval.
+
+Buffering needs a cache shared by all processes (Redis); with the per-process
+LocMem cache the flusher could not see the web workers' entries, so accesses
+are written straight to the database with an atomic F() update instead.
+"""
+
+import logging
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .models import HandoverToken, WelcomePackToken
+
+logger = logging.getLogger(__name__)
+
+# Entries stay in the cache long enough to survive a stopped flusher for a while
+ENTRY_TIMEOUT = 7 * 24 * 3600
+FLUSH_BATCH_SIZE = 1000
+# Trailing sequence numbers that may still be waiting for their entry to be stored
+IN_FLIGHT_WINDOW = 50
+
+
+def buffering_enabled():
+    return getattr(settings, 'TOKEN_ACCESS_BUFFERING', False)
+
+
+# kind -> (token model, field the buffered ids refer to). Handover accesses are
+# counted per handover so signed links, which have no token row, count too.
+TOKEN_MODELS = {
+    'handover': (HandoverToken, 'handover_id'),
+    'welcome_pack': (WelcomePackToken, 'id'),
+}
+
+
+def _sequence_key(kind):
+    return f'token_access:{kind}:seq'
+
+
+def _flushed_key(kind):
+    return f'token_access:{kind}:flushed'
+
+
+def _waiting_key(kind):
+    return f'token_access:{kind}:waiting'
+
+
+def _entry_key(kind, number):
+    return f'token_access:{kind}:{number}'
+
+
+def record_access(kind, object_id, now=None):
+    """Count one access: a handover id for 'handover', a token id for 'welcome_pack'"""
+    now = now or timezone.now()
+    if buffering_enabled():
+        try:
+            cache.add(_sequence_key(kind), 0, None)
+            number = cache.incr(_sequence_key(kind))
+            cache.set(_entry_key(kind, number), (object_id, now.timestamp()), ENTRY_TIMEOUT)
+            return
+        except Exception as e:
+            logger.warning(f"Could not buffer {kind} token access, writing directly: {e}")
+
+    model, field = TOKEN_MODELS[kind]
+    model.objects.filter(**{field: object_id}).update(
+        access_count=F('access_count') + 1,
+        last_accessed=now,
+    )
+
+
+def flush_access_counts():
+    """
+    Apply buffered accesses to the database.
+    Returns {kind: number of accesses flushed}.
+    """
+    flushed = {}
+    for kind, (model, field) in TOKEN_MODELS.items():
+        flushed[kind] = _flush_kind(kind, model, field)
+    return flushed
+
+
+def _flush_kind(kind, model, field):
+    last = cache.get(_sequence_key(kind)) or 0
+    start = (cache.get(_flushed_key(kind)) or 0) + 1
+    if start > last:
+        return 0
+
+    entries = {}
+    for batch_start in range(start, last + 1, FLUSH_BATCH_SIZE):
+        keys = {
+            _entry_key(kind, number): number
+            for number in range(batch_start, min(batch_start + FLUSH_BATCH_SIZE, last + 1))
+        }
+        for key, entry in cache.get_many(list(keys)).items():
+            entries[keys[key]] = entry
+
+    # A number near the end without an entry is most likely a page view that
+    # has incremented the sequence but not stored its entry yet: stop before
+    # it and pick it up next time. If it is still missing on the next pass, or
+    # it is older than the window, the entry is lost (expired or never written).
+    waiting = cache.get(_waiting_key(kind))
+    for number in range(max(start, last - IN_FLIGHT_WINDOW + 1), last + 1):
+        if number not in entries and number != waiting:
+            cache.set(_waiting_key(kind), number, None)
+            last = number - 1
+            break
+    missing = sum(1 for number in range(start, last + 1) if number not in entries)
+
+    counts, last_seen = {}, {}
+    for number in range(start, last + 1):
+        if number in entries:
+            object_id, timestamp = entries[number]
+            counts[object_id] = counts.get(object_id, 0) + 1
+            last_seen[object_id] = max(last_seen.get(object_id, 0), timestamp)
+
+    if counts:
+        model.objects.filter(**{f'{field}__in': counts}).update(
+            access_count=F('access_count') + Case(
+                *[When(**{field: object_id}, then=Value(count)) for object_id, count in counts.items()],
+                default=Value(0),
+                output_field=IntegerField(),
+            ),
+            last_accessed=Case(
+                *[
+                    When(**{field: object_id}, then=Value(datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)))
+                    for object_id, timestamp in last_seen.items()
+                ],
+                default=F('last_accessed'),
+            ),
+        )
+
+    if last >= start:
+        # Only mark the range as flushed once the database has it
+        cache.set(_flushed_key(kind), last, None)
+        cache.delete_many([_entry_key(kind, number) for number in range(start, last + 1)])
+
+    if missing:
+        logger.warning(f"{missing} buffered {kind} token access(es) were missing from the cache")
+    total = sum(counts.values())
+    if total:
+        logger.info(f"Flushed {total} {kind} token access(es) for {len(counts)} token(s)")
+    return total
@@ -1,5 +1,9 @@
 from django.contrib import admin
-from .models import Employee, Asset, Handover, HandoverAsset, WelcomePack, EmailSettings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .models import Employee, Asset, Handover, HandoverAsset, WelcomePack, EmailSettings, OutboundEmail, HandoverReminder, InsightSnapshot
+from .reminders import queue_handover_reminders
+from .public_links import revoke_public_links
 
 @admin.register(Employee)
 class EmployeeAdmin(admin.ModelAdmin):
@@ -50,7 +54,22 @@ class HandoverAdmin(admin.ModelAdmin):
     list_filter = ['mode', 'status', 'created_at']
     search_fields = ['handover_id', 'employee__name']
     ordering = ['-created_at']
-    readonly_fields = ['handover_id', 'created_at', 'updated_at']
+    readonly_fields = ['handover_id', 'employee_signature_blob', 'it_signature_blob', 'created_at', 'updated_at']
+    actions = ['send_signature_reminders', 'revoke_links']
+    
+    def send_signature_reminders(self, request, queryset):
+        reminded = queue_handover_reminders(handovers=queryset, respect_schedule=False, sent_by=request.user)
+        skipped = queryset.count() - len(reminded)
+        message = f'{len(reminded)} signature reminder(s) queued.'
+        if skipped:
+            message += f' {skipped} handover(s) skipped (not pending or no employee email).'
+        self.message_user(request, message)
+    send_signature_reminders.short_description = 'Send signature reminder to employee'
+    
+    def revoke_links(self, request, queryset):
+        revoked = revoke_public_links(queryset)
+        self.message_user(request, f'Public signing links revoked for {revoked} handover(s).')
+    revoke_links.short_description = 'Revoke public signing links'
 
 @admin.register(HandoverAsset)
 class HandoverAssetAdmin(admin.ModelAdmin):
@@ -80,3 +99,43 @@ class EmailSettingsAdmin(admin.ModelAdmin):
             'fields': ('smtp_host', 'smtp_port', 'smtp_username', 'smtp_password', 'use_tls'),
         }),
     )
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'kind', 'status', 'attempts', 'next_attempt_at', 'sent_at', 'created_at']
+    list_filter = ['status', 'kind', 'created_at']
+    search_fields = ['subject', 'idempotency_key', 'last_error']
+    ordering = ['-created_at']
+    readonly_fields = ['idempotency_key', 'attempts', 'last_error', 'sent_at', 'created_at', 'updated_at']
+    actions = ['retry_now']
+    
+    def retry_now(self, request, queryset):
+        updated = skipped = 0
+        for email in queryset.exclude(status='sent'):
+            try:
+                with transaction.atomic():
+                    updated += OutboundEmail.objects.filter(id=email.id).update(
+                        status='queued', next_attempt_at=timezone.now(), attempts=0, last_error=''
+                    )
+            except IntegrityError:
+                # Another email with the same idempotency key is already pending
+                skipped += 1
+        message = f'{updated} email(s) queued for immediate delivery.'
+        if skipped:
+            message += f' {skipped} skipped: an email with the same key is already pending.'
+        self.message_user(request, message)
+    retry_now.short_description = 'Retry selected emails now'
+
+@admin.register(HandoverReminder)
+class HandoverReminderAdmin(admin.ModelAdmin):
+    list_display = ['handover', 'reminder_number', 'sent_to', 'sent_by', 'created_at']
+    list_filter = ['created_at']
+    search_fields = ['handover__handover_id', 'sent_to']
+    ordering = ['-created_at']
+    readonly_fields = ['created_at']
+
+@admin.register(InsightSnapshot)
+class InsightSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['computed_at', 'duration_ms']
+    ordering = ['-computed_at']
+    readonly_fields = ['computed_at', 'signals', 'duration_ms']
@@ -3,17 +3,134 @@ AI Assistant for AssetTrack - Smart chatbot that understands the entire project
 """
 
 import json
+import logging
+import re
 import requests
 from django.conf import settings
-from django.db.models import Q
-from .models import Asset, Employee, Handover, WelcomePack
+from django.db.models import Count, Q
+from django.utils import timezone
+from .models import Asset, Employee, Handover
+from .ai_cache import cache_enabled, get_cached_answer, make_cache_key, store_answer
+from .insights import get_latest_insights
+from .inventory_snapshot import get_inventory_snapshot
+from .retrieval_index import retrieve_records
 from datetime import datetime, timedelta
 
+# Ollama must accept the connection quickly; a streamed answer may then pause
+# for a while between chunks (prompt evaluation, model load on a cold start)
+OLLAMA_CONNECT_TIMEOUT = 5
+OLLAMA_READ_TIMEOUT = 120
+
+logger = logging.getLogger(__name__)
+
+# Structured questions (counts, "who has serial X", pending handovers,
+# expiries) are answered straight from the database by
+# AssetTrackAI.route_intent; only open-ended questions go to the model.
+COUNT_QUERY = re.compile(r'^(?:how many|number of|count(?: of| the)?|total(?: number)?(?: of)?)\b')
+# Advice, explanations and "how do I" questions go to the model whatever else they mention
+OPEN_ENDED_QUERY = re.compile(
+    r'\b(?:should|would|could|why|recommend|need|best|explain|what (?:does|do)|how(?!\s+(?:many|much)\b))\b'
+)
+HOLDER_QUERY = re.compile(
+    r'\bwho(?:\s+\w+)?\s+(?:has|have|owns|is using|uses)\b|\bwhose\b|\bassigned to whom\b|\bwho is it assigned to\b'
+)
+# "serial X" / "ST tag X", or else the first word containing a digit
+IDENTIFIER = re.compile(
+    r'\b(?:serial(?:\s+number)?|s/n|sn|st[\s-]?tag|tag)\s*(?:(?:no\.?|number)\s+|[#:]\s*)?([a-z0-9][\w-]*)',
+    re.IGNORECASE,
+)
+BARE_IDENTIFIER = re.compile(r'\b([a-z]*\d[\w-]{2,}|[a-z][\w-]*\d[\w-]*)\b', re.IGNORECASE)
+HANDOVER_QUERY = re.compile(r'\bhandovers?\b')
+PENDING_QUERY = re.compile(r'\b(?:pending|open|unsigned|outstanding|waiting|incomplete|not (?:yet )?signed)\b')
+# Only an explicit "what/which ... expires" question; mentioning a warranty isn't one
+EXPIRY_QUERY = re.compile(r'^(?:what|which|list|show|any|anything|are there)\b.*\b(?:expir\w*|runs? out|running out)\b')
+EXPIRY_WINDOW = re.compile(r'\b(?:next|within|in)\s+(\d+)\s*(day|week|month)s?\b')
+EMPLOYEE_QUERY = re.compile(r'\b(?:employees?|staff|people|persons?|colleagues)\b')
+OFFICE_SLOTS = [
+    (re.compile(r'\bbremen\b'), 'bremen'),
+    (re.compile(r'\bhamburg\b'), 'hamburg'),
+    (re.compile(r'\bother (?:offices?|locations?)\b'), 'other'),
+]
+ASSET_STATUS_SLOTS = [
+    (re.compile(r'\b(?:available|free|spare)\b'), 'available'),
+    (re.compile(r'\b(?:assigned|in use)\b'), 'assigned'),
+    (re.compile(r'\b(?:maintenance|repair|broken)\b'), 'maintenance'),
+    (re.compile(r'\bretired\b'), 'retired'),
+    (re.compile(r'\b(?:lost|stolen|missing)\b'), 'lost'),
+]
+HANDOVER_STATUS_SLOTS = [
+    (re.compile(r'\bpending scan\b'), 'Pending Scan'),
+    (re.compile(r'\bin progress\b'), 'In Progress'),
+    (re.compile(r'\b(?:completed|complete|signed)\b'), 'Completed'),
+    (re.compile(r'\bapproved\b'), 'Approved'),
+    (re.compile(r'\bcancell?ed\b'), 'Cancelled'),
+]
+# "Pending" in a question means any handover that isn't finished yet
+OPEN_HANDOVER_STATUSES = ['Pending', 'In Progress', 'Pending Scan']
+ASSET_STATUS_PHRASES = {
+    'available': 'available',
+    'assigned': 'assigned',
+    'maintenance': 'under maintenance',
+    'retired': 'retired',
+    'lost': 'lost or stolen',
+}
+ASSET_TYPE_SYNONYMS = {
+    'notebook': 'laptop',
+    'pc': 'desktop',
+    'smartphone': 'phone',
+    'mobile': 'phone',
+    'iphone': 'phone',
+    'screen': 'monitor',
+    'display': 'monitor',
+    'headset': 'headphones',
+    'mice': 'mouse',
+    'license': 'software_license',
+    'licence': 'software_license',
+}
+ASSET_TYPE_WORDS = dict(ASSET_TYPE_SYNONYMS)
+for _code, _label in Asset.ASSET_TYPES:
+    if _code not in ('all', 'other'):
+        ASSET_TYPE_WORDS[_label.lower()] = _code
+        ASSET_TYPE_WORDS[_code.replace('_', ' ')] = _code
+# Longest first, so "software license" wins over "license"
+ASSET_TYPE_QUERY = re.compile(
+    r'\b(' + '|'.join(re.escape(word) for word in sorted(ASSET_TYPE_WORDS, key=len, reverse=True)) + r')(?:e?s)?\b'
+)
+# A question is only answered directly when every word in it is either one
+# of these or matched by a slot the answer filters on. "How many laptops does
+# Jana have?" has no slot for Jana, so it goes to the model instead of being
+# answered with the count of all laptops.
+FILLER_WORDS = {
+    'a', 'an', 'the', 'is', 'are', 'was', 'were', 'be', 'being', 'there', 'do', 'does', 'did', 'we', 'us', 'our',
+    'i', 'you', 'have', 'has', 'got', 'in', 'at', 'of', 'that', 'all', 'total', 'overall', 'currently', 'right',
+    'now', 'today', 'still', 'yet', 'any', 'anything', 'list', 'show', 'me', 'tell', 'give', 'which', 'what',
+    'please', 'office', 'offices', 'location', 'locations', 'company', 'will', 'soon', 'upcoming', 'many',
+}
+ACTIVE_QUERY = re.compile(r'\b(?:in)?active\b')
+UNASSIGNED_QUERY = re.compile(r'\b(?:unassigned|not assigned)\b')
+ASSET_NOUN_QUERY = re.compile(r'\b(?:assets?|devices?|items?|equipment|hardware)\b')
+SCAN_QUERY = re.compile(r'\bscan\b')
+EXPIRY_WORDS = re.compile(r'\b(?:expir\w*|runs? out|running out|next month|warrant(?:y|ies)|subscriptions?)\b')
+OFFICE_PATTERNS = [pattern for pattern, _ in OFFICE_SLOTS]
+ASSET_COUNT_TERMS = [
+    COUNT_QUERY, ASSET_TYPE_QUERY, UNASSIGNED_QUERY, ASSET_NOUN_QUERY,
+    *(pattern for pattern, _ in ASSET_STATUS_SLOTS), *OFFICE_PATTERNS,
+]
+EMPLOYEE_COUNT_TERMS = [COUNT_QUERY, EMPLOYEE_QUERY, ACTIVE_QUERY, *OFFICE_PATTERNS]
+HANDOVER_COUNT_TERMS = [COUNT_QUERY, HANDOVER_QUERY, PENDING_QUERY, *(pattern for pattern, _ in HANDOVER_STATUS_SLOTS)]
+PENDING_HANDOVER_TERMS = [HANDOVER_QUERY, PENDING_QUERY, SCAN_QUERY]
+EXPIRY_TERMS = [EXPIRY_WORDS, EXPIRY_WINDOW]
+WORD = re.compile(r"[a-z0-9][a-z0-9'-]*")
+DIRECT_ANSWER_LIMIT = 10
+
 class AssetTrackAI:
     def __init__(self):
         # Initialize Ollama (free, self-hosted AI)
         self.ollama_url = getattr(settings, 'OLLAMA_URL', 'http://localhost:11434')
         self.model_name = getattr(settings, 'OLLAMA_MODEL', 'llama3.2:3b')
+        # How long Ollama keeps the model loaded after a request; reloading it
+        # is what makes the first answer after a quiet period slow
+        self.keep_alive = getattr(settings, 'OLLAMA_KEEP_ALIVE', '30m')
         
         # System prompt that teaches AI about AssetTrack
         self.system_prompt = """
@@ -48,38 +165,16 @@ class AssetTrackAI:
     
     def get_context_data(self, current_page=None, user=None):
         """Get relevant context data based on current page and user"""
-        context = {
+        # Counts and recent activity come from the cached inventory snapshot
+        snapshot = get_inventory_snapshot()
+        return {
             'current_page': current_page,
             'user': user.username if user else None,
             'timestamp': datetime.now().isoformat(),
+            'stats': snapshot['stats'],
+            'office_distribution': snapshot['office_distribution'],
+            'recent_activity': snapshot['recent_activity'],
         }
-        
-        # Get basic statistics
-        context['stats'] = {
-            'total_assets': Asset.objects.count(),
-            'total_employees': Employee.objects.count(),
-            'total_handovers': Handover.objects.count(),
-            'total_welcome_packs': WelcomePack.objects.count(),
-        }
-        
-        # Get office distribution
-        context['office_distribution'] = {
-            'bremen_assets': Asset.objects.filter(office_location='bremen').count(),
-            'hamburg_assets': Asset.objects.filter(office_location='hamburg').count(),
-            'other_assets': Asset.objects.filter(office_location='other').count(),
-        }
-        
-        # Get recent activity
-        context['recent_activity'] = {
-            'recent_handovers': list(Handover.objects.select_related('employee').order_by('-created_at')[:5].values(
-                'id', 'employee__name', 'status', 'created_at'
-            )),
-            'recent_assets': list(Asset.objects.select_related('assigned_to').order_by('-created_at')[:5].values(
-                'id', 'name', 'serial_number', 'asset_type', 'assigned_to__name'
-            )),
-        }
-        
-        return context
     
     def search_assets(self, query):
         """Search assets using natural language"""
@@ -150,100 +245,413 @@ class AssetTrackAI:
         except Employee.DoesNotExist:
             return None
     
-    def process_query(self, user_query, current_page=None, user=None):
-        """Process user query and return AI response"""
-        try:
-            # Get context data
-            context = self.get_context_data(current_page, user)
-            
-            # Search for relevant data
-            assets = self.search_assets(user_query)
-            employees = self.search_employees(user_query)
-            
-            # Prepare context for AI
-            context['search_results'] = {
-                'assets': assets,
-                'employees': employees,
-            }
-            
-            # Create user message with context
-            user_message = f"""
-            User Query: {user_query}
-            
-            Current Page: {current_page}
-            User: {user.username if user else 'Anonymous'}
-            
-            Available Data:
-            - Total Assets: {context['stats']['total_assets']}
-            - Total Employees: {context['stats']['total_employees']}
-            - Office Distribution: {context['office_distribution']}
-            
-            Search Results:
-            - Found {len(assets)} assets matching query
-            - Found {len(employees)} employees matching query
-            
-            Please provide a helpful response about the AssetTrack system, assets, employees, or any related information.
-            """
-            
-            # Call Ollama API - use /api/generate which is more reliable
-            # Combine system prompt and user message for generate endpoint
-            full_prompt = f"{self.system_prompt}\n\nUser Query: {user_query}"
-            
-            ollama_payload = {
-                "model": self.model_name,
-                "prompt": full_prompt,
-                "stream": False,
-                "options": {
-                    "temperature": 0.7,
-                    "num_predict": 500  # Use num_predict instead of max_tokens for generate endpoint
-                }
-            }
-            
-            response = requests.post(
-                f"{self.ollama_url}/api/generate",
-                json=ollama_payload,
-                timeout=120  # Increased timeout for CPU-only Ollama (matches Nginx timeout)
+    def route_intent(self, user_query):
+        """
+        Answer a structured question directly from the database:
+        {'intent', 'response', 'search_results'}, or None when the question
+        is open-ended and needs the model
+        """
+        text = ' '.join(str(user_query).lower().split())
+        if OPEN_ENDED_QUERY.search(text):
+            return None
+        if HOLDER_QUERY.search(text):
+            identifier = self._extract_identifier(user_query)
+            if identifier:
+                answer = self._answer_holder(identifier)
+                if answer is not None:
+                    return answer
+        if COUNT_QUERY.search(text):
+            if HANDOVER_QUERY.search(text):
+                return self._answer_handover_count(text) if self._covered(text, HANDOVER_COUNT_TERMS) else None
+            if EMPLOYEE_QUERY.search(text):
+                return self._answer_employee_count(text) if self._covered(text, EMPLOYEE_COUNT_TERMS) else None
+            return self._answer_asset_count(text) if self._covered(text, ASSET_COUNT_TERMS) else None
+        if HANDOVER_QUERY.search(text) and PENDING_QUERY.search(text):
+            return self._answer_pending_handovers(text) if self._covered(text, PENDING_HANDOVER_TERMS) else None
+        if EXPIRY_QUERY.search(text):
+            return self._answer_expiring(text) if self._covered(text, EXPIRY_TERMS) else None
+        return None
+    
+    def _covered(self, text, terms):
+        """True when every word of ``text`` is matched by one of ``terms`` or is a filler word"""
+        for pattern in terms:
+            text = pattern.sub(' ', text)
+        return all(word in FILLER_WORDS for word in WORD.findall(text))
+    
+    def _extract_identifier(self, user_query):
+        match = IDENTIFIER.search(user_query) or BARE_IDENTIFIER.search(user_query)
+        return match.group(1).strip('-') if match else None
+    
+    def _slot(self, slots, text):
+        for pattern, value in slots:
+            if pattern.search(text):
+                return value
+        return None
+    
+    def _asset_type_slot(self, text):
+        match = ASSET_TYPE_QUERY.search(text)
+        return ASSET_TYPE_WORDS[match.group(1)] if match else None
+    
+    def _direct_answer(self, intent, response, assets=(), employees=()):
+        return {
+            'intent': intent,
+            'response': response,
+            'search_results': {'assets': list(assets), 'employees': list(employees)},
+        }
+    
+    def _asset_results(self, queryset):
+        return queryset.values(
+            'id', 'name', 'serial_number', 'asset_type', 'status',
+            'office_location', 'assigned_to__name', 'health_score'
+        )[:DIRECT_ANSWER_LIMIT]
+    
+    def _answer_holder(self, identifier):
+        # Exact matches use the unique serial number / ST tag indexes
+        assets = Asset.objects.select_related('assigned_to').filter(
+            Q(serial_number=identifier) | Q(st_tag=identifier)
+        )
+        asset = assets.first() or Asset.objects.select_related('assigned_to').filter(
+            Q(serial_number__iexact=identifier) | Q(st_tag__iexact=identifier)
+        ).first()
+        if asset is None:
+            # Probably part of a model name ("ThinkPad T14"), not an identifier
+            return None
+        
+        description = f"{asset.name} ({asset.get_asset_type_display()}, serial {asset.serial_number})"
+        if asset.assigned_to:
+            employee = asset.assigned_to
+            response = (
+                f"{description} is assigned to {employee.name} "
+                f"({employee.get_department_display()}, {employee.get_office_location_display()}, {employee.email})."
+            )
+            employees = Employee.objects.filter(id=employee.id).values(
+                'id', 'name', 'email', 'department', 'office_location', 'phone'
+            )
+        else:
+            response = f"{description} is not assigned to anyone. Status: {asset.get_status_display()}, {asset.get_office_location_display()}."
+            employees = []
+        return self._direct_answer('asset_holder', response, self._asset_results(Asset.objects.filter(id=asset.id)), employees)
+    
+    def _answer_asset_count(self, text):
+        asset_type = self._asset_type_slot(text)
+        status = self._slot(ASSET_STATUS_SLOTS, text)
+        office = self._slot(OFFICE_SLOTS, text)
+        unassigned = 'unassigned' in text or 'not assigned' in text
+        
+        assets = Asset.objects.all()
+        if asset_type:
+            assets = assets.filter(asset_type=asset_type)
+        if unassigned:
+            assets = assets.filter(assigned_to__isnull=True)
+        elif status:
+            assets = assets.filter(status=status)
+        if office:
+            assets = assets.filter(office_location=office)
+        by_status = dict(assets.order_by().values_list('status').annotate(count=Count('id')))
+        total = sum(by_status.values())
+        
+        noun = dict(Asset.ASSET_TYPES)[asset_type].lower() if asset_type else 'asset'
+        if total != 1 and not noun.endswith('s'):
+            noun += 's'
+        if unassigned:
+            noun = f"unassigned {noun}"
+        elif status:
+            noun = f"{noun} {ASSET_STATUS_PHRASES[status]}"
+        where = f" in the {dict(Asset.OFFICE_CHOICES)[office]}" if office else ''
+        response = f"There {'is' if total == 1 else 'are'} {total} {noun}{where}."
+        if total and not status and len(by_status) > 1:
+            labels = dict(Asset.STATUS_CHOICES)
+            breakdown = ', '.join(
+                f"{count} {labels.get(key, key).lower()}"
+                for key, count in sorted(by_status.items(), key=lambda item: -item[1])
+            )
+            response += f" By status: {breakdown}."
+        return self._direct_answer('asset_count', response)
+    
+    def _answer_employee_count(self, text):
+        office = self._slot(OFFICE_SLOTS, text)
+        inactive = 'inactive' in text
+        employees = Employee.objects.filter(is_active=not inactive)
+        if office:
+            employees = employees.filter(office_location=office)
+        total = employees.count()
+        where = f" in the {dict(Employee.OFFICE_CHOICES)[office]}" if office else ''
+        noun = 'employee' if total == 1 else 'employees'
+        response = f"There {'is' if total == 1 else 'are'} {total} {'inactive' if inactive else 'active'} {noun}{where}."
+        return self._direct_answer('employee_count', response)
+    
+    def _answer_handover_count(self, text):
+        status = self._slot(HANDOVER_STATUS_SLOTS, text)
+        pending = not status and PENDING_QUERY.search(text)
+        handovers = Handover.objects.all()
+        if status:
+            handovers = handovers.filter(status=status)
+        elif pending:
+            handovers = handovers.filter(status__in=OPEN_HANDOVER_STATUSES)
+        by_status = dict(handovers.order_by().values_list('status').annotate(count=Count('id')))
+        total = sum(by_status.values())
+        noun = 'handover' if total == 1 else 'handovers'
+        if status:
+            noun = f"{status.lower()} {noun}"
+        elif pending:
+            noun = f"pending {noun}"
+        response = f"There {'is' if total == 1 else 'are'} {total} {noun}."
+        if total and not status and len(by_status) > 1:
+            breakdown = ', '.join(
+                f"{count} {key.lower()}" for key, count in sorted(by_status.items(), key=lambda item: -item[1])
+            )
+            response += f" By status: {breakdown}."
+        return self._direct_answer('handover_count', response)
+    
+    def _answer_pending_handovers(self, text):
+        statuses = ['Pending Scan'] if 'scan' in text else OPEN_HANDOVER_STATUSES
+        # Oldest first: those are the ones to chase
+        handovers = Handover.objects.filter(status__in=statuses).select_related('employee').order_by('created_at')
+        total = handovers.count()
+        if not total:
+            return self._direct_answer('pending_handovers', "There are no pending handovers.")
+        
+        today = timezone.localdate()
+        lines = [f"There {'is' if total == 1 else 'are'} {total} pending handover{'' if total == 1 else 's'}:"]
+        for handover in handovers[:DIRECT_ANSWER_LIMIT]:
+            age = (today - timezone.localtime(handover.created_at).date()).days
+            lines.append(
+                f"- {handover.handover_id}: {handover.employee.name}, {handover.status}, "
+                f"created {handover.created_at:%d.%m.%Y} ({age} day{'' if age == 1 else 's'} ago)"
             )
-            
-            if response.status_code == 200:
-                result = response.json()
-                ai_response = result.get('response', 'I apologize, but I could not generate a response.')
+        if total > DIRECT_ANSWER_LIMIT:
+            lines.append(f"...and {total - DIRECT_ANSWER_LIMIT} more on the handovers page.")
+        return self._direct_answer('pending_handovers', '\n'.join(lines))
+    
+    def _answer_expiring(self, text):
+        days = 30
+        match = EXPIRY_WINDOW.search(text)
+        if match:
+            days = int(match.group(1)) * {'day': 1, 'week': 7, 'month': 30}[match.group(2)]
+        elif 'next month' in text:
+            days = 60
+        days = max(1, min(days, 365))
+        today = timezone.localdate()
+        until = today + timedelta(days=days)
+        
+        warranties = Asset.objects.filter(warranty_expiry__range=(today, until)).order_by('warranty_expiry')
+        subscriptions = Asset.objects.filter(subscription_end__range=(today, until)).order_by('subscription_end')
+        entries = sorted(
+            [(asset.warranty_expiry, 'warranty', asset) for asset in warranties[:DIRECT_ANSWER_LIMIT]]
+            + [(asset.subscription_end, 'subscription', asset) for asset in subscriptions[:DIRECT_ANSWER_LIMIT]],
+            key=lambda entry: entry[0],
+        )
+        warranty_count = warranties.count()
+        subscription_count = subscriptions.count()
+        if not entries:
+            return self._direct_answer('expiring', f"Nothing expires in the next {days} days.")
+        
+        lines = [
+            f"In the next {days} days {warranty_count} warrant{'y' if warranty_count == 1 else 'ies'} "
+            f"and {subscription_count} subscription{'' if subscription_count == 1 else 's'} expire:"
+        ]
+        for expires, kind, asset in entries[:DIRECT_ANSWER_LIMIT]:
+            lines.append(f"- {asset.name} ({asset.serial_number}): {kind} ends {expires:%d.%m.%Y}")
+        remaining = warranty_count + subscription_count - min(len(entries), DIRECT_ANSWER_LIMIT)
+        if remaining > 0:
+            lines.append(f"...and {remaining} more.")
+        asset_ids = [asset.id for _, _, asset in entries[:DIRECT_ANSWER_LIMIT]]
+        return self._direct_answer('expiring', '\n'.join(lines), self._asset_results(Asset.objects.filter(id__in=asset_ids)))
+    
+    def process_query(self, user_query, current_page=None, user=None, use_cache=True):
+        """
+        Process user query and return AI response (``use_cache=False`` skips the answer cache).
+        Same steps as stream_query (prepare_query, then chunk_events on Ollama's
+        single non-streamed reply), collected into one dict.
+        """
+        try:
+            prepared = self.prepare_query(user_query, use_cache)
+            if prepared.get('direct') is not None:
+                events = self.direct_events(prepared['direct'])
+            elif prepared['cached'] is not None:
+                events = self.cached_events(prepared['cached'])
             else:
-                ai_response = f"I apologize, but I encountered an error with the AI service (Status: {response.status_code}). Please try again."
-            
-            return {
-                'response': ai_response,
-                'context': context,
-                'search_results': {
-                    'assets': assets,
-                    'employees': employees,
-                }
-            }
-            
+                events = [('results', prepared['search_results'])]
+                response = requests.post(
+                    f"{self.ollama_url}/api/generate",
+                    json={**prepared['payload'], 'stream': False},
+                    timeout=(OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT)
+                )
+                if response.status_code == 200:
+                    # The non-streamed reply is the final chunk of a streamed one
+                    events += self.chunk_events(response.json(), [], prepared)
+                else:
+                    events.append(('error', f"I apologize, but I encountered an error with the AI service (Status: {response.status_code}). Please try again."))
         except Exception as e:
-            return {
-                'response': f"I apologize, but I encountered an error: {str(e)}. Please try again or contact support.",
-                'context': None,
-                'search_results': {'assets': [], 'employees': []}
+            events = [('error', f"I apologize, but I encountered an error: {str(e)}. Please try again or contact support.")]
+        
+        result = {
+            'response': '',
+            'search_results': {'assets': [], 'employees': []},
+            'cached': False,
+        }
+        for event, data in events:
+            if event == 'results':
+                result['search_results'] = data
+            elif event == 'token':
+                result['response'] += data
+            elif event == 'done':
+                result['cached'] = data['cached']
+                if 'intent' in data:
+                    result['intent'] = data['intent']
+            elif event == 'error':
+                result['response'] = data
+        if not result['response']:
+            result['response'] = 'I apologize, but I could not generate a response.'
+        return result
+    
+    def get_grounding(self, user_query):
+        """
+        Inventory facts for the prompt: the current totals and the records most
+        relevant to the query from the local retrieval index (see retrieval_index)
+        """
+        stats = get_inventory_snapshot()['stats']
+        lines = [
+            f"CURRENT DATA: {stats['total_assets']} assets, {stats['total_employees']} employees, "
+            f"{stats['total_handovers']} handovers, {stats['total_welcome_packs']} welcome packs"
+        ]
+        try:
+            records = retrieve_records(user_query)
+        except Exception as e:
+            # Answer without records rather than not at all
+            logger.warning(f"AI retrieval failed: {e}")
+            records = []
+        if records:
+            lines.append("RELEVANT RECORDS (most relevant first; base your answer on these):")
+            lines.extend(f"- {record}" for record in records)
+        return '\n'.join(lines)
+    
+    def get_generate_payload(self, user_query, stream):
+        """Request body for Ollama's /api/generate"""
+        # Combine system prompt, inventory facts and user message for generate endpoint
+        return {
+            "model": self.model_name,
+            "prompt": f"{self.system_prompt}\n\n{self.get_grounding(user_query)}\n\nUser Query: {user_query}",
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+            "options": {
+                "temperature": 0.7,
+                "num_predict": 500  # Use num_predict instead of max_tokens for generate endpoint
             }
+        }
     
-    def get_quick_insights(self):
-        """Get quick insights about the system"""
-        insights = []
-        
-        # Asset health insights
-        unhealthy_assets = Asset.objects.filter(health_score__lt=50).count()
-        if unhealthy_assets > 0:
-            insights.append(f"⚠️ {unhealthy_assets} assets need attention (health score < 50%)")
+    def prepare_query(self, user_query, use_cache=True):
+        """
+        Everything needed before Ollama is called: {'direct': answer} for a
+        structured question (see route_intent), {'cached': the cached answer}
+        if there is one, otherwise the search results and the request payload
+        """
+        direct = self.route_intent(user_query)
+        if direct is not None:
+            return {'direct': direct, 'cached': None}
         
-        # Pending handovers
-        pending_handovers = Handover.objects.filter(status='Pending').count()
-        if pending_handovers > 0:
-            insights.append(f"📋 {pending_handovers} handovers are pending")
+        use_cache = use_cache and cache_enabled()
+        cache_key = make_cache_key(self.model_name, user_query) if use_cache else None
+        if use_cache:
+            cached = get_cached_answer(cache_key)
+            if cached is not None:
+                return {'cached': cached, 'cache_key': cache_key}
         
-        # Unassigned assets
-        unassigned_assets = Asset.objects.filter(assigned_to__isnull=True).count()
-        if unassigned_assets > 0:
-            insights.append(f"📦 {unassigned_assets} assets are unassigned")
+        return {
+            'cached': None,
+            'cache_key': cache_key,
+            'search_results': {
+                'assets': self.search_assets(user_query),
+                'employees': self.search_employees(user_query),
+            },
+            'payload': self.get_generate_payload(user_query, stream=True),
+        }
+    
+    def cached_events(self, cached):
+        """A cached answer as stream events, sent as a single 'token'"""
+        return [
+            ('results', cached['search_results']),
+            ('token', cached['response']),
+            ('done', {'cached': True}),
+        ]
+    
+    def direct_events(self, direct):
+        """A route_intent answer as stream events, sent as a single 'token'"""
+        return [
+            ('results', direct['search_results']),
+            ('token', direct['response']),
+            ('done', {'cached': False, 'intent': direct['intent']}),
+        ]
+    
+    def chunk_events(self, chunk, tokens, prepared):
+        """
+        Stream events for one JSON line of Ollama's streamed response.
+        ``tokens`` collects the answer text, which is cached once Ollama is done.
+        """
+        if chunk.get('error'):
+            return [('error', f"I apologize, but the AI service reported an error: {chunk['error']}")]
+        events = []
+        if chunk.get('response'):
+            tokens.append(chunk['response'])
+            events.append(('token', chunk['response']))
+        if chunk.get('done'):
+            if prepared['cache_key'] is not None and tokens:
+                store_answer(prepared['cache_key'], ''.join(tokens), prepared['search_results'])
+            events.append(('done', {
+                'cached': False,
+                'eval_count': chunk.get('eval_count'),
+                'total_duration_ms': (chunk.get('total_duration') or 0) // 1_000_000,
+            }))
+        return events
+    
+    def stream_query(self, user_query, current_page=None, user=None, use_cache=True):
+        """
+        Process a user query, yielding (event, data) pairs as the answer is
+        generated: 'results' with the matching assets and employees first,
+        then 'token' with each piece of text from Ollama, and finally 'done'
+        (with Ollama's timings) or 'error' (with a message for the user).
+        Closing the generator closes the Ollama connection, which stops generation.
+        A cached answer or a structured answer (see route_intent) is sent as a
+        single 'token'. The async version for the AI gateway is ai_gateway.stream_answer.
+        """
+        try:
+            prepared = self.prepare_query(user_query, use_cache)
+        except Exception as e:
+            yield 'error', f"I apologize, but I encountered an error: {str(e)}. Please try again or contact support."
+            return
+        if prepared.get('direct') is not None:
+            yield from self.direct_events(prepared['direct'])
+            return
+        if prepared['cached'] is not None:
+            yield from self.cached_events(prepared['cached'])
+            return
+        yield 'results', prepared['search_results']
         
-        return insights
+        try:
+            with requests.post(
+                f"{self.ollama_url}/api/generate",
+                json=prepared['payload'],
+                stream=True,
+                timeout=(OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT),
+            ) as response:
+                if response.status_code != 200:
+                    yield 'error', f"I apologize, but I encountered an error with the AI service (Status: {response.status_code}). Please try again."
+                    return
+                
+                # Ollama streams one JSON object per line; chunk_size=None hands
+                # them over as they arrive instead of waiting for 512 bytes
+                tokens = []
+                for line in response.iter_lines(chunk_size=None):
+                    if not line:
+                        continue
+                    for event, data in self.chunk_events(json.loads(line), tokens, prepared):
+                        yield event, data
+                        if event in ('done', 'error'):
+                            return
+                yield 'error', "I apologize, but the AI response ended unexpectedly. Please try again."
+        except (requests.exceptions.RequestException, ValueError) as e:
+            yield 'error', f"I apologize, but I encountered an error: {str(e)}. Please try again or contact support."
+    
+    def get_quick_insights(self):
+        """Get quick insights about the system (precomputed by compute_insights, see insights.py)"""
+        return get_latest_insights()['messages']
@@ -0,0 +1,293 @@
+"""
+Latency benchmark for the AI chat, without a model.
+
+``run_benchmark`` opens ``sessions`` concurrent chat sessions. Each one asks
+``questions`` open-ended questions in a row over the streamed ``/ai-chat/``
+endpoint, and the benchmark measures the time to the first token and to the
+complete answer. A probe requests a cheap page (``probe_path``) the whole
+time. Its latency shows what chatting costs everyone else.
+
+Without ``url`` the benchmark is self-contained. It starts a
+``FakeOllamaServer`` and serves the app in-process the way production does:
+a thread-pool WSGI server standing in for a gunicorn gthread worker, plus, for
+``server='asgi'``, the uvicorn AI process that nginx routes ``/ai-chat/`` to.
+The report then also includes how saturated the worker threads, the AI
+gateway queue and the (fake) Ollama got.
+
+With ``url`` it drives an already running instance. Each session sends its own
+``X-Real-IP``, but the instance's ``AI_RATE_LIMIT_PER_MINUTE`` still applies.
+"""
+
+import json
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+import httpx
+from django.conf import settings
+from django.test.utils import override_settings
+
+from .fake_ollama import FakeOllamaServer
+
+# Open-ended on purpose: the intent router (AssetTrackAI.route_intent) answers
+# none of them, so every question reaches the model
+QUESTIONS = [
+    "How should I prepare a laptop before handing it to a new employee?",
+    "What is the process when an employee leaves the company?",
+    "Which details should I check before signing a handover?",
+    "How do I move a monitor to another office?",
+    "What should I do if a device is damaged?",
+    "Any tips for keeping the asset inventory accurate?",
+    "How do I report a lost phone?",
+]
+
+PROBE_INTERVAL = 0.2
+SAMPLE_INTERVAL = 0.05
+REQUEST_TIMEOUT = 300
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of ``values``; None when empty"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(values):
+    return {
+        'count': len(values),
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'max': max(values) if values else None,
+    }
+
+
+class QuietWSGIRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class PooledWSGIServer(WSGIServer):
+    """
+    wsgiref server answering on a fixed pool of threads, like one gunicorn
+    gthread worker. Connections beyond the pool wait for a free thread.
+    """
+
+    def __init__(self, address, app, threads):
+        super().__init__(address, QuietWSGIRequestHandler)
+        self.set_app(app)
+        self.threads = threads
+        self.pool = ThreadPoolExecutor(threads, thread_name_prefix='wsgi')
+        self._lock = threading.RLock()
+        self._saturated_since = None
+        self.stats = {'busy': 0, 'peak_busy': 0, 'waiting': 0, 'peak_waiting': 0, 'saturated_seconds': 0.0}
+
+    def _count(self, busy=0, waiting=0):
+        with self._lock:
+            stats = self.stats
+            stats['busy'] += busy
+            stats['waiting'] += waiting
+            stats['peak_busy'] = max(stats['peak_busy'], stats['busy'])
+            stats['peak_waiting'] = max(stats['peak_waiting'], stats['waiting'])
+            now = time.monotonic()
+            if stats['busy'] >= self.threads and self._saturated_since is None:
+                self._saturated_since = now
+            elif stats['busy'] < self.threads and self._saturated_since is not None:
+                stats['saturated_seconds'] += now - self._saturated_since
+                self._saturated_since = None
+
+    def process_request(self, request, client_address):
+        # Only requests that find every thread taken count as waiting
+        with self._lock:
+            waits = self.stats['busy'] + self.stats['waiting'] >= self.threads
+            if waits:
+                self._count(waiting=1)
+        self.pool.submit(self._handle, request, client_address, waits)
+
+    def _handle(self, request, client_address, waited):
+        self._count(busy=1, waiting=-1 if waited else 0)
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._count(busy=-1)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _serve_in_thread(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _start_wsgi(threads):
+    from django.core.wsgi import get_wsgi_application
+    return _serve_in_thread(PooledWSGIServer(('127.0.0.1', 0), get_wsgi_application(), threads))
+
+
+def _start_asgi():
+    import uvicorn
+    from django.core.asgi import get_asgi_application
+
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    server = uvicorn.Server(uvicorn.Config(get_asgi_application(), log_level='warning', lifespan='off'))
+    threading.Thread(target=server.run, kwargs={'sockets': [sock]}, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+def ask(client, chat_url, question, client_ip):
+    """One streamed chat answer: {'ttft', 'total', 'queued', 'error'}"""
+    result = {'ttft': None, 'total': None, 'queued': False, 'error': None}
+    started = time.monotonic()
+    event = None
+    try:
+        with client.stream(
+            'POST', chat_url,
+            data={'query': question, 'no_cache': '1'},
+            headers={'Accept': 'text/event-stream', 'X-Real-IP': client_ip},
+        ) as response:
+            if response.status_code != 200:
+                result['error'] = f"HTTP {response.status_code}"
+                return result
+            for line in response.iter_lines():
+                if line.startswith('event:'):
+                    event = line[6:].strip()
+                    if event == 'token' and result['ttft'] is None:
+                        result['ttft'] = time.monotonic() - started
+                    elif event == 'queued':
+                        result['queued'] = True
+                elif line.startswith('data:') and event == 'error':
+                    result['error'] = json.loads(line[5:])
+                elif line.startswith('data:') and event == 'done':
+                    result['total'] = time.monotonic() - started
+        if result['total'] is None and result['error'] is None:
+            result['error'] = 'The stream ended without an answer'
+    except httpx.HTTPError as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def _run_session(chat_url, session, questions, results):
+    client_ip = f"10.254.{session // 250}.{session % 250 + 1}"
+    with httpx.Client(timeout=REQUEST_TIMEOUT) as client:
+        for number in range(questions):
+            question = QUESTIONS[(session + number) % len(QUESTIONS)]
+            results.append(ask(client, chat_url, question, client_ip))
+
+
+def _run_probe(probe_url, stop, latencies, failures):
+    with httpx.Client(timeout=REQUEST_TIMEOUT) as client:
+        while not stop.is_set():
+            started = time.monotonic()
+            try:
+                response = client.get(probe_url)
+                if response.status_code < 400:
+                    latencies.append(time.monotonic() - started)
+                else:
+                    failures.append(f"HTTP {response.status_code}")
+            except httpx.HTTPError as e:
+                failures.append(type(e).__name__)
+            stop.wait(PROBE_INTERVAL)
+
+
+def _sample_gateway(stop, peaks):
+    from . import ai_gateway
+    while not stop.is_set():
+        for gateway in list(ai_gateway._gateways.values()):
+            status = gateway.status()
+            peaks['concurrency'] = status['concurrency']
+            peaks['peak_active'] = max(peaks['peak_active'], status['active'])
+            peaks['peak_queued'] = max(peaks['peak_queued'], status['queued'])
+        stop.wait(SAMPLE_INTERVAL)
+
+
+def _drive(chat_url, probe_url, sessions, questions, server_stats=None):
+    results = []
+    probe_latencies = []
+    probe_failures = []
+    stop = threading.Event()
+    workers = [
+        threading.Thread(target=_run_session, args=(chat_url, session, questions, results))
+        for session in range(sessions)
+    ]
+    background = [threading.Thread(target=_run_probe, args=(probe_url, stop, probe_latencies, probe_failures))]
+    if server_stats is not None:
+        background.append(threading.Thread(target=_sample_gateway, args=(stop, server_stats)))
+
+    started = time.monotonic()
+    for thread in background + workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.monotonic() - started
+    stop.set()
+    for thread in background:
+        thread.join()
+
+    answered = [result for result in results if result['error'] is None]
+    return {
+        'sessions': sessions,
+        'questions': len(results),
+        'elapsed': elapsed,
+        'answers_per_second': len(answered) / elapsed if elapsed else 0,
+        'ttft': summarize([result['ttft'] for result in answered if result['ttft'] is not None]),
+        'latency': summarize([result['total'] for result in answered]),
+        'queued': sum(1 for result in results if result['queued']),
+        'errors': [result['error'] for result in results if result['error'] is not None],
+        'probe': summarize(probe_latencies),
+        'probe_failures': probe_failures,
+    }
+
+
+def run_benchmark(sessions=8, questions=5, url=None, server='asgi', threads=8,
+                  probe_path='/accounts/login/', **fake_ollama_options):
+    """
+    Run the benchmark and return the report dict. ``fake_ollama_options`` are
+    passed to FakeOllamaServer (self-contained runs only).
+    """
+    if url:
+        base_url = url.rstrip('/')
+        return _drive(f"{base_url}/ai-chat/", f"{base_url}{probe_path}", sessions, questions)
+
+    ollama = FakeOllamaServer(port=0, **fake_ollama_options).start()
+    overrides = {
+        'OLLAMA_URL': ollama.url,
+        'AI_RATE_LIMIT_PER_MINUTE': 0,
+        'ALLOWED_HOSTS': list(settings.ALLOWED_HOSTS) + ['127.0.0.1'],
+    }
+    with override_settings(**overrides):
+        wsgi = _start_wsgi(threads)
+        wsgi_url = f"http://127.0.0.1:{wsgi.server_address[1]}"
+        asgi = None
+        gateway_stats = None
+        try:
+            if server == 'asgi':
+                asgi, chat_base_url = _start_asgi()
+                gateway_stats = {'concurrency': None, 'peak_active': 0, 'peak_queued': 0}
+            else:
+                chat_base_url = wsgi_url
+            report = _drive(f"{chat_base_url}/ai-chat/", f"{wsgi_url}{probe_path}", sessions, questions, gateway_stats)
+        finally:
+            if asgi is not None:
+                asgi.should_exit = True
+            wsgi.shutdown()
+            wsgi.server_close()
+            ollama.stop()
+
+    report['server'] = server
+    report['wsgi'] = dict(wsgi.stats, threads=threads)
+    report['wsgi']['saturated_share'] = wsgi.stats['saturated_seconds'] / report['elapsed'] if report['elapsed'] else 0
+    report['gateway'] = gateway_stats
+    report['ollama'] = dict(ollama.stats, parallel=ollama.parallel)
+    return report
@@ -0,0 +1,152 @@
+"""
+Cache for AI assistant answers.
+
+Every answer costs a full Ollama generation, while people keep asking the same
+questions. Answers are cached per (model, data generation, normalized query).
+The normalized query is lower-cased, with whitespace collapsed and trailing
+punctuation dropped. The data generation (see ``inventory_snapshot.py``) is
+bumped whenever assets, employees, handovers or welcome packs change. Answers
+given before a change are then never served again; they simply age out.
+
+Answers are kept in memory in each worker process (LRU with a TTL,
+``AI_CACHE_MAX_ENTRIES`` / ``AI_CACHE_TTL``). Hits and misses are counted per
+hour in the shared cache (``get_ai_cache_metrics``). ``AI_CACHE_ENABLED =
+False`` turns caching off; a single request can skip it with ``no_cache``.
+"""
+
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .inventory_snapshot import get_data_generation
+
+METRICS_KEY_PREFIX = 'ai_cache:metrics'
+METRICS_RETENTION = 7 * 24 * 3600
+
+_TRAILING_PUNCTUATION = re.compile(r'[\s?!.,;:]+$')
+
+
+def cache_enabled():
+    return getattr(settings, 'AI_CACHE_ENABLED', True)
+
+
+def normalize_query(query):
+    """'  How many laptops in Hamburg?? ' -> 'how many laptops in hamburg'"""
+    query = unicodedata.normalize('NFKC', str(query)).lower()
+    query = ' '.join(query.split())
+    return _TRAILING_PUNCTUATION.sub('', query)
+
+
+def make_cache_key(model_name, query):
+    return (model_name, get_data_generation(), normalize_query(query))
+
+
+class AIResponseCache:
+    """Thread-safe LRU cache whose entries also expire after ``ttl`` seconds"""
+
+    def __init__(self, max_entries=256, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = AIResponseCache(
+                max_entries=getattr(settings, 'AI_CACHE_MAX_ENTRIES', 256),
+                ttl=getattr(settings, 'AI_CACHE_TTL', 3600),
+            )
+        return _response_cache
+
+
+def get_cached_answer(key):
+    """Cached {'response', 'search_results'} for ``key`` or None; counts the hit or miss"""
+    answer = get_response_cache().get(key)
+    record_cache_metric('hits' if answer is not None else 'misses')
+    return answer
+
+
+def store_answer(key, response, search_results):
+    get_response_cache().set(key, {'response': response, 'search_results': search_results})
+
+
+def _metrics_key(kind, hour):
+    return f'{METRICS_KEY_PREFIX}:{kind}:{hour.strftime("%Y%m%d%H")}'
+
+
+def record_cache_metric(kind):
+    """Increment the hourly counter for 'hits' or 'misses'"""
+    key = _metrics_key(kind, timezone.now())
+    try:
+        cache.add(key, 0, timeout=METRICS_RETENTION)
+        cache.incr(key)
+    except ValueError:
+        # Key expired between add() and incr()
+        cache.set(key, 1, timeout=METRICS_RETENTION)
+
+
+def get_ai_cache_metrics(hours=24):
+    """Cache hits and misses per hour for the last ``hours`` hours (newest first), plus totals"""
+    now = timezone.now().replace(minute=0, second=0, microsecond=0)
+    hour_list = [now - timedelta(hours=offset) for offset in range(hours)]
+    keys = [_metrics_key(kind, hour) for hour in hour_list for kind in ('hits', 'misses')]
+    values = cache.get_many(keys)
+    per_hour = [
+        {
+            'hour': hour.isoformat(),
+            'hits': values.get(_metrics_key('hits', hour), 0),
+            'misses': values.get(_metrics_key('misses', hour), 0),
+        }
+        for hour in hour_list
+    ]
+    hits = sum(entry['hits'] for entry in per_hour)
+    misses = sum(entry['misses'] for entry in per_hour)
+    return {
+        'enabled': cache_enabled(),
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / (hits + misses), 3) if hits + misses else None,
+        'entries_in_this_process': len(get_response_cache()),
+        'data_generation': get_data_generation(),
+        'per_hour': per_hour,
+    }
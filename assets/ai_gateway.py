@@ -0,0 +1,266 @@
+"""
+Async gateway between the AI chat and Ollama.
+
+An answer takes seconds of Ollama generation. Under the threaded WSGI workers
+every open chat holds a worker thread for that long, so a handful of people
+chatting at once left no threads for the rest of the app. The chat endpoints
+are therefore served by a separate ASGI process (``assettrack-ai.service``,
+routed by nginx), where ``ai_chat`` is an async view. A waiting answer there
+costs a coroutine, not a thread.
+
+The gateway in that process:
+
+- lets at most ``AI_GATEWAY_CONCURRENCY`` generations run against Ollama at
+  a time, through one pooled ``httpx.AsyncClient``;
+- queues further requests first come, first served. Each user can have one
+  question queued or running. The queue is bounded by ``AI_GATEWAY_MAX_QUEUE``.
+  Streaming clients get their position in line as ``queued`` events;
+- limits each user to ``AI_RATE_LIMIT_PER_MINUTE`` generated answers. Cached
+  and structured answers (``AssetTrackAI.route_intent``) are neither queued
+  nor counted;
+- loads the model as soon as it is created (the first time the chat page is
+  opened) and again every ``AI_WARMUP_INTERVAL`` seconds, so Ollama's
+  keep-alive never lets it unload.
+
+The gateway lives in the process's event loop. Under WSGI (runserver, the main
+gunicorn service) ``ai_chat`` falls back to the synchronous
+``AssetTrackAI.stream_query`` without queueing.
+
+The AI process learns about data changes made by the WSGI workers only through
+the cache: the data generation that invalidates cached answers, the inventory
+snapshot and the retrieval index. ``assettrack_django/asgi.py`` therefore calls
+``require_shared_cache`` and refuses to start on the per-process LocMem cache;
+set ``REDIS_URL``.
+"""
+
+import asyncio
+import json
+import logging
+import time
+import weakref
+from collections import deque
+from contextlib import aclosing
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+
+from .ai_assistant import OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_WINDOW = 60
+
+
+class GatewayBusy(Exception):
+    """The question can't be queued right now; the message is shown to the user"""
+
+
+class GatewayError(Exception):
+    """Ollama answered with an error status"""
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Rate limit exceeded, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+def check_rate_limit(user_key):
+    """Count one generated answer for ``user_key``; raises RateLimited beyond AI_RATE_LIMIT_PER_MINUTE"""
+    limit = getattr(settings, 'AI_RATE_LIMIT_PER_MINUTE', 10)
+    if not limit:
+        return
+    now = int(time.time())
+    key = f'ai_gateway:rate:{user_key}:{now // RATE_LIMIT_WINDOW}'
+    try:
+        cache.add(key, 0, timeout=RATE_LIMIT_WINDOW * 2)
+        count = cache.incr(key)
+    except ValueError:
+        # Key expired between add() and incr()
+        cache.set(key, 1, timeout=RATE_LIMIT_WINDOW * 2)
+        count = 1
+    if count > limit:
+        raise RateLimited(RATE_LIMIT_WINDOW - now % RATE_LIMIT_WINDOW)
+
+
+def require_shared_cache():
+    """Raise ImproperlyConfigured unless the default cache is shared between processes"""
+    if isinstance(caches['default'], LocMemCache):
+        raise ImproperlyConfigured(
+            "The AI process needs the cache shared with the WSGI workers, otherwise it never "
+            "sees their data changes. Set REDIS_URL (see assettrack-ai.service)."
+        )
+
+
+class AIGateway:
+    """Bounded-concurrency, first come first served access to Ollama for one event loop"""
+
+    def __init__(self, ollama_url, model_name, keep_alive, concurrency=2, max_queue=20, warmup_interval=600):
+        self.model_name = model_name
+        self.keep_alive = keep_alive
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.client = httpx.AsyncClient(
+            base_url=ollama_url,
+            timeout=httpx.Timeout(OLLAMA_READ_TIMEOUT, connect=OLLAMA_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=concurrency + 1, max_keepalive_connections=concurrency + 1),
+        )
+        self._active = 0
+        self._waiting = deque()
+        self._users = set()
+        self._changed = asyncio.Event()
+        self._warmup_task = None
+        if warmup_interval:
+            self._warmup_task = asyncio.get_running_loop().create_task(self._keep_warm(warmup_interval))
+
+    def status(self):
+        return {'active': self._active, 'queued': len(self._waiting), 'concurrency': self.concurrency}
+
+    def _notify(self):
+        # Wake every waiter; each then re-checks its own position
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait_for_slot(self, user_key):
+        """
+        Queue for a generation slot, yielding the 1-based position in line
+        whenever it changes. When the generator finishes the caller holds a
+        slot and must call release(). Closing it earlier leaves the queue.
+        Raises GatewayBusy if the user already has a question in progress or
+        the queue is full.
+        """
+        if user_key in self._users:
+            raise GatewayBusy("You already have a question in progress. Please wait for its answer.")
+        if len(self._waiting) >= self.max_queue:
+            raise GatewayBusy("The AI assistant is busy right now. Please try again in a minute.")
+
+        ticket = object()
+        self._waiting.append(ticket)
+        self._users.add(user_key)
+        acquired = False
+        try:
+            last_position = None
+            while True:
+                position = self._waiting.index(ticket) + 1
+                if position == 1 and self._active < self.concurrency:
+                    self._waiting.popleft()
+                    self._active += 1
+                    acquired = True
+                    self._notify()
+                    return
+                if position != last_position:
+                    last_position = position
+                    yield position
+                    continue
+                await self._changed.wait()
+        finally:
+            if not acquired:
+                self._waiting.remove(ticket)
+                self._users.discard(user_key)
+                self._notify()
+
+    def release(self, user_key):
+        self._active -= 1
+        self._users.discard(user_key)
+        self._notify()
+
+    async def generate(self, payload):
+        """The JSON chunks of a streamed /api/generate call"""
+        async with self.client.stream('POST', '/api/generate', json=payload) as response:
+            if response.status_code != 200:
+                raise GatewayError(f"AI service returned status {response.status_code}")
+            async for line in response.aiter_lines():
+                if line:
+                    yield json.loads(line)
+
+    async def warm_up(self):
+        """Load the model; a request without a prompt makes Ollama load it and return"""
+        response = await self.client.post('/api/generate', json={
+            'model': self.model_name,
+            'keep_alive': self.keep_alive,
+        })
+        response.raise_for_status()
+
+    async def _keep_warm(self, interval):
+        while True:
+            try:
+                started = time.monotonic()
+                await self.warm_up()
+                logger.info(f"AI model {self.model_name} warm ({time.monotonic() - started:.1f}s)")
+            except httpx.HTTPError as e:
+                logger.warning(f"AI model warm-up failed: {e}")
+            await asyncio.sleep(interval)
+
+
+_gateways = weakref.WeakKeyDictionary()
+
+
+def get_gateway():
+    """The gateway of the running event loop, created on first use"""
+    loop = asyncio.get_running_loop()
+    gateway = _gateways.get(loop)
+    if gateway is None:
+        gateway = AIGateway(
+            ollama_url=getattr(settings, 'OLLAMA_URL', 'http://localhost:11434'),
+            model_name=getattr(settings, 'OLLAMA_MODEL', 'llama3.2:3b'),
+            keep_alive=getattr(settings, 'OLLAMA_KEEP_ALIVE', '30m'),
+            concurrency=getattr(settings, 'AI_GATEWAY_CONCURRENCY', 2),
+            max_queue=getattr(settings, 'AI_GATEWAY_MAX_QUEUE', 20),
+            warmup_interval=getattr(settings, 'AI_WARMUP_INTERVAL', 600),
+        )
+        _gateways[loop] = gateway
+    return gateway
+
+
+async def stream_answer(ai, user_query, user_key, use_cache=True):
+    """
+    Async counterpart of AssetTrackAI.stream_query: the same (event, data)
+    pairs, plus 'queued' with {'position': n} while waiting for a slot
+    """
+    try:
+        prepared = await sync_to_async(ai.prepare_query)(user_query, use_cache)
+    except Exception as e:
+        yield 'error', f"I apologize, but I encountered an error: {str(e)}. Please try again or contact support."
+        return
+    if prepared.get('direct') is not None:
+        for event in ai.direct_events(prepared['direct']):
+            yield event
+        return
+    if prepared['cached'] is not None:
+        for event in ai.cached_events(prepared['cached']):
+            yield event
+        return
+
+    try:
+        await sync_to_async(check_rate_limit)(user_key)
+    except RateLimited as e:
+        yield 'error', f"You are asking questions faster than the AI assistant can answer. Please wait {e.retry_after} seconds."
+        return
+
+    yield 'results', prepared['search_results']
+    gateway = get_gateway()
+    try:
+        async with aclosing(gateway.wait_for_slot(user_key)) as positions:
+            async for position in positions:
+                yield 'queued', {'position': position}
+    except GatewayBusy as e:
+        yield 'error', str(e)
+        return
+
+    try:
+        tokens = []
+        async with aclosing(gateway.generate(prepared['payload'])) as chunks:
+            async for chunk in chunks:
+                for event, data in ai.chunk_events(chunk, tokens, prepared):
+                    yield event, data
+                    if event in ('done', 'error'):
+                        return
+        yield 'error', "I apologize, but the AI response ended unexpectedly. Please try again."
+    except (httpx.HTTPError, GatewayError, ValueError) as e:
+        yield 'error', f"I apologize, but I encountered an error: {str(e)}. Please try again or contact support."
+    finally:
+        gateway.release(user_key)
@@ -4,10 +4,14 @@ from datetime import datetime, timedelta
 from django.conf import settings
 from django.utils import timezone
 from .models import Employee, Asset
+from .graph_auth import GraphTokenError, get_token_provider
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Marker for "photo metadata not looked up yet" (None already means "no photo")
+PHOTO_METADATA_NOT_FETCHED = object()
+
 class AzureADIntegration:
     """
     Azure Active Directory integration for syncing employee data and device assignments
@@ -17,39 +21,14 @@ class AzureADIntegration:
         self.tenant_id = getattr(settings, 'AZURE_TENANT_ID', None)
         self.client_id = getattr(settings, 'AZURE_CLIENT_ID', None)
         self.client_secret = getattr(settings, 'AZURE_CLIENT_SECRET', None)
-        self.access_token = None
-        self.token_expires_at = None
+        self.token_provider = get_token_provider(self.tenant_id, self.client_id, self.client_secret)
         
     def get_access_token(self):
-        """Get access token for Azure AD API"""
-        if self.access_token and self.token_expires_at and timezone.now() < self.token_expires_at:
-            return self.access_token
-            
-        if not all([self.tenant_id, self.client_id, self.client_secret]):
-            logger.error("Azure AD credentials not configured")
-            return None
-            
-        token_url = f"https://login.microsoftonline.com/{self.tenant_id}/oauth2/v2.0/token"
-        
-        data = {
-            'grant_type': 'client_credentials',
-            'client_id': self.client_id,
-            'client_secret': self.client_secret,
-            'scope': 'https://graph.microsoft.com/.default'
-        }
-        
+        """Get access token for Azure AD API (shared across instances and workers)"""
         try:
-            response = requests.post(token_url, data=data)
-            response.raise_for_status()
-            
-            token_data = response.json()
-            self.access_token = token_data['access_token']
-            self.token_expires_at = timezone.now() + timedelta(seconds=token_data['expires_in'] - 300)  # 5 min buffer
-            
-            return self.access_token
-            
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Failed to get Azure AD access token: {e}")
+            return self.token_provider.get_token()
+        except GraphTokenError as e:
+            logger.error(str(e))
             return None
     
     def get_headers(self):
@@ -71,7 +50,7 @@ class AzureADIntegration:
             
         url = "https://graph.microsoft.com/v1.0/users"
         params = {
-            '$select': 'id,displayName,mail,userPrincipalName,department,jobTitle,employeeId,accountEnabled,deletedDateTime,businessPhones,mobilePhone',
+            '$select': 'id,displayName,mail,userPrincipalName,department,jobTitle,employeeId,employeeHireDate,accountEnabled,deletedDateTime,businessPhones,mobilePhone',
             '$filter': 'accountEnabled eq true' if not include_disabled else None
         }
         
@@ -183,11 +162,14 @@ class AzureADIntegration:
             logger.error(f"Failed to get devices for user {user_id}: {e}")
             return []
     
-    def get_user_photo_url(self, user_id):
-        """Get user's profile photo URL from Azure AD"""
+    def get_user_photo_metadata(self, user_id):
+        """
+        Get user's profile photo metadata (including its media ETag) from Azure AD.
+        Returns None when the user has no photo and False when the lookup failed.
+        """
         headers = self.get_headers()
         if not headers:
-            return None
+            return False
             
         # Check if user has a photo
         photo_url = f"https://graph.microsoft.com/v1.0/users/{user_id}/photo"
@@ -195,19 +177,24 @@ class AzureADIntegration:
         try:
             response = requests.get(photo_url, headers=headers)
             if response.status_code == 200:
-                # User has a photo, return the URL
-                return f"https://graph.microsoft.com/v1.0/users/{user_id}/photo/$value"
+                return response.json()
             elif response.status_code == 404:
                 # User doesn't have a photo
                 logger.debug(f"No photo found for user {user_id}")
                 return None
             else:
                 logger.warning(f"Unexpected status code {response.status_code} when checking photo for user {user_id}")
-                return None
+                return False
                 
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, ValueError) as e:
             logger.error(f"Failed to check photo for user {user_id}: {e}")
+            return False
+    
+    def get_user_photo_url(self, user_id):
+        """Get user's profile photo URL from Azure AD"""
+        if not self.get_user_photo_metadata(user_id):
             return None
+        return f"https://graph.microsoft.com/v1.0/users/{user_id}/photo/$value"
     
     def get_user_photo_data(self, user_id):
         """Get user's profile photo data (binary) from Azure AD"""
@@ -232,6 +219,68 @@ class AzureADIntegration:
             logger.error(f"Failed to get photo for user {user_id}: {e}")
             return None
     
+    def cache_employee_photo(self, employee, photo_metadata=PHOTO_METADATA_NOT_FETCHED, force=False):
+        """
+        Store the employee's Azure AD photo in the local photo store.
+        The photo bytes are only downloaded when Graph reports a media ETag
+        that differs from the one recorded for the cached copy (or the cached
+        file is missing), so repeated syncs cost one metadata request per user.
+        Returns the photo hash, or an empty string if the user has no photo.
+        """
+        from . import photo_store
+        
+        if not employee.azure_ad_id:
+            return ''
+        
+        if photo_metadata is PHOTO_METADATA_NOT_FETCHED:
+            photo_metadata = self.get_user_photo_metadata(employee.azure_ad_id)
+        if photo_metadata is False:
+            # Lookup failed - keep serving whatever is cached
+            return employee.photo_hash
+        
+        update_fields = {'photo_checked_at': timezone.now()}
+        
+        if not photo_metadata:
+            update_fields.update({'photo_hash': '', 'photo_etag': '', 'photo_thumbnails': False})
+        else:
+            media_etag = photo_metadata.get('@odata.mediaEtag', '') or ''
+            is_current = (
+                not force
+                and employee.photo_hash
+                and media_etag
+                and media_etag == employee.photo_etag
+                and photo_store.has_photo(employee.photo_hash)
+            )
+            if is_current:
+                # Backfill thumbnails for photos cached before they existed
+                photo_store.generate_thumbnails(employee.photo_hash)
+                update_fields['photo_thumbnails'] = photo_store.has_thumbnails(employee.photo_hash)
+            else:
+                photo_data = self.get_user_photo_data(employee.azure_ad_id)
+                if photo_data:
+                    photo_hash = photo_store.save_photo(photo_data)
+                    update_fields.update({
+                        'photo_hash': photo_hash,
+                        'photo_etag': media_etag,
+                        'photo_thumbnails': photo_store.has_thumbnails(photo_hash),
+                    })
+        
+        Employee.objects.filter(pk=employee.pk).update(**update_fields)
+        for field, value in update_fields.items():
+            setattr(employee, field, value)
+        return employee.photo_hash
+    
+    @staticmethod
+    def parse_hire_date(value):
+        """Date part of Graph employeeHireDate ('2025-03-01T00:00:00Z'), or None"""
+        if not value:
+            return None
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00')).date()
+        except ValueError:
+            logger.warning(f"Unexpected employeeHireDate value: {value}")
+            return None
+    
     def sync_employees_with_devices(self):
         """Sync employees from Azure AD with their devices automatically assigned"""
         azure_users = self.get_users()
@@ -268,8 +317,9 @@ class AzureADIntegration:
                     else:
                         department = 'External'
                 
-                # Get user's profile photo URL
-                photo_url = self.get_user_photo_url(user.get('id'))
+                # Get user's profile photo metadata (also used to refresh the local photo cache)
+                photo_metadata = self.get_user_photo_metadata(user.get('id'))
+                photo_url = f"https://graph.microsoft.com/v1.0/users/{user.get('id')}/photo/$value" if photo_metadata else None
                 
                 # Get phone number from Azure AD (business phone or mobile phone)
                 phone = ''
@@ -299,6 +349,7 @@ class AzureADIntegration:
                     'employee_id': user.get('employeeId', ''),
                     'phone': phone,
                     'office_location': office_location,
+                    'start_date': self.parse_hire_date(user.get('employeeHireDate')),
                     'last_azure_sync': timezone.now(),
                 }
                 
@@ -338,6 +389,12 @@ class AzureADIntegration:
                     employee = Employee.objects.create(**employee_data)
                     synced_count += 1
                 
+                # Refresh the cached profile photo if Graph reports a new version
+                try:
+                    self.cache_employee_photo(employee, photo_metadata)
+                except Exception as e:
+                    logger.error(f"Error caching photo for employee {employee.name}: {e}")
+                
                 # Sync devices for this employee
                 user_devices = self.get_user_devices(user.get('id'))
                 for device in user_devices:
@@ -0,0 +1,218 @@
+"""
+Durable outbound email queue.
+
+Views call ``enqueue_email`` and return immediately; the ``deliver_emails``
+management command drains the queue in the background. Failed deliveries are
+retried with exponential backoff (OUTBOUND_EMAIL_RETRY_BASE seconds, doubled on
+every attempt, capped at OUTBOUND_EMAIL_RETRY_MAX) until ``max_attempts`` is
+reached. Enqueues with an idempotency key that is still pending, or was sent
+within the last OUTBOUND_EMAIL_DEDUPE_SECONDS, return the existing email
+instead of creating a duplicate (double clicks, retried requests). A unique
+constraint on the keys of pending emails covers concurrent enqueues.
+"""
+
+import hashlib
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Handover, OutboundEmail, WelcomePack
+
+logger = logging.getLogger(__name__)
+
+
+def get_retry_delay(attempts):
+    """Seconds to wait before the next attempt after ``attempts`` failures"""
+    base = getattr(settings, 'OUTBOUND_EMAIL_RETRY_BASE', 60)
+    cap = getattr(settings, 'OUTBOUND_EMAIL_RETRY_MAX', 6 * 3600)
+    return min(base * (2 ** max(attempts - 1, 0)), cap)
+
+
+def find_duplicate_email(idempotency_key):
+    """Pending or recently sent email with the given key, if any"""
+    dedupe_seconds = getattr(settings, 'OUTBOUND_EMAIL_DEDUPE_SECONDS', 300)
+    return OutboundEmail.objects.filter(idempotency_key=idempotency_key).filter(
+        Q(status__in=['queued', 'sending']) |
+        Q(status='sent', sent_at__gte=timezone.now() - timedelta(seconds=dedupe_seconds))
+    ).first()
+
+
+def enqueue_email(to, subject, body_text, body_html='', kind='other', idempotency_key=None,
+                  handover=None, welcome_pack=None, from_email=None):
+    """Queue an email for background delivery and return the OutboundEmail"""
+    if isinstance(to, str):
+        to = [to]
+    if not idempotency_key:
+        # Hashed: recipients and subject can be longer than the column
+        digest = hashlib.sha256(f"{','.join(to)}\n{subject}".encode()).hexdigest()
+        idempotency_key = f"{kind}:{digest}"
+
+    existing = find_duplicate_email(idempotency_key)
+    if existing:
+        return existing
+
+    try:
+        with transaction.atomic():
+            return OutboundEmail.objects.create(
+                idempotency_key=idempotency_key,
+                kind=kind,
+                from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+                to=list(to),
+                subject=subject,
+                body_text=body_text,
+                body_html=body_html,
+                handover=handover,
+                welcome_pack=welcome_pack,
+            )
+    except IntegrityError:
+        # A concurrent enqueue with the same key got there first
+        existing = find_duplicate_email(idempotency_key)
+        if existing:
+            return existing
+        raise
+
+
+def build_message(email, connection=None):
+    """Turn a queued email into an EmailMultiAlternatives"""
+    message = EmailMultiAlternatives(
+        email.subject, email.body_text, email.from_email or settings.DEFAULT_FROM_EMAIL,
+        email.to, connection=connection,
+    )
+    if email.body_html:
+        message.attach_alternative(email.body_html, "text/html")
+    return message
+
+
+def requeue_stale_emails():
+    """Put back emails left in 'sending' by a worker that died mid-delivery"""
+    stale_after = getattr(settings, 'OUTBOUND_EMAIL_SENDING_TIMEOUT', 600)
+    return OutboundEmail.objects.filter(
+        status='sending',
+        updated_at__lt=timezone.now() - timedelta(seconds=stale_after),
+    ).update(status='queued', updated_at=timezone.now())
+
+
+def claim_due_emails(limit=50):
+    """
+    Atomically move up to ``limit`` due emails from 'queued' to 'sending'.
+    The conditional UPDATE makes concurrent workers skip each other's rows.
+    """
+    now = timezone.now()
+    candidate_ids = list(
+        OutboundEmail.objects.filter(status='queued', next_attempt_at__lte=now)
+        .order_by('next_attempt_at')
+        .values_list('id', flat=True)[:limit]
+    )
+    claimed = []
+    for email_id in candidate_ids:
+        if OutboundEmail.objects.filter(id=email_id, status='queued').update(status='sending', updated_at=now):
+            claimed.append(email_id)
+    return list(OutboundEmail.objects.filter(id__in=claimed).order_by('next_attempt_at'))
+
+
+def mark_sent(email):
+    """Record a successful delivery and update the related handover / welcome pack"""
+    now = timezone.now()
+    OutboundEmail.objects.filter(id=email.id).update(
+        status='sent', sent_at=now, attempts=email.attempts + 1, last_error='', updated_at=now,
+    )
+
+    if email.kind == 'handover_signature' and email.handover_id:
+        Handover.objects.filter(id=email.handover_id).update(email_sent=True, email_sent_at=now)
+    elif email.kind == 'welcome_employee' and email.welcome_pack_id:
+        WelcomePack.objects.filter(id=email.welcome_pack_id).update(email_sent_to_employee=True, email_sent_at=now)
+    elif email.kind == 'welcome_it' and email.welcome_pack_id:
+        WelcomePack.objects.filter(id=email.welcome_pack_id).update(email_sent_to_it=True, email_sent_at=now)
+
+
+def mark_failed(email, error):
+    """Record a failed attempt and schedule a retry, or give up after max_attempts"""
+    now = timezone.now()
+    attempts = email.attempts + 1
+    if attempts >= email.max_attempts:
+        status, next_attempt_at = 'failed', now
+        logger.error(f"Giving up on email {email.id} after {attempts} attempts: {error}")
+    else:
+        status, next_attempt_at = 'queued', now + timedelta(seconds=get_retry_delay(attempts))
+        logger.warning(f"Email {email.id} failed (attempt {attempts}), retrying at {next_attempt_at}: {error}")
+
+    OutboundEmail.objects.filter(id=email.id).update(
+        status=status, attempts=attempts, next_attempt_at=next_attempt_at,
+        last_error=str(error)[:2000], updated_at=now,
+    )
+    return status
+
+
+def mark_unknown(email, error):
+    """
+    Record an attempt that may or may not have been delivered. It is not
+    retried automatically, since that could send the email twice; the admin's
+    "Retry selected emails now" action resends it.
+    """
+    now = timezone.now()
+    logger.error(f"Delivery of email {email.id} has an unknown outcome, not retrying: {error}")
+    OutboundEmail.objects.filter(id=email.id).update(
+        status='failed', attempts=email.attempts + 1,
+        last_error=f"Outcome unknown, not retried: {error}"[:2000], updated_at=now,
+    )
+
+
+def deliver_pending_emails(limit=50):
+    """
+    Deliver up to ``limit`` due emails through the configured email backend.
+    Returns a dict with 'sent', 'retrying' and 'failed' counts.
+    """
+    requeue_stale_emails()
+    results = {'sent': 0, 'retrying': 0, 'failed': 0}
+
+    emails = claim_due_emails(limit)
+    if not emails:
+        return results
+
+    try:
+        connection = get_connection(getattr(settings, 'OUTBOUND_EMAIL_BACKEND', None), fail_silently=False)
+        connection.open()
+    except Exception as e:
+        for email in emails:
+            status = mark_failed(email, e)
+            results['retrying' if status == 'queued' else 'failed'] += 1
+        return results
+
+    try:
+        if hasattr(connection, 'send_messages_detailed'):
+            # Batching backend (Microsoft Graph): one call, one result per message
+            try:
+                outcomes = connection.send_messages_detailed([build_message(email, connection) for email in emails])
+            except Exception as e:
+                outcomes = [{'success': False, 'error': str(e)} for _ in emails]
+            for email, outcome in zip(emails, outcomes):
+                if outcome['success']:
+                    mark_sent(email)
+                    results['sent'] += 1
+                elif outcome.get('unknown'):
+                    mark_unknown(email, outcome['error'])
+                    results['failed'] += 1
+                else:
+                    status = mark_failed(email, outcome['error'] or 'Unknown error')
+                    results['retrying' if status == 'queued' else 'failed'] += 1
+        else:
+            for email in emails:
+                try:
+                    sent = connection.send_messages([build_message(email, connection)])
+                    if not sent:
+                        raise RuntimeError("Email backend reported the message as not sent")
+                except Exception as e:
+                    status = mark_failed(email, e)
+                    results['retrying' if status == 'queued' else 'failed'] += 1
+                else:
+                    mark_sent(email)
+                    results['sent'] += 1
+    finally:
+        connection.close()
+
+    return results
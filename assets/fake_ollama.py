@@ -0,0 +1,192 @@
+"""
+Fake Ollama server for measuring the AI chat without a model.
+
+Implements the parts of the Ollama HTTP API that AssetTrack uses:
+``POST /api/generate`` (streamed NDJSON or a single JSON response, and the
+prompt-less request that only loads the model), ``GET /api/tags`` and
+``GET /``. Timing is synthetic and configurable. The first token arrives
+after ``ttft`` seconds, then ``tokens_per_second`` tokens follow until
+``tokens`` have been sent. At most ``parallel`` generations run at once
+(like ``OLLAMA_NUM_PARALLEL``) and the rest wait their turn. The first request
+also pays ``load_time``, like a cold model. A client that disconnects stops
+its generation, as with the real server.
+
+Run it with ``manage.py fake_ollama`` and point ``OLLAMA_URL`` at it, or let
+``manage.py benchmark_ai_chat`` start one in-process.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FILLER_WORDS = (
+    'The asset is registered in AssetTrack and assigned according to the '
+    'handover process, so please check the employee and office details before '
+    'you continue with the next step.'
+).split()
+
+
+class FakeOllamaServer:
+    def __init__(self, host='127.0.0.1', port=11435, model='fake-model', tokens_per_second=20.0,
+                 ttft=0.5, tokens=60, parallel=2, load_time=0.0):
+        self.model = model
+        self.tokens_per_second = tokens_per_second
+        self.ttft = ttft
+        self.tokens = tokens
+        self.load_time = load_time
+        self.loaded = load_time <= 0
+        self.parallel = parallel
+        self._slots = threading.BoundedSemaphore(parallel)
+        self._load_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {'requests': 0, 'completed': 0, 'cancelled': 0, 'active': 0, 'peak_active': 0, 'waiting': 0, 'peak_waiting': 0}
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        """Serve in a background thread"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _count(self, **deltas):
+        with self._stats_lock:
+            for key, delta in deltas.items():
+                self.stats[key] += delta
+            self.stats['peak_active'] = max(self.stats['peak_active'], self.stats['active'])
+            self.stats['peak_waiting'] = max(self.stats['peak_waiting'], self.stats['waiting'])
+
+    def _ensure_loaded(self):
+        with self._load_lock:
+            if not self.loaded:
+                time.sleep(self.load_time)
+                self.loaded = True
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def handle(self):
+                try:
+                    super().handle()
+                except (BrokenPipeError, ConnectionResetError):
+                    # A client closed its keep-alive connection
+                    pass
+
+            def _send_json(self, data, status=200):
+                body = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == '/api/tags':
+                    self._send_json({'models': [{'name': server.model, 'model': server.model}]})
+                elif self.path == '/':
+                    body = b'Ollama is running'
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/plain')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                else:
+                    self._send_json({'error': 'not found'}, 404)
+
+            def do_POST(self):
+                if self.path != '/api/generate':
+                    self._send_json({'error': 'not found'}, 404)
+                    return
+                try:
+                    request = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+                except ValueError:
+                    self._send_json({'error': 'invalid JSON'}, 400)
+                    return
+
+                server._ensure_loaded()
+                if not request.get('prompt'):
+                    # Load request (keep-alive warm-up)
+                    self._send_json({'model': server.model, 'response': '', 'done': True, 'done_reason': 'load'})
+                    return
+
+                server._count(requests=1)
+                if not server._slots.acquire(blocking=False):
+                    server._count(waiting=1)
+                    server._slots.acquire()
+                    server._count(waiting=-1)
+                server._count(active=1)
+                try:
+                    if request.get('stream', True):
+                        self._generate_stream()
+                    else:
+                        self._generate_once()
+                    server._count(completed=1)
+                except (BrokenPipeError, ConnectionResetError):
+                    server._count(cancelled=1)
+                    self.close_connection = True
+                finally:
+                    server._count(active=-1)
+                    server._slots.release()
+
+            def _words(self):
+                return [FILLER_WORDS[i % len(FILLER_WORDS)] for i in range(server.tokens)]
+
+            def _final(self, started, response=''):
+                return {
+                    'model': server.model,
+                    'response': response,
+                    'done': True,
+                    'done_reason': 'stop',
+                    'eval_count': server.tokens,
+                    'total_duration': int((time.monotonic() - started) * 1e9),
+                }
+
+            def _generate_once(self):
+                started = time.monotonic()
+                time.sleep(server.ttft + max(server.tokens - 1, 0) / server.tokens_per_second)
+                self._send_json(self._final(started, ' '.join(self._words())))
+
+            def _generate_stream(self):
+                started = time.monotonic()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+
+                def write_chunk(data):
+                    line = (json.dumps(data) + '\n').encode()
+                    self.wfile.write(b'%x\r\n%s\r\n' % (len(line), line))
+                    self.wfile.flush()
+
+                time.sleep(server.ttft)
+                for index, word in enumerate(self._words()):
+                    if index:
+                        time.sleep(1 / server.tokens_per_second)
+                        # Like real tokens, later words carry their leading space
+                        word = f' {word}'
+                    write_chunk({'model': server.model, 'response': word, 'done': False})
+                write_chunk(self._final(started))
+                self.wfile.write(b'0\r\n\r\n')
+                self.wfile.flush()
+
+        return Handler
@@ -0,0 +1,223 @@
+"""
+Shared Microsoft Graph access token provider.
+
+All Graph consumers (Azure AD sync, photo proxy, email backend) get their
+client-credentials token from here instead of requesting one per instance or
+per call. Tokens live in the Django cache so every worker sharing the cache
+reuses them; a copy is also memoised in-process to avoid a cache round trip on
+every Graph request.
+
+Tokens are refreshed ahead of expiry (GRAPH_TOKEN_REFRESH_MARGIN seconds). Only
+one worker refreshes at a time (single-flight lock via ``cache.add``); others
+keep using the still-valid token, or wait briefly for the winner's token when
+none is valid anymore. Fetches and failures are counted per hour for
+monitoring, see ``get_token_fetch_metrics``.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+GRAPH_SCOPE = 'https://graph.microsoft.com/.default'
+
+METRICS_KEY_PREFIX = 'graph_token:metrics'
+METRICS_RETENTION = 48 * 3600
+
+
+class GraphTokenError(Exception):
+    """Raised when no Graph access token could be obtained"""
+
+
+class GraphTokenProvider:
+    """Client-credentials token provider backed by the Django cache"""
+
+    def __init__(self, tenant_id=None, client_id=None, client_secret=None, scope=GRAPH_SCOPE):
+        self.tenant_id = tenant_id or getattr(settings, 'AZURE_TENANT_ID', None)
+        self.client_id = client_id or getattr(settings, 'AZURE_CLIENT_ID', None)
+        self.client_secret = client_secret or getattr(settings, 'AZURE_CLIENT_SECRET', None)
+        self.scope = scope
+        self.refresh_margin = getattr(settings, 'GRAPH_TOKEN_REFRESH_MARGIN', 300)
+        self.lock_timeout = getattr(settings, 'GRAPH_TOKEN_LOCK_TIMEOUT', 30)
+        self.lock_wait = getattr(settings, 'GRAPH_TOKEN_LOCK_WAIT', 10)
+        self.request_timeout = getattr(settings, 'GRAPH_TOKEN_REQUEST_TIMEOUT', 15)
+
+        key_source = f'{self.tenant_id}:{self.client_id}:{self.scope}'
+        key_hash = hashlib.sha256(key_source.encode()).hexdigest()[:16]
+        self.cache_key = f'graph_token:{key_hash}'
+        self.lock_key = f'graph_token:lock:{key_hash}'
+
+        self._memo = None
+        self._memo_lock = threading.Lock()
+
+    @property
+    def is_configured(self):
+        return all([self.tenant_id, self.client_id, self.client_secret])
+
+    def get_token(self, force_refresh=False):
+        """
+        Return a valid access token, refreshing it if it is close to expiry.
+        Raises GraphTokenError if credentials are missing or the token endpoint fails.
+        """
+        if not self.is_configured:
+            raise GraphTokenError("Azure AD credentials not configured")
+
+        entry = None if force_refresh else self._get_entry()
+        now = time.time()
+
+        if entry and now < entry['expires_at'] - self.refresh_margin:
+            return entry['access_token']
+
+        if entry and now < entry['expires_at']:
+            # Still valid but due for refresh: only the lock holder refreshes,
+            # everyone else keeps using the current token meanwhile
+            lock_owner = self._acquire_lock()
+            if not lock_owner:
+                return entry['access_token']
+            try:
+                return self._fetch_token()['access_token']
+            except GraphTokenError:
+                logger.warning("Graph token refresh failed; using current token until it expires")
+                return entry['access_token']
+            finally:
+                self._release_lock(lock_owner)
+
+        # No usable token: fetch one, or wait for a concurrent fetch to finish
+        lock_owner = self._acquire_lock()
+        if not lock_owner:
+            entry = self._wait_for_token()
+            if entry:
+                return entry['access_token']
+            # The lock holder is stuck or failed - fetch anyway rather than fail the request
+        try:
+            return self._fetch_token()['access_token']
+        finally:
+            if lock_owner:
+                self._release_lock(lock_owner)
+
+    def invalidate(self):
+        """Drop the cached token (e.g. after Graph rejected it with 401)"""
+        with self._memo_lock:
+            self._memo = None
+        cache.delete(self.cache_key)
+
+    def _get_entry(self):
+        memo = self._memo
+        if memo and time.time() < memo['expires_at'] - self.refresh_margin:
+            return memo
+        entry = cache.get(self.cache_key)
+        if entry:
+            with self._memo_lock:
+                self._memo = entry
+        return entry
+
+    def _store_entry(self, entry):
+        with self._memo_lock:
+            self._memo = entry
+        cache.set(self.cache_key, entry, timeout=max(int(entry['expires_at'] - time.time()), 1))
+
+    def _acquire_lock(self):
+        owner = uuid.uuid4().hex
+        if cache.add(self.lock_key, owner, timeout=self.lock_timeout):
+            return owner
+        return None
+
+    def _release_lock(self, owner):
+        if cache.get(self.lock_key) == owner:
+            cache.delete(self.lock_key)
+
+    def _wait_for_token(self):
+        deadline = time.time() + self.lock_wait
+        while time.time() < deadline:
+            time.sleep(0.1)
+            entry = cache.get(self.cache_key)
+            if entry and time.time() < entry['expires_at']:
+                with self._memo_lock:
+                    self._memo = entry
+                return entry
+            if not cache.get(self.lock_key):
+                break
+        return None
+
+    def _fetch_token(self):
+        token_url = f"https://login.microsoftonline.com/{self.tenant_id}/oauth2/v2.0/token"
+        data = {
+            'grant_type': 'client_credentials',
+            'client_id': self.client_id,
+            'client_secret': self.client_secret,
+            'scope': self.scope,
+        }
+
+        try:
+            response = requests.post(token_url, data=data, timeout=self.request_timeout)
+            response.raise_for_status()
+            token_data = response.json()
+            entry = {
+                'access_token': token_data['access_token'],
+                'expires_at': time.time() + int(token_data.get('expires_in', 3600)),
+            }
+        except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+            record_token_metric('failures')
+            logger.error(f"Failed to get Azure AD access token: {e}")
+            raise GraphTokenError(f"Failed to get Azure AD access token: {e}") from e
+
+        record_token_metric('fetches')
+        self._store_entry(entry)
+        logger.info("Fetched new Microsoft Graph access token")
+        return entry
+
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def get_token_provider(tenant_id=None, client_id=None, client_secret=None, scope=GRAPH_SCOPE):
+    """Return the process-wide provider for the given (or configured) credentials"""
+    provider = GraphTokenProvider(tenant_id, client_id, client_secret, scope)
+    with _providers_lock:
+        return _providers.setdefault(provider.cache_key, provider)
+
+
+def get_graph_access_token(force_refresh=False):
+    """Shortcut for the configured provider's token"""
+    return get_token_provider().get_token(force_refresh=force_refresh)
+
+
+def _metrics_key(kind, hour):
+    return f'{METRICS_KEY_PREFIX}:{kind}:{hour.strftime("%Y%m%d%H")}'
+
+
+def record_token_metric(kind):
+    """Increment the hourly counter for token 'fetches' or 'failures'"""
+    key = _metrics_key(kind, timezone.now())
+    try:
+        cache.add(key, 0, timeout=METRICS_RETENTION)
+        cache.incr(key)
+    except ValueError:
+        # Key expired between add() and incr()
+        cache.set(key, 1, timeout=METRICS_RETENTION)
+
+
+def get_token_fetch_metrics(hours=24):
+    """Token fetches and failures per hour for the last ``hours`` hours, newest first"""
+    now = timezone.now().replace(minute=0, second=0, microsecond=0)
+    hour_list = [now - timedelta(hours=offset) for offset in range(hours)]
+    keys = [_metrics_key(kind, hour) for hour in hour_list for kind in ('fetches', 'failures')]
+    values = cache.get_many(keys)
+    return [
+        {
+            'hour': hour.isoformat(),
+            'fetches': values.get(_metrics_key('fetches', hour), 0),
+            'failures': values.get(_metrics_key('failures', hour), 0),
+        }
+        for hour in hour_list
+    ]
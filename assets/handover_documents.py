@@ -0,0 +1,406 @@
+"""
+Server-side handover PDFs.
+
+``get_handover_pdf_path`` renders a handover with the pure-Python writer in
+``pdf_writer`` and caches the file on disk, named after the handover id,
+its ``updated_at`` and the layout version, so any change to the handover
+(signing, approval, edits) produces a new file and stale versions are removed.
+``stream_handover_pdf_zip`` builds a ZIP of many PDFs as a generator: every
+handover is rendered (or read from the cache) and written into the archive one
+at a time, so memory use stays flat regardless of how many are exported.
+"""
+
+import io
+import logging
+import os
+import tempfile
+import zipfile
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Handover
+from .pdf_writer import PDFDocument, wrap_text
+from .signature_strokes import parse_strokes, StrokeFormatError
+
+logger = logging.getLogger(__name__)
+
+# Bump when the document layout changes so cached files are regenerated
+LAYOUT_VERSION = 1
+
+MARGIN = 50
+SIGNATURE_BOX = (230, 80)
+COPY_CHUNK_SIZE = 64 * 1024
+
+TEXT = (0.1, 0.1, 0.1)
+MUTED = (0.4, 0.4, 0.4)
+RULE = (0.75, 0.75, 0.75)
+PANEL = (0.96, 0.96, 0.96)
+
+
+def get_pdf_cache_root():
+    return getattr(settings, 'HANDOVER_PDF_ROOT', os.path.join(settings.BASE_DIR, 'private', 'handover_pdfs'))
+
+
+def get_pdf_filename(handover):
+    """Download name for a handover's PDF"""
+    return f"{handover.handover_id}.pdf"
+
+
+def _cache_prefix(handover):
+    return f"{handover.id}-"
+
+
+def _cache_name(handover):
+    version = int(handover.updated_at.timestamp() * 1_000_000) if handover.updated_at else 0
+    return f"{_cache_prefix(handover)}{version}-v{LAYOUT_VERSION}.pdf"
+
+
+def get_handover_pdf_path(handover):
+    """
+    Path of the cached PDF for ``handover``, rendering it first if the handover
+    changed since the last render. Older renders of the same handover are deleted.
+    """
+    root = get_pdf_cache_root()
+    path = os.path.join(root, _cache_name(handover))
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(root, exist_ok=True)
+    pdf_bytes = render_handover_pdf(handover)
+
+    # Write to a temporary file and rename so readers never see a partial PDF
+    fd, temp_path = tempfile.mkstemp(dir=root, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            temp_file.write(pdf_bytes)
+        os.replace(temp_path, path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    prefix = _cache_prefix(handover)
+    for name in os.listdir(root):
+        if name.startswith(prefix) and name.endswith('.pdf') and name != os.path.basename(path):
+            try:
+                os.remove(os.path.join(root, name))
+            except OSError:
+                pass
+
+    logger.info(f"Rendered handover PDF {handover.handover_id} ({len(pdf_bytes)} bytes)")
+    return path
+
+
+def render_handover_pdf(handover):
+    """Render a handover document and return the PDF bytes"""
+    employee = handover.employee
+    document = PDFDocument(
+        title=f"Asset Handover {handover.handover_id}",
+        author='Harren Group IT',
+        creation_date=handover.updated_at,
+    )
+    writer = _PageWriter(document, handover.handover_id)
+
+    writer.heading('Harren Group Asset Handover Document', size=18)
+    writer.line_of_text(f"Handover ID: {handover.handover_id}", color=MUTED)
+    writer.line_of_text(f"Created on: {_format_datetime(handover.created_at)}", color=MUTED)
+    writer.rule()
+
+    writer.section('Employee Information')
+    writer.fields([
+        ('Employee Name', employee.name),
+        ('Department', employee.get_department_display()),
+        ('Email', employee.email),
+        ('Office', employee.get_office_location_display()),
+    ])
+
+    writer.section('Assigned Assets')
+    assets = list(handover.assets.all())
+    if assets:
+        for asset in assets:
+            fields = [
+                ('Asset Name', asset.name),
+                ('Serial Number', asset.serial_number),
+                ('Type', asset.get_asset_type_display()),
+            ]
+            if asset.model:
+                fields.append(('Model', asset.model))
+            if asset.manufacturer:
+                fields.append(('Manufacturer', asset.manufacturer))
+            fields.append(('Status', asset.get_status_display()))
+            writer.panel(fields)
+    else:
+        writer.line_of_text('No assets assigned to this handover.', color=MUTED)
+
+    writer.section('Handover Details')
+    created_by = handover.created_by
+    details = [
+        ('Handover Mode', handover.mode),
+        ('Status', handover.status),
+        ('Created By', created_by.get_full_name() or created_by.username),
+        ('Created Date', _format_datetime(handover.created_at)),
+    ]
+    if handover.completed_at:
+        details.append(('Completed Date', _format_datetime(handover.completed_at)))
+    writer.fields(details)
+    if handover.notes:
+        writer.label('Notes')
+        writer.paragraph(handover.notes)
+
+    writer.section('Signatures & Acknowledgments')
+    writer.signatures([
+        ('Employee Signature', handover.employee_signature_blob, f"Signed by: {employee.name}"),
+        ('IT Staff Signature', handover.it_signature_blob, 'Signed by: IT Staff'),
+    ])
+    writer.label('Employee Acknowledgment')
+    if handover.employee_acknowledgment:
+        writer.line_of_text(f"Acknowledged by {employee.name}")
+    else:
+        writer.line_of_text('Not acknowledged', color=MUTED)
+
+    writer.finish()
+    return document.to_bytes()
+
+
+def get_export_queryset(start_date=None, end_date=None, office=None):
+    """Handovers for a bulk export, filtered by creation date range and employee office"""
+    handovers = Handover.objects.select_related(
+        'employee', 'created_by', 'employee_signature_blob', 'it_signature_blob',
+    ).prefetch_related('assets').order_by('created_at')
+    if start_date:
+        handovers = handovers.filter(created_at__date__gte=start_date)
+    if end_date:
+        handovers = handovers.filter(created_at__date__lte=end_date)
+    if office:
+        handovers = handovers.filter(employee__office_location=office)
+    return handovers
+
+
+def stream_handover_pdf_zip(handovers):
+    """
+    Yield a ZIP archive of handover PDFs chunk by chunk. PDFs are already
+    compressed, so entries are stored rather than deflated again.
+    """
+    output = _ChunkBuffer()
+    with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for handover in handovers.iterator(chunk_size=100):
+            try:
+                path = get_handover_pdf_path(handover)
+            except Exception as e:
+                logger.error(f"Could not render PDF for handover {handover.handover_id}: {e}")
+                continue
+
+            info = zipfile.ZipInfo(get_pdf_filename(handover), date_time=_zip_timestamp(handover.updated_at))
+            info.compress_type = zipfile.ZIP_STORED
+            with open(path, 'rb') as pdf_file, archive.open(info, 'w') as entry:
+                while True:
+                    chunk = pdf_file.read(COPY_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    entry.write(chunk)
+                    yield output.take()
+            yield output.take()
+    yield output.take()
+
+
+class _ChunkBuffer(io.RawIOBase):
+    """Write-only, unseekable buffer that hands out what was written since the last take()"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        # zipfile records entry offsets with tell(); seek() stays unsupported
+        return self._position
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class _PageWriter:
+    """Lays out blocks top to bottom, starting a new page when one is full"""
+
+    def __init__(self, document, footer):
+        self.document = document
+        self.footer = footer
+        self.page = None
+        self.y = 0
+        self._new_page()
+
+    @property
+    def width(self):
+        return self.page.width - 2 * MARGIN
+
+    def _new_page(self):
+        self.page = self.document.add_page()
+        self.y = MARGIN
+
+    def _ensure_space(self, height):
+        if self.y + height > self.page.height - MARGIN:
+            self._new_page()
+
+    def heading(self, text, size=14):
+        self._ensure_space(size + 8)
+        self.y += size
+        self.page.text(MARGIN, self.y, text, size=size, font='bold', color=TEXT)
+        self.y += 8
+
+    def section(self, text):
+        self._ensure_space(60)
+        self.y += 12
+        self.heading(text, size=13)
+        self.page.line(MARGIN, self.y - 4, MARGIN + self.width, self.y - 4, color=RULE)
+        self.y += 4
+
+    def rule(self):
+        self.y += 6
+        self.page.line(MARGIN, self.y, MARGIN + self.width, self.y, width=1, color=TEXT)
+        self.y += 10
+
+    def label(self, text):
+        self._ensure_space(22)
+        self.y += 9
+        self.page.text(MARGIN, self.y, text, size=8, font='bold', color=MUTED)
+        self.y += 4
+
+    def line_of_text(self, text, size=10, color=TEXT):
+        self._ensure_space(size + 4)
+        self.y += size
+        self.page.text(MARGIN, self.y, text, size=size, color=color)
+        self.y += 4
+
+    def paragraph(self, text, size=10):
+        for line in wrap_text(text, size, self.width):
+            self.line_of_text(line, size)
+
+    def fields(self, fields, columns=2, x_offset=0, width=None):
+        """Label/value pairs in a grid"""
+        width = width or self.width
+        column_width = width / columns
+        for row, wrapped, row_height in self._field_rows(fields, columns, width):
+            self._ensure_space(row_height)
+            for column, ((label, _), lines) in enumerate(zip(row, wrapped)):
+                x = MARGIN + x_offset + column * column_width
+                self.page.text(x, self.y + 9, label, size=8, font='bold', color=MUTED)
+                for line_index, line in enumerate(lines):
+                    self.page.text(x, self.y + 22 + line_index * 13, line, size=10, color=TEXT)
+            self.y += row_height + 4
+
+    def _field_rows(self, fields, columns, width):
+        """(row, wrapped values, row height) for each grid row"""
+        column_width = width / columns
+        rows = []
+        for index in range(0, len(fields), columns):
+            row = fields[index:index + columns]
+            wrapped = [wrap_text(str(value or '-'), 10, column_width - 10) for _, value in row]
+            rows.append((row, wrapped, 14 + 13 * max(len(lines) for lines in wrapped)))
+        return rows
+
+    def panel(self, fields):
+        """Shaded box around a grid of fields (one per asset)"""
+        rows = self._field_rows(fields, 3, self.width - 16)
+        height = sum(row_height + 4 for _, _, row_height in rows) + 8
+        self._ensure_space(height + 6)
+        self.page.rect(MARGIN, self.y, self.width, height, stroke=RULE, fill=PANEL)
+        self.y += 4
+        self.fields(fields, columns=3, x_offset=8, width=self.width - 16)
+        self.y += 6
+
+    def signatures(self, entries):
+        """Side-by-side signature boxes with the signer below each"""
+        box_width, box_height = SIGNATURE_BOX
+        self._ensure_space(box_height + 40)
+        top = self.y
+        for column, (title, blob, signer) in enumerate(entries):
+            x = MARGIN + column * (self.width / len(entries))
+            self.page.text(x, top + 10, title, size=10, font='bold', color=TEXT)
+            box_top = top + 16
+            self.page.rect(x, box_top, box_width, box_height, stroke=RULE)
+            if blob is None:
+                self.page.text(x + 10, box_top + box_height / 2 + 3, 'No signature provided', size=9, color=MUTED)
+            else:
+                if not self._draw_signature(blob, x + 5, box_top + 5, box_width - 10, box_height - 10):
+                    self.page.text(x + 10, box_top + box_height / 2 + 3, 'Signature on file', size=9, color=MUTED)
+                self.page.text(x, box_top + box_height + 12, signer, size=8, color=MUTED)
+        self.y = top + 16 + box_height + 20
+
+    def _draw_signature(self, blob, x, y, width, height):
+        """Draw a SignatureBlob into the box; returns False if it can't be drawn"""
+        data = bytes(blob.data)
+        if blob.is_strokes:
+            try:
+                canvas_width, canvas_height, strokes = parse_strokes(data)
+            except StrokeFormatError:
+                return False
+            scale = min(width / canvas_width, height / canvas_height)
+            offset_x = x + (width - canvas_width * scale) / 2
+            offset_y = y + (height - canvas_height * scale) / 2
+            self.page.polylines(strokes, offset_x, offset_y, scale, width=max(2.5 * scale, 0.6))
+            return True
+        if blob.content_type in ('image/png', 'image/jpeg'):
+            return self._draw_raster(data, x, y, width, height)
+        return False
+
+    def _draw_raster(self, data, x, y, width, height):
+        try:
+            from PIL import Image
+        except ImportError:
+            return False
+        try:
+            image = Image.open(io.BytesIO(data))
+            image.load()
+        except Exception as e:
+            logger.warning(f"Could not decode signature image: {e}")
+            return False
+
+        # Flatten transparency onto white; signature pads export transparent PNGs
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.split()[-1])
+            image = background
+        else:
+            image = image.convert('RGB')
+        image.thumbnail((int(width * 3), int(height * 3)))
+
+        scale = min(width / image.width, height / image.height)
+        draw_width, draw_height = image.width * scale, image.height * scale
+        self.page.image(
+            x + (width - draw_width) / 2, y + (height - draw_height) / 2, draw_width, draw_height,
+            image.width, image.height, image.tobytes(),
+        )
+        return True
+
+    def finish(self):
+        """Page numbers and document id in every page footer"""
+        total = len(self.document.pages)
+        for number, page in enumerate(self.document.pages, start=1):
+            page.line(MARGIN, page.height - MARGIN + 10, page.width - MARGIN, page.height - MARGIN + 10, color=RULE)
+            page.text(MARGIN, page.height - MARGIN + 24, self.footer, size=8, color=MUTED)
+            page.text_right(page.width - MARGIN, page.height - MARGIN + 24, f"Page {number} of {total}", size=8, color=MUTED)
+
+
+def _format_datetime(value):
+    if not value:
+        return '-'
+    return timezone.localtime(value).strftime('%B %d, %Y %I:%M %p') if timezone.is_aware(value) else value.strftime('%B %d, %Y %I:%M %p')
+
+
+def _zip_timestamp(value):
+    value = timezone.localtime(value) if value and timezone.is_aware(value) else value
+    if not value or value.year < 1980:
+        return (1980, 1, 1, 0, 0, 0)
+    return (value.year, value.month, value.day, value.hour, value.minute, value.second)
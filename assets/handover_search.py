@@ -0,0 +1,63 @@
+"""
+Denormalized search text for handovers.
+
+``Handover.search_text`` holds the lower-cased handover id, employee name and
+email, asset names and serial numbers and the notes, so searching handovers is
+a substring match on one column with no joins and no DISTINCT. On PostgreSQL
+the column has a trigram index (migration 0037) that serves ``LIKE '%...%'``.
+
+The text is rebuilt in ``Handover.save()`` and, through the signal handlers in
+``signals.py``, whenever the handover's assets change or an employee or asset
+whose details appear in it is renamed. ``manage.py rebuild_handover_search``
+rebuilds every row after bulk changes that bypass signals.
+"""
+
+from django.db.models import Prefetch
+
+from .models import Asset, Handover
+
+
+def normalize_search_query(query):
+    return ' '.join(str(query).split()).lower()
+
+
+def build_search_text(handover_id, employee, assets, notes):
+    """Search text from the handover's parts (``assets`` is an iterable of Asset)"""
+    parts = [handover_id or '']
+    if employee is not None:
+        parts.extend([employee.name or '', employee.email or ''])
+    for asset in assets:
+        parts.extend([asset.name or '', asset.serial_number or ''])
+    parts.append(notes or '')
+    return normalize_search_query(' '.join(parts))
+
+
+def refresh_search_text(handover_ids, batch_size=500):
+    """Rebuild search_text for the given handovers with a bulk update; returns the number updated"""
+    handover_ids = list(handover_ids)
+    updated = 0
+    for start in range(0, len(handover_ids), batch_size):
+        handovers = list(
+            Handover.objects.filter(id__in=handover_ids[start:start + batch_size])
+            .select_related('employee')
+            .prefetch_related(Prefetch('assets', queryset=Asset.objects.only('id', 'name', 'serial_number')))
+            .only('id', 'handover_id', 'notes', 'search_text', 'employee__name', 'employee__email')
+        )
+        changed = []
+        for handover in handovers:
+            text = build_search_text(handover.handover_id, handover.employee, handover.assets.all(), handover.notes)
+            if text != handover.search_text:
+                handover.search_text = text
+                changed.append(handover)
+        # bulk_update skips save(), so updated_at (and the cached PDF) stays as is
+        Handover.objects.bulk_update(changed, ['search_text'])
+        updated += len(changed)
+    return updated
+
+
+def search_handovers(queryset, query):
+    """Filter a Handover queryset by the search text"""
+    query = normalize_search_query(query)
+    if not query:
+        return queryset
+    return queryset.filter(search_text__contains=query)
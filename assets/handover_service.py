@@ -0,0 +1,137 @@
+"""
+Handover creation service.
+
+Creates one or many handovers in a single transaction with a constant number
+of queries: employees and assets are validated with one query each (assets are
+row-locked so two handovers cannot claim the same asset), handover IDs are
+reserved as one block, Handover and HandoverAsset rows are bulk-inserted, and
+all handed-over assets are flipped to 'assigned' with one UPDATE.
+"""
+
+import logging
+import uuid
+
+from django.db import transaction
+from django.db.models import Case, When, Value
+from django.utils import timezone
+
+from .handover_search import build_search_text
+from .inventory_snapshot import bump_data_generation
+from .models import Asset, Employee, Handover, HandoverAsset
+
+logger = logging.getLogger(__name__)
+
+
+class HandoverCreationError(Exception):
+    """Raised when a handover request is invalid; nothing is written"""
+
+
+def create_handover(employee, asset_ids, created_by, mode='Screen Sign', notes=''):
+    """Create a single handover for ``employee`` (Employee instance or id)"""
+    employee_id = employee.id if isinstance(employee, Employee) else employee
+    return create_handovers([
+        {'employee_id': employee_id, 'asset_ids': asset_ids, 'mode': mode, 'notes': notes},
+    ], created_by)[0]
+
+
+def create_handovers(entries, created_by):
+    """
+    Create handovers for a list of entries, each a dict with 'employee_id',
+    'asset_ids' and optional 'mode' and 'notes'. Either every handover is
+    created or, on any validation error, none is.
+    """
+    if not entries:
+        return []
+
+    valid_modes = {choice for choice, _ in Handover.MODE_CHOICES}
+    requested = []
+    for index, entry in enumerate(entries):
+        if not entry.get('employee_id'):
+            raise HandoverCreationError(f"Entry {index + 1}: employee is required")
+        try:
+            employee_id = _parse_uuid(entry['employee_id'])
+            asset_ids = [_parse_uuid(asset_id) for asset_id in (entry.get('asset_ids') or []) if asset_id]
+        except ValueError as e:
+            raise HandoverCreationError(f"Entry {index + 1}: {e}")
+        mode = entry.get('mode') or 'Screen Sign'
+        if mode not in valid_modes:
+            raise HandoverCreationError(f"Entry {index + 1}: invalid mode '{mode}'")
+        if len(set(asset_ids)) != len(asset_ids):
+            raise HandoverCreationError(f"Entry {index + 1}: duplicate assets")
+        requested.append((employee_id, asset_ids, mode, entry.get('notes') or ''))
+
+    all_asset_ids = [asset_id for _, asset_ids, _, _ in requested for asset_id in asset_ids]
+    if len(set(all_asset_ids)) != len(all_asset_ids):
+        raise HandoverCreationError("The same asset cannot be handed over to more than one employee")
+
+    with transaction.atomic():
+        employees = Employee.objects.in_bulk({employee_id for employee_id, _, _, _ in requested})
+        missing_employees = {employee_id for employee_id, _, _, _ in requested} - set(employees)
+        if missing_employees:
+            raise HandoverCreationError(f"Unknown employee(s): {', '.join(sorted(map(str, missing_employees)))}")
+
+        assets = {
+            asset.id: asset
+            for asset in Asset.objects.select_for_update().filter(id__in=all_asset_ids).only('id', 'name', 'serial_number', 'status', 'assigned_to')
+        }
+        missing_assets = set(all_asset_ids) - set(assets)
+        if missing_assets:
+            raise HandoverCreationError(f"Unknown asset(s): {', '.join(sorted(map(str, missing_assets)))}")
+        unavailable = [
+            asset.name for asset in assets.values()
+            if asset.status != 'available' or asset.assigned_to_id is not None
+        ]
+        if unavailable:
+            raise HandoverCreationError(f"Asset(s) not available: {', '.join(sorted(unavailable))}")
+
+        handover_ids = Handover.reserve_handover_ids(len(requested))
+        handovers = [
+            Handover(
+                handover_id=handover_id,
+                employee=employees[employee_id],
+                mode=mode,
+                notes=notes,
+                created_by=created_by,
+                # bulk_create skips save(), so the search text is built here
+                search_text=build_search_text(
+                    handover_id, employees[employee_id], [assets[asset_id] for asset_id in asset_ids], notes,
+                ),
+            )
+            for handover_id, (employee_id, asset_ids, mode, notes) in zip(handover_ids, requested)
+        ]
+        Handover.objects.bulk_create(handovers, batch_size=500)
+
+        HandoverAsset.objects.bulk_create([
+            HandoverAsset(handover=handover, asset_id=asset_id)
+            for handover, (_, asset_ids, _, _) in zip(handovers, requested)
+            for asset_id in asset_ids
+        ], batch_size=500)
+
+        if all_asset_ids:
+            # update() bypasses auto_now, so updated_at is set explicitly
+            Asset.objects.filter(id__in=all_asset_ids).update(
+                status='assigned',
+                assigned_to=Case(
+                    *[
+                        When(id__in=asset_ids, then=Value(employee_id))
+                        for employee_id, asset_ids, _, _ in requested
+                        if asset_ids
+                    ],
+                ),
+                updated_at=timezone.now(),
+            )
+
+    # Bulk writes send no signals
+    bump_data_generation(
+        [('handover', handover.pk) for handover in handovers]
+        + [('asset', asset_id) for asset_id in all_asset_ids]
+    )
+    logger.info(f"Created {len(handovers)} handover(s) with {len(all_asset_ids)} asset(s)")
+    return handovers
+
+
+def _parse_uuid(value):
+    try:
+        return value if isinstance(value, uuid.UUID) else uuid.UUID(str(value).strip())
+    except ValueError:
+        raise ValueError(f"'{value}' is not a valid id")
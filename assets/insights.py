@@ -0,0 +1,183 @@
+"""
+Precomputed inventory insights.
+
+The ``compute_insights`` command evaluates a set of signals (upcoming and
+past warranty and subscription expiries, licenses with more seats in use than
+bought, overdue maintenance, handovers left unsigned, devices that haven't
+signed in to Azure AD for a while) and stores the result as an
+``InsightSnapshot``. Run it on a schedule (cron, or ``--loop``); old snapshots
+are deleted after ``INSIGHTS_RETENTION_DAYS``.
+
+``get_latest_insights`` is what the AI assistant and the quick-insights
+endpoint read. It returns the newest snapshot from the cache, or with one
+indexed query when the cache is cold. The cached copy expires after
+``CACHE_TIMEOUT`` seconds, so with the per-process LocMem cache workers also
+pick up snapshots written by the command's process.
+"""
+
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Asset, Handover, InsightSnapshot
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = 'insights:latest'
+CACHE_TIMEOUT = 60
+ITEMS_PER_SIGNAL = 5
+IN_SERVICE_STATUSES = ['available', 'assigned', 'maintenance']
+OPEN_HANDOVER_STATUSES = ['Pending', 'In Progress', 'Pending Scan']
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _plural(count, singular, plural=None):
+    return singular if count == 1 else (plural or f"{singular}s")
+
+
+def _asset_item(asset, date=None, detail=None):
+    item = {
+        'id': str(asset.id),
+        'name': asset.name,
+        'serial_number': asset.serial_number,
+        'url': reverse('assets:assets_detail', args=[asset.id]),
+    }
+    if date is not None:
+        item['date'] = date.isoformat()
+    if detail:
+        item['detail'] = detail
+    return item
+
+
+def _handover_item(handover):
+    return {
+        'id': str(handover.id),
+        'name': f"{handover.handover_id} ({handover.employee.name})",
+        'status': handover.status,
+        'date': handover.created_at.isoformat(),
+        'url': reverse('assets:handover_detail', args=[handover.id]),
+    }
+
+
+def _signal(key, severity, queryset, message, make_item):
+    """Count ``queryset`` and keep its first few rows as examples"""
+    count = queryset.count()
+    return {
+        'key': key,
+        'severity': severity,
+        'count': count,
+        'message': message(count) if count else None,
+        'items': [make_item(obj) for obj in queryset[:ITEMS_PER_SIGNAL]] if count else [],
+    }
+
+
+def compute_insights():
+    """Evaluate every signal against the current data; a list of signal dicts"""
+    today = timezone.localdate()
+    now = timezone.now()
+    expiry_days = _setting('INSIGHTS_EXPIRY_DAYS', 30)
+    unsigned_days = _setting('INSIGHTS_UNSIGNED_HANDOVER_DAYS', 7)
+    signin_days = _setting('INSIGHTS_STALE_SIGNIN_DAYS', 30)
+    in_service = Asset.objects.filter(status__in=IN_SERVICE_STATUSES).only(
+        'id', 'name', 'serial_number', 'warranty_expiry', 'subscription_end', 'seats', 'used_seats',
+        'maintenance_expected_end', 'azure_last_signin',
+    )
+
+    return [
+        _signal(
+            'subscriptions_expired', 'high',
+            in_service.filter(subscription_end__lt=today).order_by('subscription_end'),
+            lambda n: f"🚨 {n} {_plural(n, 'subscription')} in use {_plural(n, 'has', 'have')} expired",
+            lambda asset: _asset_item(asset, asset.subscription_end),
+        ),
+        _signal(
+            'seats_overallocated', 'high',
+            in_service.filter(seats__isnull=False, used_seats__gt=F('seats')).order_by('name'),
+            lambda n: f"🚨 {n} {_plural(n, 'license')} {_plural(n, 'uses', 'use')} more seats than purchased",
+            lambda asset: _asset_item(asset, detail=f"{asset.used_seats} of {asset.seats} seats in use"),
+        ),
+        _signal(
+            'subscriptions_expiring', 'medium',
+            in_service.filter(subscription_end__range=(today, today + timedelta(days=expiry_days))).order_by('subscription_end'),
+            lambda n: f"⏳ {n} {_plural(n, 'subscription')} {_plural(n, 'expires', 'expire')} within {expiry_days} days",
+            lambda asset: _asset_item(asset, asset.subscription_end),
+        ),
+        _signal(
+            'warranties_expiring', 'medium',
+            in_service.filter(warranty_expiry__range=(today, today + timedelta(days=expiry_days))).order_by('warranty_expiry'),
+            lambda n: f"⏳ {n} {_plural(n, 'warranty', 'warranties')} {_plural(n, 'expires', 'expire')} within {expiry_days} days",
+            lambda asset: _asset_item(asset, asset.warranty_expiry),
+        ),
+        _signal(
+            'maintenance_overdue', 'medium',
+            in_service.filter(status='maintenance', maintenance_expected_end__lt=today).order_by('maintenance_expected_end'),
+            lambda n: f"🔧 {n} {_plural(n, 'asset')} {_plural(n, 'is', 'are')} still in maintenance past the expected end date",
+            lambda asset: _asset_item(asset, asset.maintenance_expected_end),
+        ),
+        _signal(
+            'handovers_unsigned', 'medium',
+            Handover.objects.filter(
+                status__in=OPEN_HANDOVER_STATUSES, created_at__lt=now - timedelta(days=unsigned_days),
+            ).select_related('employee').only('id', 'handover_id', 'status', 'created_at', 'employee__name').order_by('created_at'),
+            lambda n: f"📋 {n} {_plural(n, 'handover')} {_plural(n, 'has', 'have')} been waiting for a signature for more than {unsigned_days} days",
+            _handover_item,
+        ),
+        _signal(
+            'warranties_expired', 'low',
+            in_service.filter(warranty_expiry__lt=today).order_by('warranty_expiry'),
+            lambda n: f"⚠️ {n} {_plural(n, 'asset')} in service {_plural(n, 'is', 'are')} out of warranty",
+            lambda asset: _asset_item(asset, asset.warranty_expiry),
+        ),
+        _signal(
+            'stale_signins', 'low',
+            in_service.filter(
+                status='assigned', azure_ad_id__isnull=False, azure_last_signin__lt=now - timedelta(days=signin_days),
+            ).order_by('azure_last_signin'),
+            lambda n: f"💤 {n} assigned {_plural(n, 'device has', 'devices have')} not signed in to Azure AD for {signin_days}+ days",
+            lambda asset: _asset_item(asset, asset.azure_last_signin),
+        ),
+    ]
+
+
+def _payload(snapshot):
+    return {
+        'computed_at': snapshot.computed_at.isoformat(),
+        'messages': [signal['message'] for signal in snapshot.signals if signal['count']],
+        'signals': snapshot.signals,
+    }
+
+
+def refresh_insights():
+    """Compute and store a new snapshot, delete expired ones; returns the snapshot"""
+    started = time.monotonic()
+    signals = compute_insights()
+    snapshot = InsightSnapshot.objects.create(
+        signals=signals,
+        duration_ms=int((time.monotonic() - started) * 1000),
+    )
+    retention = timezone.now() - timedelta(days=_setting('INSIGHTS_RETENTION_DAYS', 30))
+    InsightSnapshot.objects.filter(computed_at__lt=retention).delete()
+    cache.set(CACHE_KEY, _payload(snapshot), CACHE_TIMEOUT)
+    logger.info(f"Computed insights in {snapshot.duration_ms}ms")
+    return snapshot
+
+
+def get_latest_insights():
+    """{'computed_at', 'messages', 'signals'} of the newest snapshot (computed now if there is none yet)"""
+    payload = cache.get(CACHE_KEY)
+    if payload is None:
+        snapshot = InsightSnapshot.objects.first()
+        if snapshot is None:
+            snapshot = refresh_insights()
+        payload = _payload(snapshot)
+        cache.set(CACHE_KEY, payload, CACHE_TIMEOUT)
+    return payload
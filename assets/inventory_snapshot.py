@@ -0,0 +1,150 @@
+"""
+Versioned inventory snapshot shared by the dashboard and the AI assistant.
+
+The inventory data generation is a counter in the shared cache. The signal
+handlers in ``signals.py`` bump it whenever an asset, employee, handover,
+handover asset or welcome pack is saved or deleted, and bulk writes bump it
+explicitly. Each bump can record which records changed, so the AI retrieval
+index (``retrieval_index.py``) only has to re-read those.
+
+``get_inventory_snapshot`` returns the counts and recent activity for the
+current generation. They are computed with a handful of aggregate queries the
+first time they are needed after a change and read from the cache after that. The AI answer cache (``ai_cache.py``) is keyed by the same
+generation.
+
+Snapshots also expire after ``SNAPSHOT_TIMEOUT`` seconds, which bounds how far
+``QuerySet.update()`` calls that bypass the signals can leave them behind.
+"""
+
+import time
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Asset, Employee, Handover, WelcomePack
+
+GENERATION_KEY = 'inventory:data_generation'
+SNAPSHOT_TIMEOUT = 300
+CHANGE_LOG_TIMEOUT = 24 * 3600
+# Beyond this many changes a full rebuild of the retrieval index is cheaper
+MAX_CHANGE_LOG_GAP = 1000
+RECENT_ACTIVITY_LIMIT = 5
+
+
+def _fresh_generation():
+    # After a cache restart or eviction the counter starts over from a value
+    # no earlier generation had, so nothing keyed by an old one looks current
+    return int(time.time())
+
+
+def get_data_generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, _fresh_generation(), None)
+        generation = cache.get(GENERATION_KEY)
+        if generation is None:
+            generation = _fresh_generation()
+    return generation
+
+
+def bump_data_generation(changes=None):
+    """
+    Mark the inventory as changed: snapshots and cached AI answers are rebuilt
+    on next use. ``changes`` lists the changed records as (kind, pk) pairs,
+    kind being 'asset', 'employee' or 'handover', for the AI retrieval index
+    (see get_changes); without it the index is rebuilt from scratch.
+    """
+    try:
+        generation = cache.incr(GENERATION_KEY)
+    except ValueError:
+        # Not set yet (or evicted)
+        generation = _fresh_generation()
+        cache.set(GENERATION_KEY, generation, None)
+    if changes is not None:
+        cache.set(_change_key(generation), [(kind, str(pk)) for kind, pk in changes], CHANGE_LOG_TIMEOUT)
+    return generation
+
+
+def _change_key(generation):
+    return f'inventory:changes:{generation}'
+
+
+def get_changes(since, until):
+    """
+    (kind, pk) changes recorded for the generations after ``since`` up to
+    ``until``, or None if any of them is unknown (not recorded or expired).
+    """
+    if until - since > MAX_CHANGE_LOG_GAP:
+        return None
+    keys = [_change_key(generation) for generation in range(since + 1, until + 1)]
+    found = cache.get_many(keys)
+    if len(found) != len(keys):
+        return None
+    return [change for key in keys for change in found[key]]
+
+
+def _snapshot_key(generation, today):
+    # The date is part of the key because of the "handovers today" count
+    return f'inventory:snapshot:{generation}:{today.isoformat()}'
+
+
+def get_inventory_snapshot():
+    """Counts and recent activity for the current data generation (see build_inventory_snapshot)"""
+    key = _snapshot_key(get_data_generation(), timezone.localdate())
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_inventory_snapshot()
+        cache.set(key, snapshot, SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+def build_inventory_snapshot():
+    assets = Asset.objects.aggregate(
+        total=Count('id'),
+        available=Count('id', filter=Q(status='available')),
+        unassigned=Count('id', filter=Q(assigned_to__isnull=True)),
+        unhealthy=Count('id', filter=Q(health_score__lt=50)),
+        bremen=Count('id', filter=Q(office_location='bremen')),
+        hamburg=Count('id', filter=Q(office_location='hamburg')),
+        other=Count('id', filter=Q(office_location='other')),
+    )
+    handovers = Handover.objects.aggregate(
+        total=Count('id'),
+        pending=Count('id', filter=Q(status='Pending')),
+        pending_scan=Count('id', filter=Q(status='Pending Scan')),
+        today=Count('id', filter=Q(created_at__date=timezone.localdate())),
+    )
+
+    return {
+        'built_at': timezone.now(),
+        'stats': {
+            'total_assets': assets['total'],
+            'total_employees': Employee.objects.count(),
+            'total_handovers': handovers['total'],
+            'total_welcome_packs': WelcomePack.objects.count(),
+        },
+        'office_distribution': {
+            'bremen_assets': assets['bremen'],
+            'hamburg_assets': assets['hamburg'],
+            'other_assets': assets['other'],
+        },
+        'assets': {
+            'available': assets['available'],
+            'unassigned': assets['unassigned'],
+            'unhealthy': assets['unhealthy'],
+        },
+        'handovers': {
+            'pending': handovers['pending'],
+            'pending_scan': handovers['pending_scan'],
+            'today': handovers['today'],
+        },
+        'recent_activity': {
+            'recent_handovers': list(Handover.objects.order_by('-created_at')[:RECENT_ACTIVITY_LIMIT].values(
+                'id', 'employee__name', 'status', 'created_at'
+            )),
+            'recent_assets': list(Asset.objects.order_by('-created_at')[:RECENT_ACTIVITY_LIMIT].values(
+                'id', 'name', 'serial_number', 'asset_type', 'assigned_to__name'
+            )),
+        },
+    }
@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from assets.ai_benchmark import run_benchmark
+
+
+def _seconds(summary):
+    if not summary['count']:
+        return 'n/a'
+    return f"p50 {summary['p50']:.2f}s  p95 {summary['p95']:.2f}s  max {summary['max']:.2f}s"
+
+
+class Command(BaseCommand):
+    help = 'Measure AI chat latency and throughput with concurrent chat sessions against a fake Ollama'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=8, help='Concurrent chat sessions')
+        parser.add_argument('--questions', type=int, default=5, help='Questions asked one after another per session')
+        parser.add_argument('--url', help='Benchmark a running instance (e.g. http://127.0.0.1:8000) instead of an in-process one')
+        parser.add_argument('--server', choices=['asgi', 'wsgi'], default='asgi',
+                            help='In-process only: serve /ai-chat/ from the ASGI AI process (as in production) or the WSGI workers')
+        parser.add_argument('--threads', type=int, default=8, help='In-process only: WSGI worker threads, like gunicorn --threads')
+        parser.add_argument('--probe-path', default='/accounts/login/', help='Page requested during the run to measure the impact on other users')
+        parser.add_argument('--tokens-per-second', type=float, default=20.0, help='Fake Ollama generation speed')
+        parser.add_argument('--ttft', type=float, default=0.5, help='Fake Ollama time to first token (seconds)')
+        parser.add_argument('--tokens', type=int, default=60, help='Fake Ollama tokens per answer')
+        parser.add_argument('--parallel', type=int, default=2, help='Fake Ollama generations at once (OLLAMA_NUM_PARALLEL)')
+        parser.add_argument('--load-time', type=float, default=0.0, help='Fake Ollama model load time of the first request')
+
+    def handle(self, *args, **options):
+        if options['sessions'] < 1 or options['questions'] < 1:
+            raise CommandError('--sessions and --questions must be at least 1')
+
+        target = options['url'] or f"in-process {options['server'].upper()}"
+        self.stdout.write(f"Benchmarking {target}: {options['sessions']} session(s) x {options['questions']} question(s)...")
+        report = run_benchmark(
+            sessions=options['sessions'],
+            questions=options['questions'],
+            url=options['url'],
+            server=options['server'],
+            threads=options['threads'],
+            probe_path=options['probe_path'],
+            tokens_per_second=options['tokens_per_second'],
+            ttft=options['ttft'],
+            tokens=options['tokens'],
+            parallel=options['parallel'],
+            load_time=options['load_time'],
+        )
+
+        answered = report['latency']['count']
+        self.stdout.write(f"Answers:        {answered}/{report['questions']} in {report['elapsed']:.1f}s ({report['answers_per_second']:.2f}/s)")
+        self.stdout.write(f"First token:    {_seconds(report['ttft'])}")
+        self.stdout.write(f"Full answer:    {_seconds(report['latency'])}")
+        if report.get('gateway') or options['url']:
+            self.stdout.write(f"Queued:         {report['queued']} answer(s) waited in the gateway queue")
+        self.stdout.write(f"Probe page:     {_seconds(report['probe'])}"
+                          + (f"  ({len(report['probe_failures'])} failed)" if report['probe_failures'] else ''))
+
+        if 'wsgi' in report:
+            wsgi = report['wsgi']
+            self.stdout.write(
+                f"WSGI threads:   peak {wsgi['peak_busy']}/{wsgi['threads']} busy, all busy {wsgi['saturated_share']:.0%} of the time, "
+                f"peak {wsgi['peak_waiting']} request(s) waiting for a thread"
+            )
+            gateway = report['gateway']
+            if gateway and gateway['concurrency']:
+                self.stdout.write(f"AI gateway:     peak {gateway['peak_active']}/{gateway['concurrency']} generating, peak {gateway['peak_queued']} queued")
+            ollama = report['ollama']
+            self.stdout.write(
+                f"Fake Ollama:    peak {ollama['peak_active']}/{ollama['parallel']} generating, peak {ollama['peak_waiting']} waiting, "
+                f"{ollama['cancelled']} cancelled"
+            )
+
+        if report['errors']:
+            self.stdout.write(self.style.WARNING(f"{len(report['errors'])} question(s) failed, e.g.: {report['errors'][0]}"))
+        else:
+            self.stdout.write(self.style.SUCCESS('All questions answered'))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from assets.retrieval_index import get_index_path, index_available, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the AI retrieval index over all assets, employees and handovers (AI_INDEX_PATH)'
+
+    def handle(self, *args, **options):
+        if not index_available():
+            raise CommandError('NumPy is not installed; run pip install -r requirements.txt')
+
+        started = time.monotonic()
+        index = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {len(index)} record(s) in {time.monotonic() - started:.2f}s, saved to {get_index_path()}"
+        ))
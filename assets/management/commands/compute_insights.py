@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from assets.insights import refresh_insights
+
+
+class Command(BaseCommand):
+    help = 'Compute the inventory insights read by the AI assistant and store them as a snapshot'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running and recompute every --interval seconds instead of exiting after one pass',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=900,
+            help='Seconds between computations (with --loop)',
+        )
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            self._report(refresh_insights())
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"Insights engine started, computing every {options['interval']:g}s..."))
+        try:
+            while True:
+                self._report(refresh_insights())
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write('Insights engine stopped.')
+
+    def _report(self, snapshot):
+        active = [signal for signal in snapshot.signals if signal['count']]
+        self.stdout.write(self.style.SUCCESS(
+            f"Computed {len(snapshot.signals)} signal(s) in {snapshot.duration_ms}ms, {len(active)} with findings"
+        ))
+        for signal in active:
+            self.stdout.write(f"  [{signal['severity']}] {signal['message']}")
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from assets.email_queue import deliver_pending_emails
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued outbound emails (retries failed ones with exponential backoff)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running and poll the queue instead of exiting after one pass',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Maximum number of emails to deliver per pass',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Seconds to sleep between passes when the queue is empty (with --loop)',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        if not options['loop']:
+            self._report(deliver_pending_emails(batch_size))
+            return
+
+        self.stdout.write(self.style.SUCCESS('Email worker started, polling the outbound queue...'))
+        try:
+            while True:
+                results = deliver_pending_emails(batch_size)
+                if any(results.values()):
+                    self._report(results)
+                # Drain full batches back to back, sleep only when the queue is idle
+                if sum(results.values()) < batch_size:
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write('Email worker stopped.')
+
+    def _report(self, results):
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Sent: {results['sent']}, retrying: {results['retrying']}, failed: {results['failed']}"
+            )
+        )
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from assets.fake_ollama import FakeOllamaServer
+
+
+class Command(BaseCommand):
+    help = 'Run a fake Ollama server with synthetic timing, for measuring the AI chat without a model'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=11435)
+        parser.add_argument('--model', default='fake-model', help='Model name reported in responses')
+        parser.add_argument('--tokens-per-second', type=float, default=20.0, help='Generation speed after the first token')
+        parser.add_argument('--ttft', type=float, default=0.5, help='Seconds until the first token (prompt evaluation)')
+        parser.add_argument('--tokens', type=int, default=60, help='Tokens per answer')
+        parser.add_argument('--parallel', type=int, default=2, help='Generations run at once, like OLLAMA_NUM_PARALLEL')
+        parser.add_argument('--load-time', type=float, default=0.0, help='Extra delay of the first request (cold model)')
+
+    def handle(self, *args, **options):
+        server = FakeOllamaServer(
+            host=options['host'],
+            port=options['port'],
+            model=options['model'],
+            tokens_per_second=options['tokens_per_second'],
+            ttft=options['ttft'],
+            tokens=options['tokens'],
+            parallel=options['parallel'],
+            load_time=options['load_time'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Fake Ollama listening on {server.url}: {options['tokens']} tokens at "
+            f"{options['tokens_per_second']:g} tok/s after {options['ttft']:g}s, {options['parallel']} in parallel"
+        ))
+        self.stdout.write(f"Start the app with OLLAMA_URL={server.url} to use it. Ctrl+C to stop.")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            stats = server.stats
+            self.stdout.write(
+                f"Fake Ollama stopped: {stats['requests']} generation(s), {stats['completed']} completed, "
+                f"{stats['cancelled']} cancelled, peak {stats['peak_active']} running / {stats['peak_waiting']} waiting"
+            )
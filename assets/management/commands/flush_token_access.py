@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from assets.access_counters import buffering_enabled, flush_access_counts
+
+
+class Command(BaseCommand):
+    help = 'Write buffered public token access counts from the cache to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running and flush every --interval seconds instead of exiting after one pass',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=60,
+            help='Seconds between flushes (with --loop)',
+        )
+
+    def handle(self, *args, **options):
+        if not buffering_enabled():
+            self.stdout.write(self.style.WARNING(
+                'TOKEN_ACCESS_BUFFERING is off, accesses are written directly; nothing to flush.'
+            ))
+
+        if not options['loop']:
+            self._report(flush_access_counts())
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"Access counter flusher started, flushing every {options['interval']:g}s..."))
+        try:
+            while True:
+                results = flush_access_counts()
+                if any(results.values()):
+                    self._report(results)
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            # Don't lose what was buffered since the last pass
+            self._report(flush_access_counts())
+            self.stdout.write('Access counter flusher stopped.')
+
+    def _report(self, results):
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Flushed handover token accesses: {results['handover']}, "
+                f"welcome pack token accesses: {results['welcome_pack']}"
+            )
+        )
@@ -0,0 +1,58 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from assets.models import NotificationCounter
+from assets.notification_service import get_retention_days, prune_notifications
+
+
+class Command(BaseCommand):
+    help = 'Delete read notifications older than the retention period (NOTIFICATION_RETENTION_DAYS)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help='Keep read notifications from the last N days (default: NOTIFICATION_RETENTION_DAYS)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Notifications deleted per statement',
+        )
+        parser.add_argument(
+            '--archive',
+            help='Append the deleted notifications to this file as JSON lines',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many notifications would be deleted',
+        )
+        parser.add_argument(
+            '--recount',
+            action='store_true',
+            help='Also recompute every user\'s unread notification counter',
+        )
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else get_retention_days()
+
+        if options['dry_run']:
+            count = prune_notifications(days, dry_run=True)
+            self.stdout.write(f"{count} read notification(s) older than {days} days would be deleted")
+        elif options['archive']:
+            with open(options['archive'], 'a', encoding='utf-8') as archive:
+                count = prune_notifications(days, options['chunk_size'], archive)
+            self.stdout.write(self.style.SUCCESS(
+                f"Deleted {count} read notification(s) older than {days} days, archived to {options['archive']}"
+            ))
+        else:
+            count = prune_notifications(days, options['chunk_size'])
+            self.stdout.write(self.style.SUCCESS(f"Deleted {count} read notification(s) older than {days} days"))
+
+        if options['recount'] and not options['dry_run']:
+            user_ids = list(User.objects.values_list('id', flat=True))
+            NotificationCounter.recount(user_ids)
+            self.stdout.write(self.style.SUCCESS(f"Recounted unread notifications for {len(user_ids)} user(s)"))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from assets.handover_search import refresh_search_text
+from assets.models import Handover
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalized search text of every handover'
+
+    def handle(self, *args, **options):
+        handover_ids = list(Handover.objects.values_list('id', flat=True))
+        updated = refresh_search_text(handover_ids)
+        self.stdout.write(self.style.SUCCESS(f"Checked {len(handover_ids)} handover(s), updated {updated}"))
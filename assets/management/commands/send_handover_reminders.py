@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+
+from assets.email_queue import deliver_pending_emails
+from assets.reminders import queue_handover_reminders
+
+
+class Command(BaseCommand):
+    help = 'Queue signature reminder emails for overdue pending handovers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='List the handovers that would be reminded without sending anything',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Maximum number of reminders to queue in this run',
+        )
+        parser.add_argument(
+            '--deliver',
+            action='store_true',
+            help='Deliver the queued emails now instead of leaving them to the email worker',
+        )
+
+    def handle(self, *args, **options):
+        handovers = queue_handover_reminders(dry_run=options['dry_run'], limit=options['limit'])
+
+        if options['dry_run']:
+            for handover in handovers:
+                self.stdout.write(
+                    f'{handover.handover_id} - {handover.employee.name} <{handover.employee.email}> '
+                    f'(created {handover.created_at:%Y-%m-%d}, {handover.reminder_count} reminder(s) so far)'
+                )
+            self.stdout.write(self.style.SUCCESS(f'{len(handovers)} handover(s) due a reminder (dry run).'))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f'Queued {len(handovers)} handover reminder(s).'))
+
+        if options['deliver'] and handovers:
+            totals = {'sent': 0, 'retrying': 0, 'failed': 0}
+            while True:
+                results = deliver_pending_emails(limit=200)
+                for key, value in results.items():
+                    totals[key] += value
+                if not any(results.values()):
+                    break
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Sent: {totals['sent']}, retrying: {totals['retrying']}, failed: {totals['failed']}"
+                )
+            )
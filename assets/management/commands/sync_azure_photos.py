@@ -63,14 +63,14 @@ class Command(BaseCommand):
             try:
                 self.stdout.write(f'Processing {employee.name}...')
                 
-                # Get photo URL from Azure AD
-                photo_url = azure_ad.get_user_photo_url(employee.azure_ad_id)
+                # Refresh the local photo cache (downloads only when Graph reports a new photo)
+                photo_hash = azure_ad.cache_employee_photo(employee, force=options['force'])
                 
-                if photo_url:
+                if photo_hash:
                     # Update employee with photo URL
-                    employee.avatar_url = photo_url
+                    employee.avatar_url = f"https://graph.microsoft.com/v1.0/users/{employee.azure_ad_id}/photo/$value"
                     employee.last_azure_sync = timezone.now()
-                    employee.save()
+                    employee.save(update_fields=['avatar_url', 'last_azure_sync', 'updated_at'])
                     
                     self.stdout.write(
                         self.style.SUCCESS(f'  ✓ Photo synced for {employee.name}')
@@ -1,97 +1,257 @@
 import os
+import time
+import threading
+import logging
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
 from django.core.mail.backends.base import BaseEmailBackend
 from django.conf import settings
+from .graph_auth import get_token_provider
+
+logger = logging.getLogger(__name__)
+
+GRAPH_BASE_URL = "https://graph.microsoft.com/v1.0"
+
+# Graph accepts at most 20 requests per JSON batch
+GRAPH_BATCH_LIMIT = 20
+
+# Sub-request statuses worth retrying (throttled / temporarily unavailable)
+RETRYABLE_STATUSES = {429, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_graph_session():
+    """Process-wide requests session so connections to Graph are kept alive and reused"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                pool_size = getattr(settings, 'GRAPH_HTTP_POOL_SIZE', 10)
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
+
+def is_connect_failure(error):
+    """
+    True if ``error`` happened while connecting, before any of the request was
+    written (connect timeout, refused, DNS failure). requests also raises
+    ConnectionError for a connection reset after the body was sent, which is
+    not one of these.
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.exceptions.ConnectionError) or isinstance(error, requests.exceptions.SSLError):
+        return False
+    # requests wraps urllib3's MaxRetryError, whose reason is the original error
+    cause = error.args[0] if error.args else None
+    return isinstance(getattr(cause, 'reason', cause), NewConnectionError)
+
+
+class GraphEmailError(Exception):
+    """Raised when one or more messages could not be delivered through Graph"""
+
 
 class MicrosoftGraphEmailBackend(BaseEmailBackend):
-    """Custom email backend using Microsoft Graph API"""
-    
+    """Custom email backend using Microsoft Graph API (JSON batching, pooled connections)"""
+
     def __init__(self, fail_silently=False, **kwargs):
         super().__init__(fail_silently=fail_silently, **kwargs)
         self.tenant_id = os.getenv("AZURE_TENANT_ID")
         self.client_id = os.getenv("AZURE_CLIENT_ID")
         self.client_secret = os.getenv("AZURE_CLIENT_SECRET")
-        self.sender = "it-office-assettrack@harren-group.com"
-    
-    def get_access_token(self):
-        """Get access token using client credentials flow"""
+        self.sender = getattr(settings, 'GRAPH_EMAIL_SENDER', "it-office-assettrack@harren-group.com")
+        self.timeout = getattr(settings, 'GRAPH_EMAIL_TIMEOUT', (5, 30))
+        self.max_retries = getattr(settings, 'GRAPH_EMAIL_MAX_RETRIES', 3)
+        self.max_retry_after = getattr(settings, 'GRAPH_EMAIL_MAX_RETRY_AFTER', 60)
+        self.session = get_graph_session()
+
+    def get_access_token(self, force_refresh=False):
+        """Get access token from the shared Graph token provider"""
         try:
-            token_url = f"https://login.microsoftonline.com/{self.tenant_id}/oauth2/v2.0/token"
-            token_res = requests.post(token_url, data={
-                "client_id": self.client_id,
-                "client_secret": self.client_secret,
-                "scope": "https://graph.microsoft.com/.default",
-                "grant_type": "client_credentials"
-            })
-            token_res.raise_for_status()
-            return token_res.json()["access_token"]
+            return get_token_provider(self.tenant_id, self.client_id, self.client_secret).get_token(force_refresh=force_refresh)
         except Exception as e:
             if not self.fail_silently:
                 raise e
             return None
-    
+
     def send_messages(self, email_messages):
-        """Send email messages using Microsoft Graph API"""
+        """Send email messages using Microsoft Graph API, returns the number sent"""
         if not email_messages:
             return 0
-        
+
+        results = self.send_messages_detailed(email_messages)
+        sent_count = sum(1 for result in results if result['success'])
+
+        failures = [result for result in results if not result['success']]
+        if failures and not self.fail_silently:
+            raise GraphEmailError(
+                f"{len(failures)} of {len(results)} email(s) failed via Microsoft Graph: {failures[0]['error']}"
+            )
+
+        return sent_count
+
+    def send_messages_detailed(self, email_messages):
+        """
+        Send messages in $batch requests of up to 20 sendMail calls.
+        Returns one dict per message, in order: {'message', 'success', 'status', 'error', 'unknown'}.
+        Throttled (429) and temporarily failed sub-requests are retried after the
+        Retry-After delay Graph asks for, up to GRAPH_EMAIL_MAX_RETRIES times.
+        'unknown' is set when the batch may have been delivered without an
+        answer (a read timeout, a connection reset); such messages are not
+        resent. Only failures to connect are retried.
+        """
+        results = [
+            {'message': message, 'success': False, 'status': None, 'error': '', 'unknown': False}
+            for message in email_messages
+        ]
+        if not email_messages:
+            return results
+
         access_token = self.get_access_token()
         if not access_token:
-            return 0
-        
-        sent_count = 0
-        for message in email_messages:
+            for result in results:
+                result['error'] = 'No Microsoft Graph access token'
+            return results
+
+        for start in range(0, len(email_messages), GRAPH_BATCH_LIMIT):
+            self._send_batch(results[start:start + GRAPH_BATCH_LIMIT])
+
+        sent_count = sum(1 for result in results if result['success'])
+        logger.info(f"Sent {sent_count} of {len(results)} email(s) via Microsoft Graph")
+        return results
+
+    def _send_batch(self, batch_results):
+        """Send one batch of at most 20 messages, retrying throttled ones"""
+        pending = {str(index): result for index, result in enumerate(batch_results)}
+        token_refreshed = False
+
+        for attempt in range(self.max_retries + 1):
+            payload = {
+                "requests": [
+                    {
+                        "id": request_id,
+                        "method": "POST",
+                        "url": f"/users/{self.sender}/sendMail",
+                        "headers": {"Content-Type": "application/json"},
+                        "body": self._build_payload(result['message']),
+                    }
+                    for request_id, result in pending.items()
+                ]
+            }
+
             try:
-                # Build message payload
-                to_recipients = [{"emailAddress": {"address": addr}} for addr in message.to]
-                
-                # Determine content type and body
-                content_type = "Text"
-                body_content = message.body
-                
-                # Check for HTML alternative
-                for alt in message.alternatives:
-                    if alt[1] == "text/html":
-                        content_type = "Html"
-                        body_content = alt[0]
-                        break
-                
-                payload = {
-                    "message": {
-                        "subject": message.subject,
-                        "body": {
-                            "contentType": content_type,
-                            "content": body_content
-                        },
-                        "toRecipients": to_recipients
-                    },
-                    "saveToSentItems": True
-                }
-                
-                # Send email via Microsoft Graph
-                response = requests.post(
-                    f"https://graph.microsoft.com/v1.0/users/{self.sender}/sendMail",
+                response = self.session.post(
+                    f"{GRAPH_BASE_URL}/$batch",
                     headers={
-                        "Authorization": f"Bearer {access_token}",
-                        "Content-Type": "application/json"
+                        "Authorization": f"Bearer {self.get_access_token()}",
+                        "Content-Type": "application/json",
                     },
-                    data=json.dumps(payload)
+                    json=payload,
+                    timeout=self.timeout,
                 )
-                
-                if response.status_code == 202:
-                    sent_count += 1
-                    print(f"✅ Email sent successfully via Microsoft Graph (Status: {response.status_code})")
-                else:
-                    print(f"❌ Email failed via Microsoft Graph (Status: {response.status_code})")
-                    if not self.fail_silently:
-                        response.raise_for_status()
-                        
-            except Exception as e:
-                print(f"❌ Error sending email via Microsoft Graph: {e}")
-                if not self.fail_silently:
-                    raise e
-        
-        return sent_count
+            except requests.exceptions.RequestException as e:
+                if not is_connect_failure(e):
+                    # E.g. ReadTimeout or a reset connection: Graph may have
+                    # accepted the batch already. Resending could deliver every
+                    # message twice.
+                    for result in pending.values():
+                        result['error'] = f"No answer from Microsoft Graph, the email may have been sent: {e}"
+                        result['unknown'] = True
+                    return
+                # The batch never reached Graph, so it is safe to resend
+                for result in pending.values():
+                    result['error'] = f"Error sending email via Microsoft Graph: {e}"
+                if attempt < self.max_retries:
+                    time.sleep(min(2 ** attempt, self.max_retry_after))
+                    continue
+                return
+
+            if response.status_code == 401 and not token_refreshed:
+                # Token revoked or expired early - fetch a new one and try again
+                get_token_provider(self.tenant_id, self.client_id, self.client_secret).invalidate()
+                token_refreshed = True
+                continue
+
+            if response.status_code != 200:
+                for result in pending.values():
+                    result['status'] = response.status_code
+                    result['error'] = f"Microsoft Graph batch failed (Status: {response.status_code}): {response.text[:500]}"
+                if response.status_code in RETRYABLE_STATUSES and attempt < self.max_retries:
+                    time.sleep(self._retry_after(response.headers, attempt))
+                    continue
+                return
+
+            retry_delay = 0
+            retry = {}
+            for sub_response in response.json().get('responses', []):
+                result = pending.get(str(sub_response.get('id')))
+                if result is None:
+                    continue
+                status = sub_response.get('status')
+                result['status'] = status
+                if status == 202:
+                    result['success'] = True
+                    result['error'] = ''
+                    continue
+
+                error = (sub_response.get('body') or {}).get('error', {})
+                result['error'] = f"Microsoft Graph sendMail failed (Status: {status}): {error.get('message', '')}"
+                if status in RETRYABLE_STATUSES:
+                    retry[str(sub_response.get('id'))] = result
+                    retry_delay = max(retry_delay, self._retry_after(sub_response.get('headers') or {}, attempt))
+
+            if not retry or attempt >= self.max_retries:
+                return
+
+            pending = retry
+            time.sleep(retry_delay)
+
+    def _retry_after(self, headers, attempt):
+        """Seconds to wait as requested by Graph's Retry-After header (capped)"""
+        retry_after = None
+        for name, value in headers.items():
+            if name.lower() == 'retry-after':
+                retry_after = value
+                break
+        try:
+            delay = float(retry_after)
+        except (TypeError, ValueError):
+            delay = 2 ** attempt
+        return min(max(delay, 0), self.max_retry_after)
+
+    def _build_payload(self, message):
+        """sendMail request body for a Django EmailMessage"""
+        # Determine content type and body
+        content_type = "Text"
+        body_content = message.body
+
+        # Check for HTML alternative
+        for alt in getattr(message, 'alternatives', []):
+            if alt[1] == "text/html":
+                content_type = "Html"
+                body_content = alt[0]
+                break
 
+        graph_message = {
+            "subject": message.subject,
+            "body": {
+                "contentType": content_type,
+                "content": body_content
+            },
+            "toRecipients": [{"emailAddress": {"address": addr}} for addr in message.to],
+        }
+        if message.cc:
+            graph_message["ccRecipients"] = [{"emailAddress": {"address": addr}} for addr in message.cc]
+        if message.bcc:
+            graph_message["bccRecipients"] = [{"emailAddress": {"address": addr}} for addr in message.bcc]
 
+        return {
+            "message": graph_message,
+            "saveToSentItems": True
+        }
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0030_update_bernem_to_bremen_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='photo_checked_at',
+            field=models.DateTimeField(blank=True, help_text='Last time the cached photo was validated against Azure AD', null=True),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='photo_etag',
+            field=models.CharField(blank=True, default='', help_text='Graph media ETag of the cached profile photo', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='photo_hash',
+            field=models.CharField(blank=True, default='', help_text='SHA-256 of the cached profile photo', max_length=64),
+        ),
+    ]
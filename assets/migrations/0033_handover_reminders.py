@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0032_outboundemail'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HandoverReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reminder_number', models.IntegerField(default=1)),
+                ('sent_to', models.EmailField(max_length=254)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='outboundemail',
+            name='kind',
+            field=models.CharField(choices=[('handover_signature', 'Handover Signature Request'), ('welcome_employee', 'Welcome Pack (Employee)'), ('welcome_it', 'Welcome Pack (IT Team)'), ('handover_reminder', 'Handover Signature Reminder'), ('other', 'Other')], default='other', max_length=30),
+        ),
+        migrations.AddIndex(
+            model_name='handover',
+            index=models.Index(fields=['status', 'created_at'], name='assets_hand_status_571e7b_idx'),
+        ),
+        migrations.AddField(
+            model_name='handoverreminder',
+            name='handover',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='assets.handover'),
+        ),
+        migrations.AddField(
+            model_name='handoverreminder',
+            name='outbound_email',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='handover_reminders', to='assets.outboundemail'),
+        ),
+        migrations.AddField(
+            model_name='handoverreminder',
+            name='sent_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='handover_reminders', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='handoverreminder',
+            index=models.Index(fields=['handover', 'created_at'], name='assets_hand_handove_a10cf6_idx'),
+        ),
+    ]
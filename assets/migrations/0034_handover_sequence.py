@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:43
+
+from django.db import migrations, models
+
+
+def seed_handover_sequences(apps, schema_editor):
+    """Start each year's counter after the highest existing HOV-YYYY-NNNN"""
+    Handover = apps.get_model('assets', 'Handover')
+    HandoverSequence = apps.get_model('assets', 'HandoverSequence')
+    
+    highest = {}
+    for handover_id in Handover.objects.filter(handover_id__startswith='HOV-').values_list('handover_id', flat=True).iterator():
+        parts = handover_id.split('-')
+        if len(parts) != 3 or not parts[1].isdigit() or not parts[2].isdigit():
+            continue
+        year, number = int(parts[1]), int(parts[2])
+        highest[year] = max(highest.get(year, 0), number)
+    
+    HandoverSequence.objects.bulk_create([
+        HandoverSequence(year=year, last_value=last_value)
+        for year, last_value in highest.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0033_handover_reminders'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HandoverSequence',
+            fields=[
+                ('year', models.IntegerField(primary_key=True, serialize=False)),
+                ('last_value', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_handover_sequences, migrations.RunPython.noop),
+    ]
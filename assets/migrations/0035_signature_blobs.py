@@ -0,0 +1,99 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:45
+
+import base64
+import binascii
+import hashlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def move_signatures_to_blobs(apps, schema_editor):
+    """Decode the data: URLs stored on each handover into deduplicated SignatureBlob rows"""
+    Handover = apps.get_model('assets', 'Handover')
+    SignatureBlob = apps.get_model('assets', 'SignatureBlob')
+    
+    def to_blob(data_url):
+        header, separator, encoded = (data_url or '').partition(',')
+        if not separator or not header.startswith('data:') or not header.endswith(';base64'):
+            return None
+        try:
+            data = base64.b64decode(encoded)
+        except (binascii.Error, ValueError):
+            return None
+        if not data:
+            return None
+        blob, _ = SignatureBlob.objects.get_or_create(
+            sha256=hashlib.sha256(data).hexdigest(),
+            defaults={'content_type': header[len('data:'):-len(';base64')], 'data': data, 'size': len(data)},
+        )
+        return blob
+    
+    handovers = Handover.objects.exclude(employee_signature='', it_signature='').only('id', 'employee_signature', 'it_signature')
+    skipped = 0
+    for handover in handovers.iterator(chunk_size=100):
+        employee_blob = to_blob(handover.employee_signature)
+        it_blob = to_blob(handover.it_signature)
+        skipped += bool(handover.employee_signature and not employee_blob) + bool(handover.it_signature and not it_blob)
+        Handover.objects.filter(id=handover.id).update(employee_signature_blob=employee_blob, it_signature_blob=it_blob)
+    
+    if skipped:
+        print(f"Skipped {skipped} signature(s) that were not base64 data URLs")
+
+
+def move_blobs_to_signatures(apps, schema_editor):
+    """Reverse: write the blobs back as data: URLs"""
+    Handover = apps.get_model('assets', 'Handover')
+    
+    def to_data_url(blob):
+        if blob is None:
+            return ''
+        return f"data:{blob.content_type};base64,{base64.b64encode(bytes(blob.data)).decode('ascii')}"
+    
+    handovers = Handover.objects.filter(
+        models.Q(employee_signature_blob__isnull=False) | models.Q(it_signature_blob__isnull=False)
+    ).select_related('employee_signature_blob', 'it_signature_blob')
+    for handover in handovers.iterator(chunk_size=100):
+        Handover.objects.filter(id=handover.id).update(
+            employee_signature=to_data_url(handover.employee_signature_blob),
+            it_signature=to_data_url(handover.it_signature_blob),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0034_handover_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SignatureBlob',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('content_type', models.CharField(default='image/png', max_length=50)),
+                ('data', models.BinaryField()),
+                ('size', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='handover',
+            name='employee_signature_blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='assets.signatureblob'),
+        ),
+        migrations.AddField(
+            model_name='handover',
+            name='it_signature_blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='assets.signatureblob'),
+        ),
+        migrations.RunPython(move_signatures_to_blobs, move_blobs_to_signatures),
+        migrations.RemoveField(
+            model_name='handover',
+            name='employee_signature',
+        ),
+        migrations.RemoveField(
+            model_name='handover',
+            name='it_signature',
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0035_signature_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='handover',
+            name='public_link_version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AlterField(
+            model_name='handovertoken',
+            name='token',
+            field=models.CharField(help_text='Unique token for public access', max_length=255, unique=True),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:55
+
+from django.db import migrations, models, transaction
+
+
+def build_search_text(apps, schema_editor):
+    """Fill search_text for existing handovers (same format as assets.handover_search)"""
+    Handover = apps.get_model('assets', 'Handover')
+    HandoverAsset = apps.get_model('assets', 'HandoverAsset')
+
+    assets_by_handover = {}
+    for handover_id, name, serial_number in HandoverAsset.objects.values_list('handover_id', 'asset__name', 'asset__serial_number').iterator(chunk_size=2000):
+        assets_by_handover.setdefault(handover_id, []).extend([name or '', serial_number or ''])
+
+    batch = []
+    handovers = Handover.objects.select_related('employee').only('id', 'handover_id', 'notes', 'employee__name', 'employee__email')
+    for handover in handovers.iterator(chunk_size=500):
+        parts = [handover.handover_id or '', handover.employee.name or '', handover.employee.email or '']
+        parts.extend(assets_by_handover.get(handover.id, []))
+        parts.append(handover.notes or '')
+        handover.search_text = ' '.join(' '.join(parts).split()).lower()
+        batch.append(handover)
+        if len(batch) >= 500:
+            Handover.objects.bulk_update(batch, ['search_text'])
+            batch = []
+    if batch:
+        Handover.objects.bulk_update(batch, ['search_text'])
+
+
+def create_trigram_index(apps, schema_editor):
+    """PostgreSQL only: trigram index so LIKE '%term%' on search_text is an index scan"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    try:
+        # Savepoint, so a missing pg_trgm privilege doesn't abort the migration
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            schema_editor.execute(
+                'CREATE INDEX IF NOT EXISTS assets_handover_search_trgm '
+                'ON assets_handover USING gin (search_text gin_trgm_ops)'
+            )
+    except Exception as e:
+        print(f"Skipped trigram index on handover search_text ({e}); ask a DBA to run CREATE EXTENSION pg_trgm")
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS assets_handover_search_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0036_public_link_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='handover',
+            name='search_text',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(build_search_text, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
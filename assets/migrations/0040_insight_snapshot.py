@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:16
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0039_asset_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InsightSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('computed_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('signals', models.JSONField(default=list, help_text='One entry per signal: key, severity, count, message and example items')),
+                ('duration_ms', models.IntegerField(default=0, help_text='Time taken to compute the signals')),
+            ],
+            options={
+                'verbose_name': 'Insight Snapshot',
+                'verbose_name_plural': 'Insight Snapshots',
+                'ordering': ['-computed_at'],
+            },
+        ),
+    ]
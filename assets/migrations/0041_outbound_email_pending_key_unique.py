@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:35
+
+from django.db import migrations, models
+
+
+def fail_duplicate_pending_emails(apps, schema_editor):
+    """Keep the oldest pending email per idempotency key so the constraint can be added"""
+    OutboundEmail = apps.get_model('assets', 'OutboundEmail')
+    pending = OutboundEmail.objects.filter(status__in=['queued', 'sending'])
+    duplicated = (
+        pending.values('idempotency_key').annotate(count=models.Count('id')).filter(count__gt=1)
+        .values_list('idempotency_key', flat=True)
+    )
+    for key in list(duplicated):
+        emails = list(pending.filter(idempotency_key=key).order_by('created_at').values_list('id', flat=True))
+        OutboundEmail.objects.filter(id__in=emails[1:]).update(
+            status='failed', last_error=f'Duplicate of {emails[0]}',
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0040_insight_snapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_duplicate_pending_emails, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='outboundemail',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'sending'])), fields=('idempotency_key',), name='outbound_email_pending_key_unique'),
+        ),
+    ]
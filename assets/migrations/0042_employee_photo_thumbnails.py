@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:40
+
+from django.db import migrations, models
+
+
+def record_existing_thumbnails(apps, schema_editor):
+    """Flag the photos cached before availability was recorded; the next photo sync does the same"""
+    from assets import photo_store
+    
+    Employee = apps.get_model('assets', 'Employee')
+    photo_hashes = set(Employee.objects.exclude(photo_hash='').values_list('photo_hash', flat=True))
+    available = [photo_hash for photo_hash in photo_hashes if photo_store.has_thumbnails(photo_hash)]
+    Employee.objects.filter(photo_hash__in=available).update(photo_thumbnails=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0041_outbound_email_pending_key_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='photo_thumbnails',
+            field=models.BooleanField(default=False, help_text='Whether the avatar thumbnails of the cached photo exist'),
+        ),
+        migrations.RunPython(record_existing_thumbnails, migrations.RunPython.noop),
+    ]
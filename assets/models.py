@@ -1,9 +1,51 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
 from django.contrib.auth.models import User
 from django.utils import timezone
+import base64
+import binascii
+import hashlib
 import uuid
 
-class Employee(models.Model):
+
+class SearchFieldsMixin:
+    """
+    Remembers the loaded values of ``SEARCH_FIELDS`` (the fields copied into
+    ``Handover.search_text``), so a save can tell whether they changed
+    without querying the row again (see signals.py)
+    """
+    
+    SEARCH_FIELDS = ()
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_search_fields()
+        return instance
+    
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self.remember_search_fields(fields)
+    
+    def remember_search_fields(self, fields=None):
+        """Note the current values of ``fields`` (default: all) as the saved ones"""
+        saved = getattr(self, '_saved_search_values', {})
+        for name in self.SEARCH_FIELDS:
+            # Deferred fields aren't in __dict__ and stay unknown
+            if (fields is None or name in fields) and name in self.__dict__:
+                saved[name] = self.__dict__[name]
+        self._saved_search_values = saved
+    
+    def search_fields_changed(self):
+        """True/False, or None when the saved values aren't known"""
+        saved = getattr(self, '_saved_search_values', {})
+        if any(name not in saved for name in self.SEARCH_FIELDS):
+            return None
+        return any(getattr(self, name) != saved[name] for name in self.SEARCH_FIELDS)
+
+
+class Employee(SearchFieldsMixin, models.Model):
     DEPARTMENTS = [
         ('Engineering', 'Engineering'),
         ('Marketing', 'Marketing'),
@@ -27,6 +69,8 @@ class Employee(models.Model):
         ('other', 'Other Location'),
     ]
     
+    SEARCH_FIELDS = ('name', 'email')
+    
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.OneToOneField(User, on_delete=models.CASCADE, null=True, blank=True)
     name = models.CharField(max_length=200)
@@ -45,17 +89,23 @@ class Employee(models.Model):
     employee_id = models.CharField(max_length=50, blank=True, null=True, help_text="Employee ID from Azure AD")
     last_azure_sync = models.DateTimeField(null=True, blank=True, help_text="Last time data was synced from Azure AD")
     office_location = models.CharField(max_length=20, choices=OFFICE_CHOICES, default='bremen', help_text="Office location where the employee is based")
-    
+
+    # Cached Azure AD profile photo (see assets/photo_store.py)
+    photo_hash = models.CharField(max_length=64, blank=True, default='', help_text="SHA-256 of the cached profile photo")
+    photo_etag = models.CharField(max_length=200, blank=True, default='', help_text="Graph media ETag of the cached profile photo")
+    photo_checked_at = models.DateTimeField(null=True, blank=True, help_text="Last time the cached photo was validated against Azure AD")
+    photo_thumbnails = models.BooleanField(default=False, help_text="Whether the avatar thumbnails of the cached photo exist")
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    
+
     def __str__(self):
         return f"{self.name} - {self.department}"
     
     class Meta:
         ordering = ['name']
 
-class Asset(models.Model):
+class Asset(SearchFieldsMixin, models.Model):
     ASSET_TYPES = [
         # Hardware Assets
         ('laptop', 'Laptop'),
@@ -93,6 +143,8 @@ class Asset(models.Model):
         ('lost', 'Lost/Stolen'),
     ]
     
+    SEARCH_FIELDS = ('name', 'serial_number')
+    
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=200)
     asset_type = models.CharField(max_length=20, choices=ASSET_TYPES)
@@ -151,6 +203,12 @@ class Asset(models.Model):
     
     class Meta:
         ordering = ['name']
+        indexes = [
+            # Lookups and date ranges used by the AI assistant's direct answers
+            models.Index(fields=['st_tag'], name='asset_st_tag_idx'),
+            models.Index(fields=['warranty_expiry'], name='asset_warranty_expiry_idx'),
+            models.Index(fields=['subscription_end'], name='asset_subscription_end_idx'),
+        ]
 
 class Handover(models.Model):
     MODE_CHOICES = [
@@ -173,8 +231,9 @@ class Handover(models.Model):
     assets = models.ManyToManyField(Asset, through='HandoverAsset')
     mode = models.CharField(max_length=20, choices=MODE_CHOICES, default='Screen Sign')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Pending')
-    employee_signature = models.TextField(blank=True)  # Store signature data as JSON
-    it_signature = models.TextField(blank=True)  # Store signature data as JSON
+    # Signature images live in SignatureBlob so list queries don't load them
+    employee_signature_blob = models.ForeignKey('SignatureBlob', on_delete=models.PROTECT, null=True, blank=True, related_name='+')
+    it_signature_blob = models.ForeignKey('SignatureBlob', on_delete=models.PROTECT, null=True, blank=True, related_name='+')
     employee_acknowledgment = models.BooleanField(default=False)
     notes = models.TextField(blank=True)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_handovers')
@@ -186,19 +245,56 @@ class Handover(models.Model):
     email_sent = models.BooleanField(default=False)
     email_sent_at = models.DateTimeField(null=True, blank=True)
     
+    # Bumped to revoke all public links signed for earlier versions
+    public_link_version = models.PositiveIntegerField(default=1)
+    
+    # Denormalized text for the handover search, see handover_search.py
+    search_text = models.TextField(blank=True, editable=False)
+    
     def save(self, *args, **kwargs):
+        from .handover_search import build_search_text
+        
         if not self.handover_id:
             # Generate handover ID like HOV-2023-0065
-            year = timezone.now().year
-            last_handover = Handover.objects.filter(handover_id__startswith=f'HOV-{year}').order_by('-handover_id').first()
-            if last_handover:
-                last_number = int(last_handover.handover_id.split('-')[-1])
-                new_number = last_number + 1
-            else:
-                new_number = 1
-            self.handover_id = f'HOV-{year}-{new_number:04d}'
+            self.handover_id = Handover.reserve_handover_ids(1)[0]
+        
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'notes', 'employee', 'employee_id'} & set(update_fields):
+            assets = self.assets.only('name', 'serial_number') if not self._state.adding else []
+            self.search_text = build_search_text(self.handover_id, self.employee, assets, self.notes)
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'search_text'}
         super().save(*args, **kwargs)
     
+    @property
+    def employee_signature(self):
+        """URL of the employee signature image ('' if not signed)"""
+        return SignatureBlob.url_for(self.employee_signature_blob_id)
+    
+    @employee_signature.setter
+    def employee_signature(self, signature):
+        self.employee_signature_blob = SignatureBlob.from_signature(signature)
+    
+    @property
+    def it_signature(self):
+        """URL of the IT signature image ('' if not signed)"""
+        return SignatureBlob.url_for(self.it_signature_blob_id)
+    
+    @it_signature.setter
+    def it_signature(self, signature):
+        self.it_signature_blob = SignatureBlob.from_signature(signature)
+    
+    @staticmethod
+    def format_handover_id(year, number):
+        return f'HOV-{year}-{number:04d}'
+    
+    @classmethod
+    def reserve_handover_ids(cls, count, year=None):
+        """Reserve ``count`` consecutive handover IDs (for bulk creation)"""
+        year = year or timezone.now().year
+        first = HandoverSequence.reserve(year, count)
+        return [cls.format_handover_id(year, number) for number in range(first, first + count)]
+    
     def __str__(self):
         return f"{self.handover_id} - {self.employee.name}"
     
@@ -212,12 +308,150 @@ class Handover(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+class SignatureBlob(models.Model):
+    """Signature image stored once per distinct content, keyed by its SHA-256"""
+    
+    ALLOWED_CONTENT_TYPES = ['image/png', 'image/jpeg', 'image/svg+xml']
+    MAX_SIZE = 512 * 1024
+    
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    content_type = models.CharField(max_length=50, default='image/png')
+    data = models.BinaryField()
+    size = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.content_type}, {self.size} bytes)"
+    
+    @property
+    def url(self):
+        return SignatureBlob.url_for(self.sha256)
+    
+    @property
+    def is_strokes(self):
+        from .signature_strokes import STROKES_CONTENT_TYPE
+        return self.content_type == STROKES_CONTENT_TYPE
+    
+    @property
+    def data_url(self):
+        """Inline data: URL, for contexts that can't fetch the image (PDF, email)"""
+        if self.is_strokes:
+            from .signature_strokes import render_cached
+            data, content_type = render_cached(self.sha256, self.data, 'svg')
+        else:
+            data, content_type = bytes(self.data), self.content_type
+        return f"data:{content_type};base64,{base64.b64encode(data).decode('ascii')}"
+    
+    @staticmethod
+    def url_for(sha256):
+        if not sha256:
+            return ''
+        from django.urls import reverse
+        return reverse('assets:signature_image', args=[sha256])
+    
+    @staticmethod
+    def parse_data_url(data_url):
+        """Split a base64 image data: URL into (content_type, bytes); raises ValueError"""
+        header, separator, encoded = data_url.partition(',')
+        if not separator or not header.startswith('data:') or not header.endswith(';base64'):
+            raise ValueError("Signature must be a base64 data URL")
+        content_type = header[len('data:'):-len(';base64')]
+        if content_type not in SignatureBlob.ALLOWED_CONTENT_TYPES:
+            raise ValueError(f"Unsupported signature image type: {content_type}")
+        try:
+            data = base64.b64decode(encoded, validate=True)
+        except (binascii.Error, ValueError):
+            raise ValueError("Signature data is not valid base64")
+        if not data or len(data) > SignatureBlob.MAX_SIZE:
+            raise ValueError("Signature image is empty or too large")
+        return content_type, data
+    
+    @classmethod
+    def store(cls, data, content_type='image/png'):
+        """Store bytes (deduplicated by hash) and return the blob"""
+        sha256 = hashlib.sha256(data).hexdigest()
+        blob, _ = cls.objects.get_or_create(
+            sha256=sha256,
+            defaults={'content_type': content_type, 'data': data, 'size': len(data)},
+        )
+        return blob
+    
+    @classmethod
+    def from_data_url(cls, data_url):
+        content_type, data = cls.parse_data_url(data_url)
+        return cls.store(data, content_type)
+    
+    @classmethod
+    def from_strokes(cls, payload):
+        """Validate a vector stroke payload and store it in canonical form"""
+        from .signature_strokes import STROKES_CONTENT_TYPE, encode_strokes, parse_strokes
+        return cls.store(encode_strokes(*parse_strokes(payload)), STROKES_CONTENT_TYPE)
+    
+    @classmethod
+    def from_signature(cls, signature):
+        """Blob for a submitted signature: stroke dict, image data URL, or empty (None)"""
+        if not signature:
+            return None
+        if isinstance(signature, dict):
+            return cls.from_strokes(signature)
+        return cls.from_data_url(signature)
+
+
+class HandoverSequence(models.Model):
+    """Per-year counter for handover IDs (HOV-YYYY-NNNN)"""
+    
+    year = models.IntegerField(primary_key=True)
+    last_value = models.IntegerField(default=0)
+    
+    def __str__(self):
+        return f"HOV-{self.year}: {self.last_value}"
+    
+    @classmethod
+    def reserve(cls, year, count=1):
+        """
+        Atomically reserve ``count`` numbers for ``year`` and return the first one.
+        The counter row is bumped with a single UPDATE ... SET last_value = last_value + n,
+        which serializes concurrent creators on that row instead of racing on the
+        unique handover_id column.
+        """
+        with transaction.atomic():
+            if not cls.objects.filter(year=year).update(last_value=F('last_value') + count):
+                cls._create_counter(year)
+                cls.objects.filter(year=year).update(last_value=F('last_value') + count)
+            last_value = cls.objects.filter(year=year).values_list('last_value', flat=True).get()
+        return last_value - count + 1
+    
+    @classmethod
+    def _create_counter(cls, year):
+        """Create the counter for a year, starting after any existing handover IDs"""
+        try:
+            with transaction.atomic():
+                cls.objects.create(year=year, last_value=cls.highest_existing_number(year))
+        except IntegrityError:
+            # Another process created it first
+            pass
+    
+    @staticmethod
+    def highest_existing_number(year, handover_model=None):
+        handover_model = handover_model or Handover
+        numbers = [
+            int(handover_id.rsplit('-', 1)[-1])
+            for handover_id in handover_model.objects.filter(handover_id__startswith=f'HOV-{year}-').values_list('handover_id', flat=True)
+            if handover_id.rsplit('-', 1)[-1].isdigit()
+        ]
+        return max(numbers, default=0)
+
 
 class HandoverToken(models.Model):
     """Token for public handover access without password"""
     
     handover = models.OneToOneField(Handover, on_delete=models.CASCADE, related_name='public_token')
-    token = models.CharField(max_length=64, unique=True, help_text="Unique token for public access")
+    # Latest issued public link token (signed, see public_links); older rows hold random legacy tokens
+    token = models.CharField(max_length=255, unique=True, help_text="Unique token for public access")
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField(null=True, blank=True, help_text="Optional expiration date")
     is_active = models.BooleanField(default=True, help_text="Whether token is active")
@@ -236,10 +470,9 @@ class HandoverToken(models.Model):
         return True
     
     def record_access(self):
-        """Record token access"""
-        self.access_count += 1
-        self.last_accessed = timezone.now()
-        self.save(update_fields=['access_count', 'last_accessed'])
+        """Record token access (buffered in the cache, see access_counters)"""
+        from .access_counters import record_access
+        record_access('handover', self.handover_id)
     
     class Meta:
         ordering = ['-created_at']
@@ -324,10 +557,9 @@ class WelcomePackToken(models.Model):
         return True
     
     def record_access(self):
-        """Record token access"""
-        self.access_count += 1
-        self.last_accessed = timezone.now()
-        self.save(update_fields=['access_count', 'last_accessed'])
+        """Record token access (buffered in the cache, see access_counters)"""
+        from .access_counters import record_access
+        record_access('welcome_pack', self.id)
     
     class Meta:
         ordering = ['-created_at']
@@ -462,12 +694,170 @@ class Notification(models.Model):
         return f"{self.title} - {self.user.username}"
     
     def mark_as_read(self):
-        if not self.is_read:
-            self.is_read = True
-            self.read_at = timezone.now()
-            self.save()
+        if self.is_read:
+            return
+        # Conditional update, so concurrent calls decrement the counter once
+        from .notification_feed import invalidate_feed_state
+        self.is_read = True
+        self.read_at = timezone.now()
+        updated = Notification.objects.filter(pk=self.pk, is_read=False).update(is_read=True, read_at=self.read_at)
+        if updated:
+            NotificationCounter.adjust([self.user_id], -updated)
+            invalidate_feed_state([self.user_id])
     
     class Meta:
         ordering = ['-created_at']
         verbose_name = "Notification"
         verbose_name_plural = "Notifications"
+        indexes = [
+            models.Index(fields=['user', 'is_read', '-created_at'], name='notification_user_read_idx'),
+        ]
+
+
+class NotificationCounter(models.Model):
+    """Denormalized unread notification count per user"""
+    
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='notification_counter')
+    unread_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.user.username}: {self.unread_count} unread"
+    
+    @classmethod
+    def adjust(cls, user_ids, delta):
+        """Add ``delta`` to the users' counters; users without a counter row are counted from scratch"""
+        user_ids = set(user_ids)
+        if not user_ids or not delta:
+            return
+        updated = cls.objects.filter(user_id__in=user_ids).update(
+            unread_count=Greatest(F('unread_count') + delta, 0),
+            updated_at=timezone.now(),
+        )
+        if updated < len(user_ids):
+            existing = set(cls.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+            cls.recount(user_ids - existing)
+    
+    @classmethod
+    def recount(cls, user_ids):
+        """Recompute the counters of ``user_ids`` from the Notification table"""
+        user_ids = set(user_ids)
+        if not user_ids:
+            return
+        counts = dict(
+            Notification.objects.filter(user_id__in=user_ids, is_read=False)
+            .values('user_id').annotate(count=Count('id')).values_list('user_id', 'count')
+        )
+        now = timezone.now()
+        cls.objects.bulk_create(
+            [cls(user_id=user_id, unread_count=counts.get(user_id, 0), updated_at=now) for user_id in user_ids],
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=['unread_count', 'updated_at'],
+        )
+    
+    class Meta:
+        verbose_name = "Notification Counter"
+        verbose_name_plural = "Notification Counters"
+
+
+class OutboundEmail(models.Model):
+    """Email queued for background delivery by the deliver_emails command"""
+    
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    
+    KIND_CHOICES = [
+        ('handover_signature', 'Handover Signature Request'),
+        ('welcome_employee', 'Welcome Pack (Employee)'),
+        ('welcome_it', 'Welcome Pack (IT Team)'),
+        ('handover_reminder', 'Handover Signature Reminder'),
+        ('other', 'Other'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    idempotency_key = models.CharField(max_length=200, db_index=True, help_text="Repeated enqueues with the same key are collapsed")
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES, default='other')
+    
+    # Message content
+    from_email = models.CharField(max_length=255, blank=True)
+    to = models.JSONField(default=list, help_text="List of recipient addresses")
+    subject = models.CharField(max_length=500)
+    body_text = models.TextField(blank=True)
+    body_html = models.TextField(blank=True)
+    
+    # Delivery state
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=6)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    # Related objects updated once the email is delivered
+    handover = models.ForeignKey(Handover, on_delete=models.SET_NULL, null=True, blank=True, related_name='outbound_emails')
+    welcome_pack = models.ForeignKey(WelcomePack, on_delete=models.SET_NULL, null=True, blank=True, related_name='outbound_emails')
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)} ({self.status})"
+    
+    @property
+    def is_pending(self):
+        return self.status in ('queued', 'sending')
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+        constraints = [
+            # At most one pending email per key, even for concurrent enqueues
+            models.UniqueConstraint(
+                fields=['idempotency_key'],
+                condition=models.Q(status__in=['queued', 'sending']),
+                name='outbound_email_pending_key_unique',
+            ),
+        ]
+
+
+class HandoverReminder(models.Model):
+    """Signature reminder sent for a pending handover (see send_handover_reminders)"""
+    
+    handover = models.ForeignKey(Handover, on_delete=models.CASCADE, related_name='reminders')
+    outbound_email = models.ForeignKey(OutboundEmail, on_delete=models.SET_NULL, null=True, blank=True, related_name='handover_reminders')
+    reminder_number = models.IntegerField(default=1)
+    sent_to = models.EmailField()
+    sent_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='handover_reminders')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Reminder {self.reminder_number} for {self.handover.handover_id}"
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['handover', 'created_at']),
+        ]
+
+
+class InsightSnapshot(models.Model):
+    """Inventory insights computed by the compute_insights command (see assets/insights.py)"""
+    
+    computed_at = models.DateTimeField(default=timezone.now, db_index=True)
+    signals = models.JSONField(default=list, help_text="One entry per signal: key, severity, count, message and example items")
+    duration_ms = models.IntegerField(default=0, help_text="Time taken to compute the signals")
+    
+    def __str__(self):
+        return f"Insights of {self.computed_at:%Y-%m-%d %H:%M}"
+    
+    class Meta:
+        ordering = ['-computed_at']
+        verbose_name = "Insight Snapshot"
+        verbose_name_plural = "Insight Snapshots"
@@ -0,0 +1,210 @@
+"""
+JSON notification feed, cached unread counts and the push stream.
+
+The bell dropdown and the admin dashboard read ``notifications/feed/`` (JSON)
+instead of scraping the full notifications page. Each user's feed state, the
+unread count (from ``NotificationCounter``) and the newest notification id, is
+kept in the cache under one key; it is dropped by the Notification signal handlers in ``signals.py`` (and
+explicitly after bulk updates), so the unread-count endpoint and the stream
+normally don't touch the database at all.
+
+``notifications/stream/`` is a Server-Sent Events stream: it watches the cached
+state and pushes new notifications and unread-count changes as they happen.
+Streams end after ``NOTIFICATION_STREAM_SECONDS`` and the browser reconnects
+(resuming from ``Last-Event-ID``). Every logged-in page keeps one open, so
+nginx routes them to the ASGI process (``assettrack-ai.service``), where
+``astream_notifications`` waits as a coroutine instead of holding a worker
+thread. The synchronous ``stream_notifications`` is the fallback under WSGI
+(runserver). Each process serves at most ``NOTIFICATION_ASGI_MAX_STREAMS`` or
+``NOTIFICATION_WSGI_MAX_STREAMS`` streams at a time. Beyond that a stream
+sends a ``fallback`` event and ends, and the page polls
+``notifications/unread-count/`` instead. With the per-process LocMem cache
+another worker's invalidation isn't seen, so the state also expires after
+``STATE_TIMEOUT`` seconds.
+"""
+
+import asyncio
+import json
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+from django.urls import reverse
+from django.utils.timesince import timesince
+
+from .models import Notification, NotificationCounter
+
+STATE_TIMEOUT = 30
+FEED_LIMIT = 20
+STREAM_POLL_INTERVAL = 2
+STREAM_HEARTBEAT_INTERVAL = 15
+STREAM_RETRY_MS = 3000
+# Seconds between unread-count polls of a page turned away by the stream limit
+FALLBACK_POLL_SECONDS = 60
+
+
+def _state_key(user_id):
+    return f'notifications:state:{user_id}'
+
+
+def get_feed_state(user_id):
+    """{'unread': count, 'latest_id': newest notification id or 0} for a user, cached"""
+    state = cache.get(_state_key(user_id))
+    if state is None:
+        unread = NotificationCounter.objects.filter(user_id=user_id).values_list('unread_count', flat=True).first()
+        if unread is None:
+            NotificationCounter.recount([user_id])
+            unread = NotificationCounter.objects.get(user_id=user_id).unread_count
+        latest_id = Notification.objects.filter(user_id=user_id).aggregate(latest_id=Max('id'))['latest_id']
+        state = {'unread': unread, 'latest_id': latest_id or 0}
+        cache.set(_state_key(user_id), state, STATE_TIMEOUT)
+    return state
+
+
+def invalidate_feed_state(user_ids):
+    cache.delete_many([_state_key(user_id) for user_id in set(user_ids)])
+
+
+def serialize_notification(notification):
+    return {
+        'id': notification.id,
+        'title': notification.title,
+        'message': notification.message,
+        'type': notification.notification_type,
+        'priority': notification.priority,
+        'is_read': notification.is_read,
+        'created_at': notification.created_at.isoformat(),
+        'timesince': timesince(notification.created_at),
+        'asset_url': reverse('assets:assets_detail', args=[notification.asset_id]) if notification.asset_id else None,
+        'employee_url': reverse('assets:employees_detail', args=[notification.employee_id]) if notification.employee_id else None,
+    }
+
+
+def get_feed(user_id, limit=FEED_LIMIT, before_id=None, after_id=None):
+    """Newest first; ``before_id`` pages back, ``after_id`` returns only newer notifications"""
+    notifications = Notification.objects.filter(user_id=user_id).only(
+        'id', 'title', 'message', 'notification_type', 'priority', 'is_read',
+        'created_at', 'asset_id', 'employee_id',
+    ).order_by('-id')
+    if before_id:
+        notifications = notifications.filter(id__lt=before_id)
+    if after_id:
+        notifications = notifications.filter(id__gt=after_id)
+    return [serialize_notification(notification) for notification in notifications[:limit]]
+
+
+def _event(name, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {name}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+_open_streams = 0
+_open_streams_lock = threading.Lock()
+
+
+def _reserve_stream(limit):
+    """Count one more open stream in this process; False if ``limit`` are already open"""
+    global _open_streams
+    with _open_streams_lock:
+        if _open_streams >= limit:
+            return False
+        _open_streams += 1
+        return True
+
+
+def _release_stream():
+    global _open_streams
+    with _open_streams_lock:
+        _open_streams -= 1
+
+
+def _fallback_event():
+    return _event('fallback', {'poll_seconds': FALLBACK_POLL_SECONDS})
+
+
+def _open(user_id, last_id):
+    """The opening events and the cursor ({'last_id', 'unread'}) that later polls advance"""
+    state = get_feed_state(user_id)
+    cursor = {
+        'last_id': state['latest_id'] if last_id is None else last_id,
+        'unread': state['unread'],
+    }
+    return [f'retry: {STREAM_RETRY_MS}\n\n', _event('unread', {'unread_count': cursor['unread']}, cursor['last_id'])], cursor
+
+
+def _poll(user_id, cursor):
+    """Events for what changed since ``cursor``, which is advanced"""
+    state = get_feed_state(user_id)
+    events = []
+    if state['latest_id'] > cursor['last_id']:
+        # Oldest first, so the client can prepend them in order
+        for notification in reversed(get_feed(user_id, after_id=cursor['last_id'])):
+            cursor['last_id'] = max(cursor['last_id'], notification['id'])
+            events.append(_event('notification', notification, notification['id']))
+        cursor['last_id'] = max(cursor['last_id'], state['latest_id'])
+    if state['unread'] != cursor['unread']:
+        cursor['unread'] = state['unread']
+        events.append(_event('unread', {'unread_count': cursor['unread']}, cursor['last_id']))
+    return events
+
+
+def stream_notifications(user_id, last_id=None, duration=None):
+    """
+    SSE events for a user: ``unread`` with the count whenever it changes and
+    ``notification`` for each one newer than ``last_id``. Ends after ``duration`` seconds.
+    Holds the calling thread throughout; under ASGI use astream_notifications.
+    """
+    if not _reserve_stream(getattr(settings, 'NOTIFICATION_WSGI_MAX_STREAMS', 2)):
+        yield _fallback_event()
+        return
+    try:
+        duration = duration if duration is not None else getattr(settings, 'NOTIFICATION_STREAM_SECONDS', 25)
+        deadline = time.monotonic() + duration
+        last_heartbeat = time.monotonic()
+
+        events, cursor = _open(user_id, last_id)
+        yield from events
+        while True:
+            if time.monotonic() >= deadline:
+                return
+            if time.monotonic() - last_heartbeat >= STREAM_HEARTBEAT_INTERVAL:
+                # Comment line, keeps proxies from closing an idle connection
+                last_heartbeat = time.monotonic()
+                yield ': ping\n\n'
+            time.sleep(STREAM_POLL_INTERVAL)
+            yield from _poll(user_id, cursor)
+    finally:
+        _release_stream()
+
+
+async def astream_notifications(user_id, last_id=None, duration=None):
+    """Async counterpart of stream_notifications: waits between polls without a thread"""
+    if not _reserve_stream(getattr(settings, 'NOTIFICATION_ASGI_MAX_STREAMS', 500)):
+        yield _fallback_event()
+        return
+    try:
+        duration = duration if duration is not None else getattr(settings, 'NOTIFICATION_STREAM_SECONDS', 25)
+        deadline = time.monotonic() + duration
+        last_heartbeat = time.monotonic()
+
+        events, cursor = await sync_to_async(_open)(user_id, last_id)
+        for event in events:
+            yield event
+        while True:
+            if time.monotonic() >= deadline:
+                return
+            if time.monotonic() - last_heartbeat >= STREAM_HEARTBEAT_INTERVAL:
+                last_heartbeat = time.monotonic()
+                yield ': ping\n\n'
+            await asyncio.sleep(STREAM_POLL_INTERVAL)
+            for event in await sync_to_async(_poll)(user_id, cursor):
+                yield event
+    finally:
+        _release_stream()
@@ -0,0 +1,124 @@
+"""
+Notification fan-out and retention.
+
+``notify_users`` / ``notify_group`` send the same notification to many users
+with one ``bulk_create`` and one UPDATE of the users' ``NotificationCounter``
+rows (the denormalized unread counts behind the bell badge). Groups are 'staff',
+'superusers' or 'office' (users whose employee record is in ``office``).
+
+``prune_notifications`` keeps the table small: read notifications older than
+the retention period are deleted in id-ordered chunks, optionally written to a
+JSON-lines archive first. It is run by ``manage.py prune_notifications``.
+"""
+
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Notification, NotificationCounter
+from .notification_feed import invalidate_feed_state
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_GROUPS = ('staff', 'superusers', 'office')
+
+
+def get_group_user_ids(group, office=None):
+    """Ids of the active users in a notification group"""
+    users = User.objects.filter(is_active=True)
+    if group == 'staff':
+        users = users.filter(is_staff=True)
+    elif group == 'superusers':
+        users = users.filter(is_superuser=True)
+    elif group == 'office':
+        if not office:
+            raise ValueError("The 'office' group needs an office")
+        users = users.filter(employee__office_location=office)
+    else:
+        raise ValueError(f"Unknown notification group: {group}")
+    return list(users.values_list('id', flat=True))
+
+
+def notify_users(user_ids, title, message, notification_type='system_alert', priority='medium', asset=None, employee=None):
+    """Create the same notification for every user in ``user_ids``; returns the number created"""
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return 0
+
+    with transaction.atomic():
+        # bulk_create sends no post_save, so counters and feed state are updated here
+        Notification.objects.bulk_create([
+            Notification(
+                user_id=user_id,
+                title=title,
+                message=message,
+                notification_type=notification_type,
+                priority=priority,
+                asset=asset,
+                employee=employee,
+            )
+            for user_id in user_ids
+        ], batch_size=500)
+        NotificationCounter.adjust(user_ids, 1)
+    invalidate_feed_state(user_ids)
+    return len(user_ids)
+
+
+def notify_group(group, title, message, office=None, exclude_user_ids=(), **kwargs):
+    """Notify every active user in ``group`` (see get_group_user_ids)"""
+    user_ids = set(get_group_user_ids(group, office)) - set(exclude_user_ids)
+    return notify_users(user_ids, title, message, **kwargs)
+
+
+def get_retention_days():
+    return getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 90)
+
+
+def prune_notifications(days=None, chunk_size=1000, archive=None, dry_run=False):
+    """
+    Delete read notifications created more than ``days`` days ago, ``chunk_size``
+    rows per statement. ``archive`` is an open text file that receives one JSON
+    object per deleted notification. Returns the number of notifications pruned.
+    """
+    days = get_retention_days() if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    expired = Notification.objects.filter(is_read=True, created_at__lt=cutoff).order_by('id')
+    if dry_run:
+        return expired.count()
+
+    table = connection.ops.quote_name(Notification._meta.db_table)
+    pruned = 0
+    last_id = 0
+    while True:
+        rows = list(expired.filter(id__gt=last_id).values(
+            'id', 'user_id', 'title', 'message', 'notification_type', 'priority',
+            'created_at', 'read_at', 'asset_id', 'employee_id',
+        )[:chunk_size])
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+
+        if archive is not None:
+            for row in rows:
+                archive.write(json.dumps(row, default=str) + '\n')
+            archive.flush()
+
+        # Plain DELETE: nothing references notifications, and QuerySet.delete()
+        # would load every row to send post_delete (read rows don't affect the counters)
+        ids = [row['id'] for row in rows]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {table} WHERE id IN ({', '.join(['%s'] * len(ids))})",
+                ids,
+            )
+        invalidate_feed_state({row['user_id'] for row in rows})
+        pruned += len(rows)
+
+    if pruned:
+        logger.info(f"Pruned {pruned} read notification(s) older than {days} days")
+    return pruned
@@ -0,0 +1,238 @@
+"""
+Minimal pure-Python PDF writer.
+
+Supports what AssetTrack documents need and nothing more: A4 pages, the
+built-in Helvetica / Helvetica-Bold fonts (WinAnsi encoding, no embedding),
+text with word wrapping, lines, rectangles, vector polylines (used for
+signature strokes) and RGB raster images. Content streams are
+Flate-compressed. Output is deterministic for the same input, so generated
+files can be cached and compared byte for byte.
+"""
+
+import zlib
+
+A4_WIDTH = 595.28
+A4_HEIGHT = 841.89
+
+# Glyph widths (1/1000 em) for characters 32..126, from the standard Adobe AFM files
+_HELVETICA_WIDTHS = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]
+_HELVETICA_BOLD_WIDTHS = [
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+]
+_DEFAULT_WIDTH = 556
+
+FONTS = {
+    'regular': ('F1', 'Helvetica', _HELVETICA_WIDTHS),
+    'bold': ('F2', 'Helvetica-Bold', _HELVETICA_BOLD_WIDTHS),
+}
+
+
+def text_width(text, size, font='regular'):
+    """Width of ``text`` in points"""
+    widths = FONTS[font][2]
+    total = 0
+    for char in text:
+        code = ord(char)
+        total += widths[code - 32] if 32 <= code <= 126 else _DEFAULT_WIDTH
+    return total * size / 1000
+
+
+def wrap_text(text, size, max_width, font='regular'):
+    """Split text into lines that fit ``max_width`` (long words are broken)"""
+    lines = []
+    for paragraph in str(text).splitlines() or ['']:
+        line = ''
+        for word in paragraph.split(' '):
+            candidate = f'{line} {word}' if line else word
+            if text_width(candidate, size, font) <= max_width:
+                line = candidate
+                continue
+            if line:
+                lines.append(line)
+            while text_width(word, size, font) > max_width and len(word) > 1:
+                cut = len(word)
+                while cut > 1 and text_width(word[:cut], size, font) > max_width:
+                    cut -= 1
+                lines.append(word[:cut])
+                word = word[cut:]
+            line = word
+        lines.append(line)
+    return lines
+
+
+def _escape(text):
+    encoded = str(text).encode('cp1252', errors='replace')
+    return encoded.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)').replace(b'\r', b'').replace(b'\n', b' ')
+
+
+def _num(value):
+    """Compact number formatting for content streams"""
+    text = f'{value:.2f}'.rstrip('0').rstrip('.')
+    return text if text not in ('', '-0') else '0'
+
+
+class PDFPage:
+    """One page; coordinates are in points from the top-left corner"""
+
+    def __init__(self, document, width=A4_WIDTH, height=A4_HEIGHT):
+        self.document = document
+        self.width = width
+        self.height = height
+        self.commands = []
+        self.images = {}
+
+    def _y(self, y):
+        return self.height - y
+
+    def text(self, x, y, text, size=10, font='regular', color=(0, 0, 0)):
+        """Draw a single line of text with its baseline at ``y``"""
+        font_name = FONTS[font][0]
+        r, g, b = color
+        self.commands.append(
+            b'BT %s %s %s rg /%s %s Tf %s %s Td (' % (
+                _num(r).encode(), _num(g).encode(), _num(b).encode(),
+                font_name.encode(), _num(size).encode(), _num(x).encode(), _num(self._y(y)).encode(),
+            ) + _escape(text) + b') Tj ET'
+        )
+
+    def text_right(self, x_right, y, text, size=10, font='regular', color=(0, 0, 0)):
+        self.text(x_right - text_width(text, size, font), y, text, size, font, color)
+
+    def line(self, x1, y1, x2, y2, width=0.5, color=(0, 0, 0)):
+        r, g, b = color
+        self.commands.append(
+            f'{_num(r)} {_num(g)} {_num(b)} RG {_num(width)} w '
+            f'{_num(x1)} {_num(self._y(y1))} m {_num(x2)} {_num(self._y(y2))} l S'.encode()
+        )
+
+    def rect(self, x, y, width, height, stroke=(0, 0, 0), fill=None, line_width=0.5):
+        parts = []
+        if fill is not None:
+            parts.append(f'{_num(fill[0])} {_num(fill[1])} {_num(fill[2])} rg')
+        if stroke is not None:
+            parts.append(f'{_num(stroke[0])} {_num(stroke[1])} {_num(stroke[2])} RG {_num(line_width)} w')
+        parts.append(f'{_num(x)} {_num(self._y(y + height))} {_num(width)} {_num(height)} re')
+        parts.append('B' if fill is not None and stroke is not None else ('f' if fill is not None else 'S'))
+        self.commands.append(' '.join(parts).encode())
+
+    def polylines(self, strokes, x, y, scale, width=1.0, color=(0, 0, 0)):
+        """Draw strokes (lists of (px, py) points) offset by (x, y) and scaled"""
+        r, g, b = color
+        parts = [f'q {_num(r)} {_num(g)} {_num(b)} RG {_num(width)} w 1 J 1 j']
+        for points in strokes:
+            (px, py), rest = points[0], points[1:] or points[:1]
+            parts.append(f'{_num(x + px * scale)} {_num(self._y(y + py * scale))} m')
+            parts.extend(f'{_num(x + qx * scale)} {_num(self._y(y + qy * scale))} l' for qx, qy in rest)
+            parts.append('S')
+        parts.append('Q')
+        self.commands.append(' '.join(parts).encode())
+
+    def image(self, x, y, width, height, pixel_width, pixel_height, rgb_data):
+        """Draw raw 8-bit RGB pixel data scaled into the given box"""
+        name = self.document.add_image(pixel_width, pixel_height, rgb_data)
+        self.images[name] = True
+        self.commands.append(
+            f'q {_num(width)} 0 0 {_num(height)} {_num(x)} {_num(self._y(y + height))} cm /{name} Do Q'.encode()
+        )
+
+
+class PDFDocument:
+    """Collects pages and serializes them into a PDF file"""
+
+    def __init__(self, title='', author='', creation_date=None):
+        self.title = title
+        self.author = author
+        self.creation_date = creation_date
+        self.pages = []
+        self._images = []
+
+    def add_page(self, width=A4_WIDTH, height=A4_HEIGHT):
+        page = PDFPage(self, width, height)
+        self.pages.append(page)
+        return page
+
+    def add_image(self, pixel_width, pixel_height, rgb_data):
+        name = f'Im{len(self._images) + 1}'
+        self._images.append((name, pixel_width, pixel_height, rgb_data))
+        return name
+
+    def to_bytes(self):
+        objects = []
+
+        def add(body):
+            objects.append(body)
+            return len(objects)
+
+        catalog_id = add(None)
+        pages_id = add(None)
+        font_ids = {}
+        for key, (font_name, base_font, _) in FONTS.items():
+            font_ids[font_name] = add(
+                f'<< /Type /Font /Subtype /Type1 /BaseFont /{base_font} /Encoding /WinAnsiEncoding >>'.encode()
+            )
+        image_ids = {}
+        for name, pixel_width, pixel_height, rgb_data in self._images:
+            image_ids[name] = add(_stream(
+                f'/Type /XObject /Subtype /Image /Width {pixel_width} /Height {pixel_height} '
+                f'/ColorSpace /DeviceRGB /BitsPerComponent 8'.encode(),
+                rgb_data,
+            ))
+
+        fonts = ' '.join(f'/{name} {object_id} 0 R' for name, object_id in font_ids.items())
+        page_ids = []
+        for page in self.pages:
+            content_id = add(_stream(b'', b'\n'.join(page.commands)))
+            xobjects = ' '.join(f'/{name} {image_ids[name]} 0 R' for name in page.images)
+            resources = f'/Font << {fonts} >>' + (f' /XObject << {xobjects} >>' if xobjects else '')
+            page_ids.append(add(
+                f'<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 {_num(page.width)} {_num(page.height)}] '
+                f'/Resources << {resources} >> /Contents {content_id} 0 R >>'.encode()
+            ))
+
+        kids = ' '.join(f'{page_id} 0 R' for page_id in page_ids)
+        objects[pages_id - 1] = f'<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>'.encode()
+        objects[catalog_id - 1] = f'<< /Type /Catalog /Pages {pages_id} 0 R >>'.encode()
+
+        info = [b'/Producer (AssetTrack)']
+        if self.title:
+            info.append(b'/Title (' + _escape(self.title) + b')')
+        if self.author:
+            info.append(b'/Author (' + _escape(self.author) + b')')
+        if self.creation_date:
+            info.append(f"/CreationDate (D:{self.creation_date.strftime('%Y%m%d%H%M%S')}Z)".encode())
+        info_id = add(b'<< ' + b' '.join(info) + b' >>')
+
+        output = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        offsets = []
+        for object_id, body in enumerate(objects, start=1):
+            offsets.append(len(output))
+            output += f'{object_id} 0 obj\n'.encode() + body + b'\nendobj\n'
+
+        xref_offset = len(output)
+        output += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode()
+        for offset in offsets:
+            output += f'{offset:010d} 00000 n \n'.encode()
+        output += (
+            f'trailer\n<< /Size {len(objects) + 1} /Root {catalog_id} 0 R /Info {info_id} 0 R >>\n'
+            f'startxref\n{xref_offset}\n%%EOF\n'
+        ).encode()
+        return bytes(output)
+
+
+def _stream(dictionary_entries, data):
+    compressed = zlib.compress(data, 6)
+    header = b'<< ' + dictionary_entries + (b' ' if dictionary_entries else b'') + \
+        f'/Length {len(compressed)} /Filter /FlateDecode >>'.encode()
+    return header + b'\nstream\n' + compressed + b'\nendstream'
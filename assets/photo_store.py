@@ -0,0 +1,157 @@
+"""
+Content-addressed on-disk store for employee profile photos.
+
+Photos downloaded from Microsoft Graph are written once to
+``EMPLOYEE_PHOTO_ROOT/<first two hex chars>/<sha256>.jpg``. Because the file
+name is the hash of its content, a stored file never changes and can be served
+by nginx (or Django's static serving in development) with far-future cache
+headers, while the SHA-256 doubles as a strong ETag for the proxy view.
+
+Square WebP avatar thumbnails (32/64/128 px) are rendered next to the
+original when it is stored, as ``<sha256>_<size>.webp``; every supported
+browser displays WebP, so no JPEG variants are kept. Rendering needs Pillow;
+without it only the original is kept and templates link to that. Whether the
+thumbnails exist is recorded on the employee (``photo_thumbnails``) when the
+photo is cached, so rendering an avatar never touches the disk.
+"""
+
+import hashlib
+import io
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZES = (32, 64, 128)
+THUMBNAIL_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+}
+
+
+def get_photo_root():
+    """Directory that holds the stored photos"""
+    return Path(getattr(settings, 'EMPLOYEE_PHOTO_ROOT', Path(settings.BASE_DIR) / 'media' / 'employee_photos'))
+
+
+def compute_photo_hash(data):
+    """SHA-256 hex digest used as the photo's storage key and ETag"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def get_photo_path(photo_hash):
+    """Filesystem path of a stored photo"""
+    return get_photo_root() / photo_hash[:2] / f'{photo_hash}.jpg'
+
+
+def get_photo_url(photo_hash):
+    """Public URL of a stored photo (served directly by nginx / static serving)"""
+    base_url = getattr(settings, 'EMPLOYEE_PHOTO_URL', '/media/employee_photos/')
+    return f'{base_url}{photo_hash[:2]}/{photo_hash}.jpg'
+
+
+def get_thumbnail_path(photo_hash, size, fmt='webp'):
+    """Filesystem path of a stored thumbnail"""
+    return get_photo_root() / photo_hash[:2] / f'{photo_hash}_{size}.{fmt}'
+
+
+def get_thumbnail_url(photo_hash, size, fmt='webp'):
+    """Public URL of a stored thumbnail"""
+    base_url = getattr(settings, 'EMPLOYEE_PHOTO_URL', '/media/employee_photos/')
+    return f'{base_url}{photo_hash[:2]}/{photo_hash}_{size}.{fmt}'
+
+
+def pick_thumbnail_size(size):
+    """Smallest generated thumbnail size that is at least ``size`` pixels"""
+    for thumbnail_size in THUMBNAIL_SIZES:
+        if thumbnail_size >= size:
+            return thumbnail_size
+    return THUMBNAIL_SIZES[-1]
+
+
+def has_thumbnail(photo_hash, size, fmt='webp'):
+    """Check whether a thumbnail variant is present on disk"""
+    return bool(photo_hash) and get_thumbnail_path(photo_hash, size, fmt).is_file()
+
+
+def has_thumbnails(photo_hash):
+    """Check whether every thumbnail variant of a photo is present on disk"""
+    return all(has_thumbnail(photo_hash, size, fmt) for size in THUMBNAIL_SIZES for fmt in THUMBNAIL_FORMATS)
+
+
+def has_photo(photo_hash):
+    """Check whether a photo with the given hash is present on disk"""
+    return bool(photo_hash) and get_photo_path(photo_hash).is_file()
+
+
+def save_photo(data):
+    """
+    Store photo bytes (and their thumbnails) and return their hash.
+    Writing is skipped when the content is already stored; new files are
+    written to a temporary file first and atomically moved into place so
+    concurrent readers never see a partial image.
+    """
+    photo_hash = compute_photo_hash(data)
+    path = get_photo_path(photo_hash)
+    if not path.is_file():
+        _write_atomic(path, data)
+    generate_thumbnails(photo_hash, data)
+    return photo_hash
+
+
+def generate_thumbnails(photo_hash, data=None):
+    """
+    Render the missing thumbnail variants for a stored photo.
+    Returns the number of files written (0 if Pillow is unavailable).
+    """
+    missing = [
+        (size, fmt)
+        for size in THUMBNAIL_SIZES
+        for fmt in THUMBNAIL_FORMATS
+        if not has_thumbnail(photo_hash, size, fmt)
+    ]
+    if not missing:
+        return 0
+
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        logger.warning("Pillow is not installed; skipping avatar thumbnails")
+        return 0
+
+    if data is None:
+        data = get_photo_path(photo_hash).read_bytes()
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image = ImageOps.exif_transpose(image).convert('RGB')
+            written = 0
+            for size, fmt in missing:
+                thumbnail = ImageOps.fit(image, (size, size), method=Image.Resampling.LANCZOS)
+                pil_format, save_options = THUMBNAIL_FORMATS[fmt]
+                buffer = io.BytesIO()
+                thumbnail.save(buffer, pil_format, **save_options)
+                _write_atomic(get_thumbnail_path(photo_hash, size, fmt), buffer.getvalue())
+                written += 1
+            return written
+    except (OSError, ValueError) as e:
+        logger.error(f"Failed to create thumbnails for photo {photo_hash}: {e}")
+        return 0
+
+
+def _write_atomic(path, data):
+    """Write to a temporary file and move it into place"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
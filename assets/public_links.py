@@ -0,0 +1,163 @@
+"""
+Stateless signed links for the public handover page.
+
+A link token is ``<handover id hex>.<link version>.<expiry>:<signature>``,
+signed with the SECRET_KEY via ``django.core.signing``. Checking a link is an
+HMAC comparison plus a lookup in a small cached denylist, with no token table
+query, and issuing one doesn't write or rotate anything, so links that were
+already sent keep working.
+
+Revoking a handover's links bumps ``Handover.public_link_version``; tokens
+signed for an older version are rejected. The denylist maps handover id to its
+current version for the (few) handovers that were ever revoked and is cached
+until the next revocation.
+
+``HandoverToken`` rows are kept for audit (latest link issued, access counts).
+Tokens issued before signed links existed are still accepted by looking them
+up in that table, so a row holding such a legacy token is never overwritten.
+"""
+
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import F
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Handover, HandoverToken
+
+logger = logging.getLogger(__name__)
+
+SALT = 'assets.public_handover_link'
+DENYLIST_CACHE_KEY = 'public_links:denylist'
+DENYLIST_CACHE_TIMEOUT = 3600
+
+
+class PublicLinkError(Exception):
+    """The link is malformed, forged, for another handover or revoked"""
+
+
+class PublicLinkExpired(PublicLinkError):
+    """The link was valid but its expiry has passed"""
+
+
+def get_link_lifetime():
+    return timedelta(days=getattr(settings, 'PUBLIC_HANDOVER_LINK_DAYS', 30))
+
+
+def _signer():
+    return signing.Signer(salt=SALT)
+
+
+def make_link_token(handover, expires_at=None):
+    """Signed token for ``handover``'s public page"""
+    expires_at = expires_at or timezone.now() + get_link_lifetime()
+    value = f"{handover.id.hex}.{handover.public_link_version}.{int(expires_at.timestamp())}"
+    return _signer().sign(value)
+
+
+def is_signed_token(token):
+    return ':' in token
+
+
+def verify_link_token(handover_id, token, now=None):
+    """
+    Check a signed token against ``handover_id`` without touching the database.
+    Returns (link version, expires_at); raises PublicLinkError or PublicLinkExpired.
+    """
+    try:
+        value = _signer().unsign(token)
+        signed_id, version, expires = value.split('.')
+        version, expires = int(version), int(expires)
+    except (signing.BadSignature, ValueError):
+        raise PublicLinkError("Invalid handover link")
+
+    if signed_id != uuid.UUID(str(handover_id)).hex:
+        raise PublicLinkError("Invalid handover link")
+    if version < get_denylist().get(signed_id, 0):
+        raise PublicLinkError("This handover link has been revoked")
+    if expires < (now or time.time()):
+        raise PublicLinkExpired("This handover link has expired")
+    return version, datetime.fromtimestamp(expires, tz=dt_timezone.utc)
+
+
+def get_denylist():
+    """{handover id hex: oldest valid link version} for handovers whose links were revoked"""
+    denylist = cache.get(DENYLIST_CACHE_KEY)
+    if denylist is None:
+        denylist = {
+            handover_id.hex: version
+            for handover_id, version in Handover.objects.filter(public_link_version__gt=1).values_list('id', 'public_link_version')
+        }
+        cache.set(DENYLIST_CACHE_KEY, denylist, DENYLIST_CACHE_TIMEOUT)
+    return denylist
+
+
+def revoke_public_links(handovers):
+    """Invalidate every public link issued so far for ``handovers`` (a queryset)"""
+    handover_ids = list(handovers.values_list('id', flat=True))
+    Handover.objects.filter(id__in=handover_ids).update(public_link_version=F('public_link_version') + 1)
+    HandoverToken.objects.filter(handover_id__in=handover_ids).update(is_active=False)
+    cache.delete(DENYLIST_CACHE_KEY)
+    logger.info(f"Revoked public links for {len(handover_ids)} handover(s)")
+    return len(handover_ids)
+
+
+def check_public_access(handover, token):
+    """
+    Validate ``token`` for an already loaded ``handover``, signed or legacy.
+    Raises PublicLinkError / PublicLinkExpired.
+    """
+    if is_signed_token(token):
+        version, _ = verify_link_token(handover.id, token)
+        # The denylist may be a few moments behind a revocation; the loaded row is not
+        if version < handover.public_link_version:
+            raise PublicLinkError("This handover link has been revoked")
+        return
+
+    try:
+        legacy_token = HandoverToken.objects.get(handover=handover, token=token)
+    except HandoverToken.DoesNotExist:
+        raise PublicLinkError("Invalid handover link or token")
+    if not legacy_token.is_valid():
+        raise PublicLinkExpired("Token has expired or is no longer valid")
+
+
+def issue_link_tokens(handovers, now=None):
+    """
+    Signed tokens for ``handovers``, recording the latest issued link of each in
+    HandoverToken (bulk, for audit). A row that still holds a legacy token is
+    left alone, as that token may be in an email already sent.
+    Returns {handover.id: token}.
+    """
+    now = now or timezone.now()
+    expires_at = now + get_link_lifetime()
+    tokens = {handover.id: make_link_token(handover, expires_at) for handover in handovers}
+
+    existing = {token.handover_id: token for token in HandoverToken.objects.filter(handover_id__in=tokens)}
+    to_create, to_update = [], []
+    for handover_id, token in tokens.items():
+        audit = existing.get(handover_id)
+        if audit is None:
+            to_create.append(HandoverToken(handover_id=handover_id, token=token, is_active=True, expires_at=expires_at))
+        elif is_signed_token(audit.token):
+            audit.token, audit.is_active, audit.expires_at = token, True, expires_at
+            to_update.append(audit)
+
+    if to_create:
+        HandoverToken.objects.bulk_create(to_create, batch_size=500)
+    if to_update:
+        HandoverToken.objects.bulk_update(to_update, ['token', 'is_active', 'expires_at'], batch_size=500)
+    return tokens
+
+
+def get_public_handover_url(handover, token=None):
+    """Absolute public URL for ``handover`` (issues a new signed token unless one is given)"""
+    token = token or issue_link_tokens([handover])[handover.id]
+    domain = getattr(settings, 'EMAIL_DOMAIN', settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else '172.27.2.43')
+    return f"https://{domain}{reverse('assets:public_handover_detail', args=[handover.id, token])}"
@@ -0,0 +1,122 @@
+"""
+Signature reminders for pending handovers.
+
+``queue_handover_reminders`` selects every overdue pending handover in a single
+query (status/created_at index, reminder history checked with EXISTS), renders
+all emails from templates compiled once, and bulk-inserts the outbound emails
+and reminder records. The emails are delivered in Graph batches by the
+outbound email worker (or immediately with ``send_handover_reminders --deliver``).
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q
+from django.template.loader import get_template
+from django.utils import timezone
+
+from .models import Handover, HandoverReminder, OutboundEmail
+from .public_links import get_public_handover_url, issue_link_tokens
+
+logger = logging.getLogger(__name__)
+
+
+def get_reminder_settings():
+    """(first reminder after, interval between reminders, max reminders)"""
+    return (
+        timedelta(days=getattr(settings, 'HANDOVER_REMINDER_AFTER_DAYS', 3)),
+        timedelta(days=getattr(settings, 'HANDOVER_REMINDER_INTERVAL_DAYS', 3)),
+        getattr(settings, 'HANDOVER_REMINDER_MAX', 3),
+    )
+
+
+def get_overdue_handovers(now=None, handovers=None, respect_schedule=True):
+    """
+    Pending handovers that are due a reminder, with the employee joined.
+    ``handovers`` narrows the selection (admin action); ``respect_schedule=False``
+    skips the age/interval/max checks for manual reminders.
+    """
+    now = now or timezone.now()
+    first_after, interval, max_reminders = get_reminder_settings()
+
+    queryset = (handovers if handovers is not None else Handover.objects.all()).filter(
+        status='Pending',
+    ).exclude(
+        Q(employee__email__isnull=True) | Q(employee__email='')
+    ).annotate(
+        reminder_count=Count('reminders'),
+    ).select_related('employee')
+
+    if respect_schedule:
+        recent_reminder = HandoverReminder.objects.filter(
+            handover=OuterRef('pk'),
+            created_at__gt=now - interval,
+        )
+        queryset = queryset.filter(
+            created_at__lte=now - first_after,
+        ).filter(
+            ~Exists(recent_reminder),
+            reminder_count__lt=max_reminders,
+        )
+
+    return queryset.order_by('created_at')
+
+
+def queue_handover_reminders(handovers=None, respect_schedule=True, sent_by=None, dry_run=False, limit=None):
+    """
+    Queue reminder emails for overdue pending handovers.
+    Returns the list of handovers that were (or, with dry_run, would be) reminded.
+    """
+    now = timezone.now()
+    due = get_overdue_handovers(now, handovers, respect_schedule)
+    if limit:
+        due = due[:limit]
+    due = list(due)
+    if dry_run or not due:
+        return due
+
+    html_template = get_template('emails/handover_reminder.html')
+    text_template = get_template('emails/handover_reminder.txt')
+    from_email = settings.DEFAULT_FROM_EMAIL
+
+    with transaction.atomic():
+        tokens = issue_link_tokens(due, now)
+
+        emails, reminders = [], []
+        for handover in due:
+            reminder_number = handover.reminder_count + 1
+            context = {
+                'employee_name': handover.employee.name,
+                'handover_id': handover.handover_id,
+                'created_at': handover.created_at,
+                'days_pending': (now - handover.created_at).days,
+                'reminder_number': reminder_number,
+                'handover_url': get_public_handover_url(handover, tokens[handover.id]),
+            }
+            email = OutboundEmail(
+                idempotency_key=f"handover_reminder:{handover.id}:{reminder_number}",
+                kind='handover_reminder',
+                from_email=from_email,
+                to=[handover.employee.email],
+                subject=f"Reminder: Asset Handover Signature Required - {handover.handover_id} - Harren Group",
+                body_text=text_template.render(context),
+                body_html=html_template.render(context),
+                handover=handover,
+                next_attempt_at=now,
+            )
+            emails.append(email)
+            reminders.append(HandoverReminder(
+                handover=handover,
+                outbound_email=email,
+                reminder_number=reminder_number,
+                sent_to=handover.employee.email,
+                sent_by=sent_by,
+            ))
+
+        OutboundEmail.objects.bulk_create(emails, batch_size=500)
+        HandoverReminder.objects.bulk_create(reminders, batch_size=500)
+
+    logger.info(f"Queued {len(due)} handover signature reminder(s)")
+    return due
@@ -0,0 +1,476 @@
+"""
+Local retrieval index that grounds AI answers in AssetTrack records.
+
+Every asset, employee and handover becomes one short text document, for example
+"Asset: ThinkPad T14 | laptop | serial PF3X... | assigned to Jana Meyer". The
+documents are turned into TF-IDF vectors over character 3-grams and whole
+words, so "thinkpads in hamburg" still finds "ThinkPad T14 ... office hamburg".
+Features are hashed into ``DIMENSIONS`` buckets, which keeps the vocabulary
+fixed and lets documents be added and removed one at a time. No embedding
+service is involved; a query is one sparse dot product over NumPy arrays and
+takes a few milliseconds for tens of thousands of records.
+
+The index lives in each worker process and is kept in step with the inventory
+data generation (see ``inventory_snapshot.py``). The signal handlers record
+which records each bump touched, so a query after a change only re-reads
+those. If the change log is incomplete (cache evicted, a bulk update that
+bypasses the signals, another worker's bump with the per-process LocMem cache
+that wasn't seen) the index is rebuilt from scratch, and it is also rebuilt
+after ``REBUILD_INTERVAL`` seconds regardless. The index is saved to
+``AI_INDEX_PATH`` so a restarted worker can start from the file;
+``manage.py build_ai_index`` rebuilds it explicitly. Generations are only
+meaningful within one cache, so the file also carries a watermark of the
+tables (``data_watermark``). A worker takes the file as current while the
+record counts and latest ``updated_at`` values still match. Otherwise it
+applies the change log since the file's generation, or rebuilds when that
+isn't available (after a cache restart, for instance).
+
+NumPy is optional: without it ``retrieve_records`` returns nothing and the
+assistant answers without grounding.
+"""
+
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import zlib
+
+from django.conf import settings
+from django.db.models import Count, Max, Prefetch
+
+from .inventory_snapshot import get_changes, get_data_generation
+from .models import Asset, Employee, Handover, HandoverAsset
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONS = 2 ** 18
+NGRAM_SIZE = 3
+# Rows removed by updates are only dropped from the arrays once they make up
+# this share of the index
+COMPACT_DEAD_FRACTION = 0.25
+REBUILD_INTERVAL = 6 * 3600
+SAVE_INTERVAL = 60
+MIN_SCORE = 0.05
+DEFAULT_MAX_RECORDS = 8
+DEFAULT_TOKEN_BUDGET = 600
+BUILD_CHUNK_SIZE = 2000
+
+_WORD = re.compile(r'\w+')
+
+
+def index_available():
+    return np is not None
+
+
+def get_index_path():
+    return getattr(settings, 'AI_INDEX_PATH', os.path.join(settings.BASE_DIR, 'private', 'ai_index.npz'))
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English text and identifiers
+    return len(text) // 4 + 1
+
+
+def extract_features(text):
+    """
+    Hashed feature ids and log-scaled term frequencies for ``text``: the
+    character 3-grams of every word (padded with spaces, so prefixes and
+    suffixes count) plus the word itself.
+    """
+    features = []
+    for word in _WORD.findall(text.lower()):
+        features.append(f'w:{word}')
+        padded = f' {word} '
+        features.extend(padded[i:i + NGRAM_SIZE] for i in range(len(padded) - NGRAM_SIZE + 1))
+    if not features:
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+    # zlib.crc32 rather than hash(), which is salted per process
+    hashed = np.fromiter(
+        (zlib.crc32(feature.encode('utf-8')) % DIMENSIONS for feature in features),
+        dtype=np.int32,
+        count=len(features),
+    )
+    indices, counts = np.unique(hashed, return_counts=True)
+    return indices, np.log1p(counts).astype(np.float32)
+
+
+def _display(value):
+    return value if value else '-'
+
+
+def asset_document(asset):
+    assignee = asset.assigned_to.name if asset.assigned_to else 'nobody'
+    return (
+        f"Asset: {asset.name} | {asset.get_asset_type_display()} | serial {asset.serial_number}"
+        f" | ST tag {_display(asset.st_tag)} | {_display(asset.manufacturer)} {_display(asset.model)}"
+        f" | status {asset.status} | office {asset.office_location} | assigned to {assignee}"
+    )
+
+
+def employee_document(employee):
+    return (
+        f"Employee: {employee.name} | {employee.email} | department {employee.department}"
+        f" | {_display(employee.job_title)} | office {employee.office_location}"
+        f" | {'active' if employee.is_active else 'inactive'}"
+    )
+
+
+def handover_document(handover):
+    asset_names = ', '.join(item.asset.name for item in handover.handoverasset_set.all()) or 'no assets'
+    return (
+        f"Handover: {handover.handover_id} | employee {handover.employee.name} | status {handover.status}"
+        f" | created {handover.created_at:%Y-%m-%d} | assets: {asset_names}"
+    )
+
+
+def _asset_queryset():
+    return Asset.objects.select_related('assigned_to').only(
+        'id', 'name', 'asset_type', 'serial_number', 'st_tag', 'manufacturer', 'model',
+        'status', 'office_location', 'assigned_to__name',
+    )
+
+
+def _employee_queryset():
+    return Employee.objects.only(
+        'id', 'name', 'email', 'department', 'job_title', 'office_location', 'is_active',
+    )
+
+
+def _handover_queryset():
+    return Handover.objects.select_related('employee').only(
+        'id', 'handover_id', 'status', 'created_at', 'employee__name',
+    ).prefetch_related(
+        Prefetch('handoverasset_set', queryset=HandoverAsset.objects.select_related('asset').only('handover_id', 'asset__name')),
+    )
+
+
+def iter_documents(asset_ids=None, employee_ids=None, handover_ids=None):
+    """
+    (key, text) for every asset, employee and handover, or only for the given
+    ids when any id list is passed.
+    """
+    selective = any(ids is not None for ids in (asset_ids, employee_ids, handover_ids))
+    sources = [
+        ('asset', _asset_queryset(), asset_document, asset_ids),
+        ('employee', _employee_queryset(), employee_document, employee_ids),
+        ('handover', _handover_queryset(), handover_document, handover_ids),
+    ]
+    for kind, queryset, make_document, ids in sources:
+        if selective:
+            if not ids:
+                continue
+            queryset = queryset.filter(id__in=ids)
+        for record in queryset.iterator(chunk_size=BUILD_CHUNK_SIZE):
+            yield f'{kind}:{record.pk}', make_document(record)
+
+
+class RetrievalIndex:
+    """
+    Sparse TF-IDF index in CSR layout: row ``r`` holds feature ids
+    ``indices[indptr[r]:indptr[r + 1]]`` with term frequencies from ``data``.
+    Document frequencies are kept up to date as rows come and go; the IDF
+    weights are applied at query time.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.texts = []
+        self.rows = {}
+        self.alive = np.zeros(0, dtype=bool)
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.indices = np.zeros(0, dtype=np.int32)
+        self.data = np.zeros(0, dtype=np.float32)
+        self.doc_freq = np.zeros(DIMENSIONS, dtype=np.int32)
+        self.generation = None
+        self.watermark = None
+        self.built_at = time.time()
+        self._norms = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add_documents(self, documents):
+        """Add or replace (key, text) documents"""
+        new_indices, new_data, lengths = [], [], []
+        for key, text in documents:
+            self._drop(key)
+            indices, data = extract_features(text)
+            if not len(indices):
+                continue
+            self.rows[key] = len(self.keys)
+            self.keys.append(key)
+            self.texts.append(text)
+            new_indices.append(indices)
+            new_data.append(data)
+            lengths.append(len(indices))
+        if not lengths:
+            self._compact_if_needed()
+            return
+        new_indices = np.concatenate(new_indices)
+        self.indices = np.concatenate([self.indices, new_indices])
+        self.data = np.concatenate([self.data] + new_data)
+        self.indptr = np.concatenate([self.indptr, self.indptr[-1] + np.cumsum(lengths)])
+        self.alive = np.concatenate([self.alive, np.ones(len(lengths), dtype=bool)])
+        np.add.at(self.doc_freq, new_indices, 1)
+        self._norms = None
+        self._compact_if_needed()
+
+    def remove(self, key):
+        self._drop(key)
+        self._compact_if_needed()
+
+    def _drop(self, key):
+        row = self.rows.pop(key, None)
+        if row is None:
+            return
+        self.alive[row] = False
+        np.subtract.at(self.doc_freq, self.indices[self.indptr[row]:self.indptr[row + 1]], 1)
+        self._norms = None
+
+    def _compact_if_needed(self):
+        dead = len(self.keys) - len(self.rows)
+        if dead > 100 and dead > COMPACT_DEAD_FRACTION * len(self.keys):
+            self.compact()
+
+    def compact(self):
+        """Drop the rows of removed and replaced documents"""
+        keep = np.flatnonzero(self.alive)
+        lengths = np.diff(self.indptr)
+        entries = np.repeat(self.alive, lengths)
+        self.indices = self.indices[entries]
+        self.data = self.data[entries]
+        lengths = lengths[keep]
+        self.indptr = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        self.keys = [self.keys[row] for row in keep]
+        self.texts = [self.texts[row] for row in keep]
+        self.rows = {key: row for row, key in enumerate(self.keys)}
+        self.alive = np.ones(len(keep), dtype=bool)
+        self._norms = None
+
+    def _idf(self):
+        return np.log((len(self.rows) + 1) / (self.doc_freq.astype(np.float32) + 1)) + 1
+
+    def search(self, query, limit=DEFAULT_MAX_RECORDS):
+        """[(key, text, score)] of the best matches for ``query``, best first"""
+        if not self.rows:
+            return []
+        query_indices, query_data = extract_features(query)
+        if not len(query_indices):
+            return []
+        idf = self._idf()
+        if self._norms is None:
+            weights = self.data * idf[self.indices]
+            self._norms = np.sqrt(np.add.reduceat(weights * weights, self.indptr[:-1]))
+        query_vector = np.zeros(DIMENSIONS, dtype=np.float32)
+        query_vector[query_indices] = query_data * idf[query_indices] ** 2
+        query_norm = np.linalg.norm(query_data * idf[query_indices])
+
+        # Every row has at least one feature, so reduceat sums exactly one row per offset
+        scores = np.add.reduceat(self.data * query_vector[self.indices], self.indptr[:-1])
+        scores = scores / (self._norms * query_norm + 1e-9)
+        scores[~self.alive] = 0
+
+        limit = min(limit, len(scores))
+        best = np.argpartition(-scores, limit - 1)[:limit]
+        best = best[np.argsort(-scores[best])]
+        return [
+            (self.keys[row], self.texts[row], float(scores[row]))
+            for row in best
+            if scores[row] >= MIN_SCORE
+        ]
+
+    def save(self, path):
+        """Write the index to ``path`` atomically"""
+        self.compact()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.npz')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                np.savez(
+                    tmp,
+                    indptr=self.indptr,
+                    indices=self.indices,
+                    data=self.data,
+                    keys=np.array(self.keys, dtype=str),
+                    texts=np.array(self.texts, dtype=str),
+                    generation=np.array([self.generation or 0], dtype=np.int64),
+                    watermark=np.array([self.watermark or ''], dtype=str),
+                    built_at=np.array([self.built_at]),
+                )
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        index = cls()
+        with np.load(path, allow_pickle=False) as saved:
+            index.indptr = saved['indptr']
+            index.indices = saved['indices']
+            index.data = saved['data']
+            index.keys = [str(key) for key in saved['keys']]
+            index.texts = [str(text) for text in saved['texts']]
+            index.generation = int(saved['generation'][0])
+            index.watermark = str(saved['watermark'][0]) if 'watermark' in saved.files else ''
+            index.built_at = float(saved['built_at'][0])
+        index.rows = {key: row for row, key in enumerate(index.keys)}
+        index.alive = np.ones(len(index.keys), dtype=bool)
+        np.add.at(index.doc_freq, index.indices, 1)
+        return index
+
+
+def data_watermark():
+    """
+    Summary of the indexed tables (record counts, latest ``updated_at``) that
+    changes whenever a record is saved or deleted
+    """
+    parts = []
+    for model in (Asset, Employee, Handover):
+        stats = model.objects.aggregate(count=Count('id'), latest=Max('updated_at'))
+        latest = stats['latest'].isoformat() if stats['latest'] else ''
+        parts.append(f"{model._meta.model_name}:{stats['count']}:{latest}")
+    # Handover documents list their assets; HandoverAsset has no updated_at
+    stats = HandoverAsset.objects.aggregate(count=Count('id'), latest=Max('id'))
+    parts.append(f"handoverasset:{stats['count']}:{stats['latest'] or ''}")
+    return '|'.join(parts)
+
+
+def build_index():
+    """A fresh index over every asset, employee and handover"""
+    generation = get_data_generation()
+    index = RetrievalIndex()
+    index.watermark = data_watermark()
+    index.add_documents(iter_documents())
+    index.generation = generation
+    return index
+
+
+def apply_changes(index, changes):
+    """Re-read the changed records; deleted ones drop out of the index"""
+    ids = {'asset': set(), 'employee': set(), 'handover': set()}
+    for kind, pk in changes:
+        if kind in ids:
+            ids[kind].add(pk)
+    if ids['employee']:
+        # Asset and handover documents show the employee's name
+        ids['asset'].update(str(pk) for pk in Asset.objects.filter(assigned_to_id__in=ids['employee']).values_list('id', flat=True))
+        ids['handover'].update(str(pk) for pk in Handover.objects.filter(employee_id__in=ids['employee']).values_list('id', flat=True))
+    documents = list(iter_documents(
+        asset_ids=ids['asset'], employee_ids=ids['employee'], handover_ids=ids['handover'],
+    ))
+    found = {key for key, _ in documents}
+    for kind, pks in ids.items():
+        for pk in pks:
+            if f'{kind}:{pk}' not in found:
+                index.remove(f'{kind}:{pk}')
+    index.add_documents(documents)
+
+
+_index = None
+_index_lock = threading.Lock()
+_last_saved = 0
+
+
+def _save(index):
+    global _last_saved
+    try:
+        index.save(get_index_path())
+        _last_saved = time.monotonic()
+    except OSError as e:
+        logger.warning(f"Could not save the AI retrieval index: {e}")
+
+
+def _load_saved_index(generation):
+    """
+    The saved index. If it still matches the database it is current as of
+    ``generation`` (read before the check); otherwise it keeps its saved
+    generation and is brought up to date from the change log, if possible.
+    """
+    path = get_index_path()
+    if not os.path.exists(path):
+        return None
+    try:
+        index = RetrievalIndex.load(path)
+    except Exception as e:
+        logger.warning(f"Could not load the AI retrieval index from {path}: {e}")
+        return None
+    if index.watermark == data_watermark():
+        index.generation = generation
+    return index
+
+
+def get_index():
+    """This process's index, brought up to the current data generation. Call with _index_lock held."""
+    global _index
+    if _index is None:
+        _index = _load_saved_index(get_data_generation())
+    if _index is not None and time.time() - _index.built_at >= REBUILD_INTERVAL:
+        _index = None
+
+    generation = get_data_generation()
+    if _index is not None and _index.generation == generation:
+        return _index
+
+    changes = None
+    save = False
+    if _index is not None:
+        save = time.monotonic() - _last_saved > SAVE_INTERVAL
+        # Taken before the changes are read, so the saved watermark never
+        # claims a change the index hasn't got
+        watermark = data_watermark() if save else None
+        generation = get_data_generation()
+        if _index.generation < generation:
+            changes = get_changes(_index.generation, generation)
+    if changes is None:
+        started = time.monotonic()
+        _index = build_index()
+        logger.info(f"Built AI retrieval index with {len(_index)} records in {time.monotonic() - started:.2f}s")
+        _save(_index)
+    else:
+        apply_changes(_index, changes)
+        _index.generation = generation
+        _index.watermark = watermark
+        if save:
+            _save(_index)
+    return _index
+
+
+def rebuild_index():
+    """Rebuild this process's index from the database and save it; returns it"""
+    global _index
+    with _index_lock:
+        _index = build_index()
+        _save(_index)
+        return _index
+
+
+def retrieve_records(query, max_records=None, token_budget=None):
+    """
+    Text of the records most relevant to ``query``, best first, limited to
+    ``max_records`` and to about ``token_budget`` tokens in total
+    (``AI_CONTEXT_MAX_RECORDS`` / ``AI_CONTEXT_TOKEN_BUDGET``).
+    """
+    if not index_available():
+        return []
+    max_records = max_records or getattr(settings, 'AI_CONTEXT_MAX_RECORDS', DEFAULT_MAX_RECORDS)
+    token_budget = token_budget or getattr(settings, 'AI_CONTEXT_TOKEN_BUDGET', DEFAULT_TOKEN_BUDGET)
+    with _index_lock:
+        matches = get_index().search(query, max_records)
+
+    records, used = [], 0
+    for _, text, _ in matches:
+        tokens = estimate_tokens(text)
+        if used + tokens > token_budget:
+            break
+        records.append(text)
+        used += tokens
+    return records
@@ -0,0 +1,112 @@
+"""
+Signal handlers that keep ``Handover.search_text`` in sync (see handover_search.py),
+the notification unread counters and cached feed state (see notification_feed.py)
+and the inventory data generation (see inventory_snapshot.py).
+"""
+
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .handover_search import refresh_search_text
+from .inventory_snapshot import bump_data_generation
+from .models import Asset, Employee, Handover, HandoverAsset, Notification, NotificationCounter, WelcomePack
+from .notification_feed import invalidate_feed_state
+
+def _affects_search(update_fields, search_fields):
+    return update_fields is None or bool(set(search_fields) & set(update_fields))
+
+
+@receiver(post_save, sender=HandoverAsset)
+@receiver(post_delete, sender=HandoverAsset)
+def handover_asset_changed(sender, instance, **kwargs):
+    refresh_search_text([instance.handover_id])
+
+
+@receiver(m2m_changed, sender=Handover.assets.through)
+def handover_assets_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        # handover.assets.add/remove/clear
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            refresh_search_text([instance.pk])
+    elif action == 'pre_clear':
+        # asset.handover_set.clear() passes no pk_set; note the handovers before the links go
+        instance._search_handover_ids = list(
+            HandoverAsset.objects.filter(asset=instance).values_list('handover_id', flat=True)
+        )
+    elif action == 'post_clear':
+        refresh_search_text(getattr(instance, '_search_handover_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        refresh_search_text(pk_set or [])
+
+
+@receiver(pre_save, sender=Employee)
+@receiver(pre_save, sender=Asset)
+def note_search_fields_changed(sender, instance, update_fields, **kwargs):
+    """
+    Flag saves that change a field copied into handover search text, against
+    the values remembered when the row was loaded. Only an instance whose
+    saved values aren't known (built by hand, or with the fields deferred)
+    costs a query.
+    """
+    instance._search_fields_changed = False
+    if instance._state.adding or not _affects_search(update_fields, sender.SEARCH_FIELDS):
+        return
+    changed = instance.search_fields_changed()
+    if changed is None:
+        fields = list(sender.SEARCH_FIELDS)
+        current = sender.objects.filter(pk=instance.pk).values_list(*fields).first()
+        changed = current is not None and current != tuple(getattr(instance, field) for field in fields)
+    instance._search_fields_changed = changed
+
+
+@receiver(post_save, sender=Employee)
+def employee_saved(sender, instance, update_fields, **kwargs):
+    if getattr(instance, '_search_fields_changed', False):
+        refresh_search_text(Handover.objects.filter(employee=instance).values_list('id', flat=True))
+    instance.remember_search_fields(update_fields)
+
+
+@receiver(post_save, sender=Asset)
+def asset_saved(sender, instance, update_fields, **kwargs):
+    if getattr(instance, '_search_fields_changed', False):
+        refresh_search_text(HandoverAsset.objects.filter(asset=instance).values_list('handover_id', flat=True))
+    instance.remember_search_fields(update_fields)
+
+
+@receiver(post_save, sender=Notification)
+def notification_saved(sender, instance, created, **kwargs):
+    if created and not instance.is_read:
+        NotificationCounter.adjust([instance.user_id], 1)
+    invalidate_feed_state([instance.user_id])
+
+
+@receiver(post_delete, sender=Notification)
+def notification_deleted(sender, instance, **kwargs):
+    if not instance.is_read:
+        NotificationCounter.adjust([instance.user_id], -1)
+    invalidate_feed_state([instance.user_id])
+
+
+@receiver(post_save, sender=Asset)
+@receiver(post_delete, sender=Asset)
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+@receiver(post_save, sender=Handover)
+@receiver(post_delete, sender=Handover)
+@receiver(post_save, sender=HandoverAsset)
+@receiver(post_delete, sender=HandoverAsset)
+@receiver(post_save, sender=WelcomePack)
+@receiver(post_delete, sender=WelcomePack)
+def inventory_changed(sender, instance, **kwargs):
+    if sender is Asset:
+        changes = [('asset', instance.pk)]
+    elif sender is Employee:
+        changes = [('employee', instance.pk)]
+    elif sender is Handover:
+        changes = [('handover', instance.pk)]
+    elif sender is HandoverAsset:
+        changes = [('handover', instance.handover_id)]
+    else:
+        # Welcome packs aren't part of the AI retrieval index
+        changes = []
+    bump_data_generation(changes)
@@ -0,0 +1,165 @@
+"""
+Compact vector format for handwritten signatures.
+
+The signature pads submit the pen strokes instead of a rasterized PNG:
+
+    {"v": 1, "w": 600, "h": 200, "s": [[x0, y0, dx1, dy1, dx2, dy2, ...], ...]}
+
+Each stroke starts with an absolute integer point followed by integer deltas
+to the previous point, which keeps a typical signature around 1-2 KB of JSON
+instead of 20-60 KB of base64 PNG. The deltas map directly onto SVG relative
+``l`` commands, so rendering SVG is a string join; PNG rendering (for
+consumers that can't display SVG) needs Pillow. Rendered images are cached,
+keyed by the stroke data's SHA-256.
+"""
+
+import io
+import json
+
+from django.core.cache import cache
+
+STROKES_CONTENT_TYPE = 'application/vnd.assettrack.strokes+json'
+STROKES_VERSION = 1
+
+# The pads are 600x200 (public handover page) and about 350x192 (signature
+# modal); anything much larger isn't a signature pad
+MAX_WIDTH = 1200
+MAX_HEIGHT = 600
+# Bounds width * height * scale^2 of a PNG render (~8.6 MB as RGB)
+MAX_RENDER_PIXELS = 4 * MAX_WIDTH * MAX_HEIGHT
+MAX_STROKES = 500
+MAX_POINTS = 20000
+STROKE_WIDTH = 2.5
+RENDER_CACHE_TIMEOUT = 7 * 24 * 3600
+
+
+class StrokeFormatError(ValueError):
+    """Raised when submitted stroke data is malformed or out of bounds"""
+
+
+def parse_strokes(payload):
+    """
+    Validate a stroke payload (dict or JSON string) and return
+    (width, height, strokes) with strokes as lists of absolute (x, y) points.
+    """
+    if isinstance(payload, (str, bytes)):
+        try:
+            payload = json.loads(payload)
+        except ValueError:
+            raise StrokeFormatError("Signature strokes are not valid JSON")
+    if not isinstance(payload, dict):
+        raise StrokeFormatError("Signature strokes must be an object")
+    if payload.get('v') != STROKES_VERSION:
+        raise StrokeFormatError("Unsupported signature stroke format version")
+
+    width, height, encoded = payload.get('w'), payload.get('h'), payload.get('s')
+    if not all(isinstance(value, int) and not isinstance(value, bool) for value in (width, height)) \
+            or not (0 < width <= MAX_WIDTH and 0 < height <= MAX_HEIGHT):
+        raise StrokeFormatError("Invalid signature canvas size")
+    if not isinstance(encoded, list) or not encoded:
+        raise StrokeFormatError("Signature is empty")
+    if len(encoded) > MAX_STROKES:
+        raise StrokeFormatError("Signature has too many strokes")
+
+    strokes, total_points = [], 0
+    for stroke in encoded:
+        if not isinstance(stroke, list) or len(stroke) < 2 or len(stroke) % 2:
+            raise StrokeFormatError("Invalid signature stroke")
+        if not all(isinstance(value, int) and not isinstance(value, bool) for value in stroke):
+            raise StrokeFormatError("Signature coordinates must be integers")
+
+        total_points += len(stroke) // 2
+        if total_points > MAX_POINTS:
+            raise StrokeFormatError("Signature has too many points")
+
+        x, y = stroke[0], stroke[1]
+        points = [(x, y)]
+        for index in range(2, len(stroke), 2):
+            x += stroke[index]
+            y += stroke[index + 1]
+            points.append((x, y))
+        if any(not (0 <= px <= width and 0 <= py <= height) for px, py in points):
+            raise StrokeFormatError("Signature stroke is outside the canvas")
+        strokes.append(points)
+
+    return width, height, strokes
+
+
+def encode_strokes(width, height, strokes):
+    """Canonical compact JSON bytes for parsed strokes (stable, so hashes dedupe)"""
+    encoded = []
+    for points in strokes:
+        x0, y0 = points[0]
+        stroke = [x0, y0]
+        for (px, py), (x, y) in zip(points, points[1:]):
+            stroke.extend((x - px, y - py))
+        encoded.append(stroke)
+    payload = {'v': STROKES_VERSION, 'w': width, 'h': height, 's': encoded}
+    return json.dumps(payload, separators=(',', ':')).encode('ascii')
+
+
+def render_svg(data):
+    """Render stored stroke bytes as an SVG document (bytes)"""
+    width, height, strokes = parse_strokes(data)
+    paths = []
+    for points in strokes:
+        (x0, y0), rest = points[0], points[1:]
+        if rest:
+            deltas = ' '.join(f'{x - px} {y - py}' for (px, py), (x, y) in zip(points, rest))
+            paths.append(f'M{x0} {y0}l{deltas}')
+        else:
+            # A single tap: draw a dot
+            paths.append(f'M{x0} {y0}l0 0')
+    svg = (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}" width="{width}" height="{height}">'
+        f'<rect width="100%" height="100%" fill="white"/>'
+        f'<path d="{" ".join(paths)}" fill="none" stroke="black" stroke-width="{STROKE_WIDTH}" '
+        f'stroke-linecap="round" stroke-linejoin="round"/>'
+        f'</svg>'
+    )
+    return svg.encode('ascii')
+
+
+def render_png(data, scale=2):
+    """
+    Render stored stroke bytes as PNG (bytes); returns None without Pillow.
+    The scale is lowered if the image would exceed MAX_RENDER_PIXELS.
+    """
+    try:
+        from PIL import Image, ImageDraw
+    except ImportError:
+        return None
+
+    width, height, strokes = parse_strokes(data)
+    if width * height * scale * scale > MAX_RENDER_PIXELS:
+        scale = (MAX_RENDER_PIXELS / (width * height)) ** 0.5
+    image = Image.new('RGB', (int(width * scale), int(height * scale)), 'white')
+    draw = ImageDraw.Draw(image)
+    line_width = max(int(STROKE_WIDTH * scale), 1)
+    radius = line_width / 2
+    for points in strokes:
+        scaled = [(x * scale, y * scale) for x, y in points]
+        if len(scaled) > 1:
+            draw.line(scaled, fill='black', width=line_width, joint='curve')
+        for x, y in (scaled[0], scaled[-1]):
+            draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill='black')
+
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def render_cached(sha256, data, fmt='svg'):
+    """Rendered image for a stroke blob, cached by content hash. Returns (bytes, content_type)."""
+    if fmt == 'png':
+        key, content_type, renderer = f'signature_render:png:{sha256}', 'image/png', render_png
+    else:
+        key, content_type, renderer = f'signature_render:svg:{sha256}', 'image/svg+xml', render_svg
+
+    rendered = cache.get(key)
+    if rendered is None:
+        rendered = renderer(bytes(data))
+        if rendered is None:
+            return None, None
+        cache.set(key, rendered, RENDER_CACHE_TIMEOUT)
+    return rendered, content_type
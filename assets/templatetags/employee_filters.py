@@ -1,28 +1,65 @@
 from django import template
+from django.templatetags.static import static
 from django.urls import reverse
 from assets.models import Employee
+from assets import photo_store
 from datetime import date
 
 register = template.Library()
 
+# Avatars are mostly rendered at 32-40 px; 64 px keeps them sharp on HiDPI screens
+DEFAULT_AVATAR_SIZE = 64
+
 def is_valid_avatar_url(url):
     """Check if an avatar URL is valid and not empty"""
     return url and isinstance(url, str) and len(url.strip()) > 0
 
+def is_browser_loadable_avatar_url(url):
+    """
+    Check if a stored avatar URL can be used directly in an <img> tag.
+    Graph photo URLs need a bearer token, and inlined data URIs bloat every
+    page that lists employees, so both are replaced by the shared placeholder.
+    """
+    return (
+        is_valid_avatar_url(url)
+        and not url.startswith('data:')
+        and 'graph.microsoft.com' not in url
+    )
+
+def get_cached_photo_url(employee, size=DEFAULT_AVATAR_SIZE):
+    """
+    URL of the locally cached Azure AD photo, using the smallest WebP
+    thumbnail that covers ``size`` pixels (the original if the thumbnails
+    weren't rendered). Returns None if no photo is cached.
+    """
+    photo_hash = getattr(employee, 'photo_hash', '')
+    if not photo_hash:
+        return None
+    
+    if getattr(employee, 'photo_thumbnails', False):
+        return photo_store.get_thumbnail_url(photo_hash, photo_store.pick_thumbnail_size(int(size)))
+    return photo_store.get_photo_url(photo_hash)
+
 @register.filter
-def employee_avatar_url(employee):
+def employee_avatar_url(employee, size=DEFAULT_AVATAR_SIZE):
     """
     Get the appropriate avatar URL for an employee.
     Uses consistent gray person icons everywhere.
+    Usage: {{ employee|employee_avatar_url }} or {{ employee|employee_avatar_url:128 }}
     """
     if not employee:
         return get_professional_avatar_url(employee)
     
-    # Priority 1: Use stored avatar URL (gray person icon)
-    if employee.avatar_url and is_valid_avatar_url(employee.avatar_url):
+    # Priority 1: Use the locally cached Azure AD photo thumbnail
+    cached_photo_url = get_cached_photo_url(employee, size)
+    if cached_photo_url:
+        return cached_photo_url
+    
+    # Priority 2: Use stored avatar URL
+    if is_browser_loadable_avatar_url(employee.avatar_url):
         return employee.avatar_url
     
-    # Priority 2: Fall back to gray person icon
+    # Priority 3: Fall back to gray person icon
     return get_professional_avatar_url(employee)
 
 def get_better_placeholder_url(employee):
@@ -50,13 +87,10 @@ def get_better_placeholder_url(employee):
 def get_professional_avatar_url(employee):
     """
     Generate a gray person avatar URL for an employee.
-    Uses a consistent gray person icon everywhere.
+    Uses one shared static placeholder file, so it is downloaded once and
+    cached by the browser instead of being inlined into every <img>.
     """
-    if not employee or not employee.name:
-        return "data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iNDAiIGhlaWdodD0iNDAiIHZpZXdCb3g9IjAgMCA0MCA0MCIgZmlsbD0ibm9uZSIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIj4KPGNpcmNsZSBjeD0iMjAiIGN5PSIxNiIgcj0iNiIgZmlsbD0iIzY2NjY2NiIvPgo8cGF0aCBkPSJNMTAgMzJDMTAgMjcuNTgyIDEzLjU4MiAyNCAxOCAyNEgyMkMyNi40MTggMjQgMzAgMjcuNTgyIDMwIDMyVjM0SDEwVjMyWiIgZmlsbD0iIzY2NjY2NiIvPgo8L3N2Zz4K"
-    
-    # Use gray person icon for all employees - consistent everywhere
-    return "data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iNDAiIGhlaWdodD0iNDAiIHZpZXdCb3g9IjAgMCA0MCA0MCIgZmlsbD0ibm9uZSIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIj4KPGNpcmNsZSBjeD0iMjAiIGN5PSIxNiIgcj0iNiIgZmlsbD0iIzY2NjY2NiIvPgo8cGF0aCBkPSJNMTAgMzJDMTAgMjcuNTgyIDEzLjU4MiAyNCAxOCAyNEgyMkMyNi40MTggMjQgMzAgMjcuNTgyIDMwIDMyVjM0SDEwVjMyWiIgZmlsbD0iIzY2NjY2NiIvPgo8L3N2Zz4K"
+    return static('images/avatar-placeholder.svg')
 
 def is_generic_avatar(avatar_url):
     """
@@ -121,18 +155,14 @@ def get_professional_avatar_url_for_user(user):
     return f"https://api.dicebear.com/7.x/initials/svg?seed={seed}&backgroundColor=1e40af&textColor=ffffff&fontSize=40&fontWeight=500&radius=50&text={initials}"
 
 @register.filter
-def safe_employee_avatar_url(employee):
+def safe_employee_avatar_url(employee, size=DEFAULT_AVATAR_SIZE):
     """
     Get a safe avatar URL for an employee with error handling.
     Uses consistent gray person icons everywhere.
+    Usage: {{ employee|safe_employee_avatar_url }} or {{ employee|safe_employee_avatar_url:128 }}
     """
     try:
-        # Priority 1: Use stored avatar URL (gray person icon)
-        if employee and employee.avatar_url and is_valid_avatar_url(employee.avatar_url):
-            return employee.avatar_url
-        
-        # Priority 2: Fall back to gray person icon
-        return get_professional_avatar_url(employee)
+        return employee_avatar_url(employee, size)
     except Exception:
         # If anything goes wrong, return a guaranteed working avatar with initials
         if employee and employee.name:
@@ -1,3 +1,656 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import requests
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.mail import EmailMessage
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+
+from . import retrieval_index
+from .ai_assistant import AssetTrackAI
+from .ai_cache import get_response_cache
+from .email_queue import deliver_pending_emails, enqueue_email, get_retry_delay
+from .handover_service import HandoverCreationError, create_handovers
+from .microsoft_graph_email import MicrosoftGraphEmailBackend
+from .models import (
+    Asset, Employee, Handover, HandoverAsset, HandoverToken, Notification, NotificationCounter, OutboundEmail,
+    SignatureBlob, WelcomePack,
+)
+from .notification_service import notify_users, prune_notifications
+from .public_links import PublicLinkError, check_public_access, get_public_handover_url, revoke_public_links
+from .signature_strokes import (
+    MAX_HEIGHT, MAX_POINTS, MAX_RENDER_PIXELS, MAX_STROKES, MAX_WIDTH, STROKES_CONTENT_TYPE, StrokeFormatError,
+    encode_strokes, parse_strokes, render_png, render_svg,
+)
+
+class RouteIntentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = Employee.objects.create(name='Jana Meyer', email='jana.meyer@example.com')
+        cls.laptop = Asset.objects.create(
+            name='ThinkPad T14', asset_type='laptop', serial_number='PF3X9K2', status='assigned',
+            assigned_to=cls.employee, warranty_expiry=timezone.localdate() + timedelta(days=10),
+        )
+        cls.ai = AssetTrackAI()
+
+    def assertRoutedTo(self, query, intent):
+        answer = self.ai.route_intent(query)
+        self.assertIsNotNone(answer, query)
+        self.assertEqual(answer['intent'], intent, query)
+        return answer
+
+    def test_open_ended_questions_go_to_the_model(self):
+        for query in [
+            "who has the ThinkPad T14?",
+            "should we renew the Adobe licenses or switch vendors?",
+            "What does the warranty cover on our Dell monitors?",
+            "why are so many handovers pending?",
+            "How many laptops should we buy next year?",
+            "How do I hand over a laptop?",
+            "Explain the difference between warranty and subscription tracking.",
+        ]:
+            self.assertIsNone(self.ai.route_intent(query), query)
+
+    def test_constraints_without_a_slot_go_to_the_model(self):
+        # Answering these with the unfiltered total would be confidently wrong
+        for query in [
+            "How many laptops does Jana Meyer have?",
+            "How many Dell monitors are there?",
+            "How many assets does the IT department have?",
+            "Number of employees in finance",
+            "how many handovers were created last week?",
+            "list pending handovers for Jana Meyer",
+            "How many laptops and phones are there?",
+            "Which laptop warranties expire next month?",
+        ]:
+            self.assertIsNone(self.ai.route_intent(query), query)
+    
+    def test_holder_by_serial_number(self):
+        answer = self.assertRoutedTo("Who has serial PF3X9K2?", 'asset_holder')
+        self.assertIn('Jana Meyer', answer['response'])
+
+    def test_counts(self):
+        answer = self.assertRoutedTo("How many laptops are there?", 'asset_count')
+        self.assertIn('1 laptop', answer['response'])
+        self.assertRoutedTo("how many employees are in bremen", 'employee_count')
+        answer = self.assertRoutedTo("How many available laptops do we have in the Hamburg office?", 'asset_count')
+        self.assertIn('0 laptops available in the Hamburg Office', answer['response'])
+        self.assertRoutedTo("How many handovers are pending?", 'handover_count')
+
+    def test_pending_handovers(self):
+        self.assertRoutedTo("Which handovers are pending?", 'pending_handovers')
+
+    def test_explicit_expiry_question(self):
+        answer = self.assertRoutedTo("What expires in the next 30 days?", 'expiring')
+        self.assertIn('PF3X9K2', answer['response'])
+        self.assertRoutedTo("Which warranties are expiring soon?", 'expiring')
+
+
+class ProcessQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_response_cache().clear()
+        self.ai = AssetTrackAI()
+        grounding = mock.patch.object(AssetTrackAI, 'get_grounding', return_value='')
+        grounding.start()
+        self.addCleanup(grounding.stop)
+
+    def ollama_reply(self, status_code=200, body=None):
+        return mock.Mock(status_code=status_code, json=mock.Mock(return_value=body))
+
+    def test_structured_question_does_not_call_the_model(self):
+        with mock.patch('assets.ai_assistant.requests.post') as post:
+            result = self.ai.process_query("How many employees are there?")
+        post.assert_not_called()
+        self.assertEqual(result['intent'], 'employee_count')
+        self.assertIn('0 active employees', result['response'])
+
+    def test_model_answer_is_cached(self):
+        reply = self.ollama_reply(body={'response': 'Ask IT.', 'done': True})
+        with mock.patch('assets.ai_assistant.requests.post', return_value=reply) as post:
+            first = self.ai.process_query("Who orders new monitors?")
+            second = self.ai.process_query("who orders new monitors")
+        self.assertEqual(post.call_count, 1)
+        self.assertIs(post.call_args.kwargs['json']['stream'], False)
+        self.assertEqual((first['response'], first['cached']), ('Ask IT.', False))
+        self.assertEqual((second['response'], second['cached']), ('Ask IT.', True))
+
+    def test_service_errors_are_reported_and_not_cached(self):
+        with mock.patch('assets.ai_assistant.requests.post', return_value=self.ollama_reply(503)) as post:
+            self.ai.process_query("Who orders new monitors?")
+            result = self.ai.process_query("Who orders new monitors?")
+        self.assertEqual(post.call_count, 2)
+        self.assertIn('Status: 503', result['response'])
+        self.assertFalse(result['cached'])
+
+
+class PublicLinkTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('it-admin')
+        employee = Employee.objects.create(name='Jana Meyer', email='jana.meyer@example.com')
+        self.handover = Handover.objects.create(employee=employee, created_by=user)
+    
+    def test_signed_link_is_accepted(self):
+        url = get_public_handover_url(self.handover)
+        token = url.rstrip('/').rsplit('/', 1)[-1]
+        check_public_access(self.handover, token)
+        with self.assertRaises(PublicLinkError):
+            check_public_access(self.handover, token[:-1] + ('A' if token[-1] != 'A' else 'B'))
+    
+    def test_legacy_token_survives_issuing_a_signed_link(self):
+        HandoverToken.objects.create(
+            handover=self.handover, token='legacy-random-token', expires_at=timezone.now() + timedelta(days=7),
+        )
+        get_public_handover_url(self.handover)
+        get_public_handover_url(self.handover)
+        check_public_access(self.handover, 'legacy-random-token')
+    
+    def test_revoked_links_are_rejected(self):
+        url = get_public_handover_url(self.handover)
+        HandoverToken.objects.filter(handover=self.handover).update(token='legacy-random-token')
+        revoke_public_links(Handover.objects.filter(pk=self.handover.pk))
+        self.handover.refresh_from_db()
+        for token in [url.rstrip('/').rsplit('/', 1)[-1], 'legacy-random-token']:
+            with self.assertRaises(PublicLinkError):
+                check_public_access(self.handover, token)
+
+
+class NotificationCounterTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+    
+    def notify(self, user, **kwargs):
+        return Notification.objects.create(
+            user=user, title='Asset assigned', message='ThinkPad T14', notification_type='asset_assigned', **kwargs
+        )
+    
+    def assertCounterExact(self, *users):
+        for user in users:
+            counter = NotificationCounter.objects.get(user=user)
+            self.assertEqual(counter.unread_count, Notification.objects.filter(user=user, is_read=False).count(), user)
+    
+    def test_created_and_deleted_notifications(self):
+        first = self.notify(self.alice)
+        self.notify(self.alice)
+        self.notify(self.alice, is_read=True)
+        self.assertCounterExact(self.alice)
+        first.delete()
+        self.assertCounterExact(self.alice)
+    
+    def test_bulk_fan_out_counts_users_without_a_counter_row(self):
+        self.notify(self.alice)
+        self.assertFalse(NotificationCounter.objects.filter(user=self.bob).exists())
+        self.assertEqual(notify_users([self.alice.id, self.bob.id, self.bob.id], 'Maintenance', 'Friday 18:00'), 2)
+        self.assertCounterExact(self.alice, self.bob)
+        self.assertEqual(NotificationCounter.objects.get(user=self.alice).unread_count, 2)
+    
+    def test_concurrent_mark_as_read_decrements_once(self):
+        notification = self.notify(self.alice)
+        self.notify(self.alice)
+        stale_copy = Notification.objects.get(pk=notification.pk)
+        notification.mark_as_read()
+        stale_copy.mark_as_read()
+        self.assertCounterExact(self.alice)
+        self.assertEqual(NotificationCounter.objects.get(user=self.alice).unread_count, 1)
+    
+    def test_mark_all_read_subtracts_what_it_marked(self):
+        self.notify(self.alice)
+        self.notify(self.alice)
+        self.notify(self.bob)
+        # A drifted counter stays off by the same amount instead of being forced to 0
+        NotificationCounter.objects.filter(user=self.alice).update(unread_count=3)
+        self.client.force_login(self.alice)
+        response = self.client.post(reverse('assets:mark_all_notifications_read'))
+        self.assertEqual(response.json(), {'success': True})
+        self.assertEqual(NotificationCounter.objects.get(user=self.alice).unread_count, 1)
+        self.assertCounterExact(self.bob)
+    
+    def test_prune_deletes_old_read_notifications_in_chunks(self):
+        old = timezone.now() - timedelta(days=120)
+        pruned_ids = []
+        for number in range(5):
+            notification = self.notify(self.alice if number % 2 else self.bob)
+            notification.mark_as_read()
+            pruned_ids.append(notification.id)
+        recent_read = self.notify(self.alice)
+        recent_read.mark_as_read()
+        old_unread = self.notify(self.bob)
+        Notification.objects.filter(id__in=pruned_ids + [old_unread.id]).update(created_at=old)
+        
+        self.assertEqual(prune_notifications(days=90, dry_run=True), 5)
+        archive = io.StringIO()
+        with self.assertNumQueries(3 * 2 + 1):
+            # A SELECT and a DELETE per chunk of 2, then the empty SELECT that ends the loop
+            pruned = prune_notifications(days=90, chunk_size=2, archive=archive)
+        self.assertEqual(pruned, 5)
+        archived = [json.loads(line) for line in archive.getvalue().splitlines()]
+        self.assertEqual([row['id'] for row in archived], sorted(pruned_ids))
+        self.assertEqual(archived[0]['title'], 'Asset assigned')
+        self.assertEqual(
+            set(Notification.objects.values_list('id', flat=True)), {recent_read.id, old_unread.id},
+        )
+        self.assertCounterExact(self.alice, self.bob)
+
+
+class CreateHandoversTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('it-admin')
+        self.jana = Employee.objects.create(name='Jana Meyer', email='jana.meyer@example.com')
+        self.tom = Employee.objects.create(name='Tom Berg', email='tom.berg@example.com')
+        self.laptop = Asset.objects.create(name='ThinkPad T14', asset_type='laptop', serial_number='PF3X9K2')
+        self.monitor = Asset.objects.create(name='Dell U2723QE', asset_type='monitor', serial_number='CN0M1Y')
+        self.phone = Asset.objects.create(name='iPhone 15', asset_type='phone', serial_number='F17ZQ3')
+        self.year = timezone.now().year
+    
+    def test_assets_are_assigned_per_employee(self):
+        handovers = create_handovers([
+            {'employee_id': self.jana.id, 'asset_ids': [self.laptop.id, self.monitor.id], 'notes': 'Desk 4.12'},
+            {'employee_id': str(self.tom.id), 'asset_ids': [str(self.phone.id)], 'mode': 'Paper & Scan'},
+        ], self.user)
+        
+        self.assertEqual([handover.employee for handover in handovers], [self.jana, self.tom])
+        self.assertEqual(handovers[1].mode, 'Paper & Scan')
+        self.assertEqual(
+            set(HandoverAsset.objects.filter(handover=handovers[0]).values_list('asset_id', flat=True)),
+            {self.laptop.id, self.monitor.id},
+        )
+        for asset, employee in [(self.laptop, self.jana), (self.monitor, self.jana), (self.phone, self.tom)]:
+            asset.refresh_from_db()
+            self.assertEqual((asset.status, asset.assigned_to), ('assigned', employee))
+    
+    def test_ids_are_consecutive_and_follow_existing_ones(self):
+        Handover.objects.bulk_create([
+            Handover(handover_id=f'HOV-{self.year}-0041', employee=self.jana, created_by=self.user),
+        ])
+        first = create_handovers([{'employee_id': self.jana.id, 'asset_ids': [self.laptop.id]}], self.user)
+        more = create_handovers([
+            {'employee_id': self.jana.id, 'asset_ids': [self.monitor.id]},
+            {'employee_id': self.tom.id, 'asset_ids': []},
+            {'employee_id': self.tom.id, 'asset_ids': [self.phone.id]},
+        ], self.user)
+        self.assertEqual(
+            [handover.handover_id for handover in first + more],
+            [f'HOV-{self.year}-{number:04d}' for number in range(42, 46)],
+        )
+    
+    def test_search_text_is_populated(self):
+        handover = create_handovers([
+            {'employee_id': self.jana.id, 'asset_ids': [self.laptop.id], 'notes': 'Replacement for broken X1'},
+        ], self.user)[0]
+        search_text = Handover.objects.get(pk=handover.pk).search_text
+        for part in [handover.handover_id.lower(), 'jana meyer', 'jana.meyer@example.com', 'thinkpad t14', 'pf3x9k2', 'broken x1']:
+            self.assertIn(part, search_text)
+    
+    def test_invalid_requests_write_nothing(self):
+        self.monitor.status = 'maintenance'
+        self.monitor.save()
+        self.phone.assigned_to = self.tom
+        self.phone.save()
+        for entries, error in [
+            ([{'employee_id': self.jana.id, 'asset_ids': [self.monitor.id]}], 'not available'),
+            ([{'employee_id': self.jana.id, 'asset_ids': [self.laptop.id, self.phone.id]}], 'not available'),
+            ([{'employee_id': self.jana.id, 'asset_ids': [self.laptop.id, self.laptop.id]}], 'duplicate assets'),
+            ([
+                {'employee_id': self.jana.id, 'asset_ids': [self.laptop.id]},
+                {'employee_id': self.tom.id, 'asset_ids': [self.laptop.id]},
+            ], 'more than one employee'),
+            ([{'employee_id': self.jana.id, 'asset_ids': ['not-a-uuid']}], 'not a valid id'),
+            ([{'employee_id': self.jana.id, 'asset_ids': [self.laptop.id], 'mode': 'Fax'}], 'invalid mode'),
+        ]:
+            with self.assertRaisesMessage(HandoverCreationError, error):
+                create_handovers(entries, self.user)
+        
+        self.assertFalse(Handover.objects.exists())
+        self.laptop.refresh_from_db()
+        self.assertEqual((self.laptop.status, self.laptop.assigned_to), ('available', None))
+
+
+@skipUnless(retrieval_index.index_available(), 'NumPy is not installed')
+class RetrievalIndexTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.index_path = os.path.join(directory.name, 'ai_index.npz')
+        path_override = override_settings(AI_INDEX_PATH=self.index_path)
+        path_override.enable()
+        self.addCleanup(path_override.disable)
+        self.restart_process()
+        
+        self.user = User.objects.create_user('it-admin')
+        self.jana = Employee.objects.create(name='Jana Meyer', email='jana.meyer@example.com', department='IT')
+        self.laptop = Asset.objects.create(
+            name='ThinkPad T14', asset_type='laptop', serial_number='PF3X9K2', status='assigned', assigned_to=self.jana,
+        )
+        self.monitor = Asset.objects.create(name='Dell U2723QE', asset_type='monitor', serial_number='CN0M1Y')
+        self.handover = Handover.objects.create(employee=self.jana, created_by=self.user)
+        self.handover.assets.add(self.laptop)
+    
+    def restart_process(self, clear_cache=True):
+        """Forget this process's index (and the shared cache), like a fresh worker"""
+        if clear_cache:
+            cache.clear()
+        retrieval_index._index = None
+        retrieval_index._last_saved = 0
+    
+    def get_index(self):
+        with retrieval_index._index_lock:
+            return retrieval_index.get_index()
+    
+    def document(self, kind, pk):
+        index = self.get_index()
+        row = index.rows.get(f'{kind}:{pk}')
+        return None if row is None else index.texts[row]
+    
+    def test_rename_updates_the_index_in_place(self):
+        index = self.get_index()
+        self.monitor.name = 'LG UltraFine 27'
+        self.monitor.save()
+        self.assertIs(self.get_index(), index)
+        self.assertIn('LG UltraFine 27', self.document('asset', self.monitor.pk))
+        self.assertEqual(index.search('ultrafine')[0][0], f'asset:{self.monitor.pk}')
+        self.assertFalse([key for key, _, _ in index.search('U2723QE') if key == f'asset:{self.monitor.pk}'])
+    
+    def test_delete_drops_the_document(self):
+        index = self.get_index()
+        self.monitor.delete()
+        self.assertIs(self.get_index(), index)
+        self.assertIsNone(self.document('asset', self.monitor.pk))
+        self.assertIsNotNone(self.document('asset', self.laptop.pk))
+    
+    def test_employee_rename_reaches_asset_and_handover_documents(self):
+        index = self.get_index()
+        self.jana.name = 'Jana Schulz'
+        self.jana.save()
+        self.assertIs(self.get_index(), index)
+        for kind, pk in [('employee', self.jana.pk), ('asset', self.laptop.pk), ('handover', self.handover.pk)]:
+            text = self.document(kind, pk)
+            self.assertIn('Jana Schulz', text, kind)
+            self.assertNotIn('Jana Meyer', text, kind)
+    
+    def test_saved_index_is_reused_while_the_database_matches(self):
+        built_at = retrieval_index.rebuild_index().built_at
+        self.restart_process()
+        self.assertEqual(self.get_index().built_at, built_at)
+    
+    def test_saved_index_is_not_trusted_after_the_database_changed(self):
+        retrieval_index.rebuild_index()
+        dock = Asset.objects.create(name='Zorblax Dock', asset_type='other', serial_number='ZB-77')
+        # A fresh process with a fresh cache: no generation or change log to go by
+        self.restart_process()
+        self.assertIn(f'asset:{dock.pk}', [key for key, _, _ in self.get_index().search('zorblax')])
+
+
+class SignatureStrokeTests(TestCase):
+    payload = {'v': 1, 'w': 600, 'h': 200, 's': [[10, 20, 5, 5, 5, -3], [300, 100]]}
+    
+    def test_round_trip(self):
+        width, height, strokes = parse_strokes(json.dumps(self.payload))
+        self.assertEqual((width, height), (600, 200))
+        self.assertEqual(strokes, [[(10, 20), (15, 25), (20, 22)], [(300, 100)]])
+        encoded = encode_strokes(width, height, strokes)
+        self.assertEqual(json.loads(encoded), self.payload)
+        self.assertEqual(parse_strokes(encoded), (width, height, strokes))
+    
+    def test_equal_signatures_are_stored_once(self):
+        blob = SignatureBlob.from_signature(self.payload)
+        self.assertEqual(blob.content_type, STROKES_CONTENT_TYPE)
+        self.assertEqual(SignatureBlob.from_signature(json.loads(json.dumps(self.payload))), blob)
+        self.assertEqual(SignatureBlob.objects.count(), 1)
+    
+    def test_render_svg(self):
+        svg = render_svg(encode_strokes(*parse_strokes(self.payload))).decode('ascii')
+        self.assertIn('viewBox="0 0 600 200"', svg)
+        self.assertIn('M10 20l5 5 5 -3 M300 100l0 0', svg)
+    
+    def test_render_png_size_is_bounded(self):
+        try:
+            from PIL import Image
+        except ImportError:
+            self.skipTest('Pillow is not installed')
+        png = render_png(encode_strokes(*parse_strokes(self.payload)))
+        self.assertEqual(Image.open(io.BytesIO(png)).size, (1200, 400))
+        
+        largest = encode_strokes(MAX_WIDTH, MAX_HEIGHT, [[(0, 0), (MAX_WIDTH, MAX_HEIGHT)]])
+        width, height = Image.open(io.BytesIO(render_png(largest, scale=10))).size
+        self.assertLessEqual(width * height, MAX_RENDER_PIXELS)
+        self.assertEqual(width / height, MAX_WIDTH / MAX_HEIGHT)
+    
+    def test_save_signature_rejects_an_oversized_canvas(self):
+        employee = Employee.objects.create(name='Jana Meyer', email='jana.meyer@example.com')
+        handover = Handover.objects.create(employee=employee, created_by=User.objects.create_user('it-admin'))
+        response = self.client.post(reverse('assets:save_signature'), json.dumps({
+            'handover_id': str(handover.id),
+            'signature_type': 'employee',
+            'signature_strokes': dict(self.payload, w=8000, h=8000),
+        }), content_type='application/json')
+        self.assertEqual(response.json()['status'], 'error')
+        self.assertFalse(SignatureBlob.objects.exists())
+        handover.refresh_from_db()
+        self.assertEqual(handover.employee_signature, '')
+    
+    def test_malformed_or_oversized_input_is_rejected(self):
+        def strokes(**changes):
+            return dict(self.payload, **changes)
+        
+        for payload in [
+            '{"v": 1, "w": 600,',
+            '[1, 2, 3]',
+            strokes(v=2),
+            strokes(w=MAX_WIDTH + 1),
+            strokes(h=MAX_HEIGHT + 1),
+            strokes(w=4000, h=4000),
+            strokes(w=0),
+            strokes(w=True),
+            strokes(h=200.0),
+            strokes(s=[]),
+            strokes(s=[[1, 1]] * (MAX_STROKES + 1)),
+            strokes(s=[[10, 20, 5]]),
+            strokes(s=[[10, 20, '5', 5]]),
+            strokes(s=[[10, 20, -11, 0]]),
+            strokes(s=[[590, 20, 11, 0]]),
+            strokes(s=[[0, 0] + [1, 0, -1, 0] * (MAX_POINTS // 2)]),
+        ]:
+            with self.assertRaises(StrokeFormatError, msg=payload):
+                parse_strokes(payload)
+
+
+class StubEmailBackend(BaseEmailBackend):
+    """Records sent messages; raises ``error`` instead when it is set"""
+    
+    sent = []
+    error = None
+    
+    def send_messages(self, email_messages):
+        if StubEmailBackend.error:
+            raise StubEmailBackend.error
+        StubEmailBackend.sent.extend(email_messages)
+        return len(email_messages)
+
+
+class StubBatchEmailBackend(StubEmailBackend):
+    """Batching backend like Microsoft Graph, answering every message with ``outcome``"""
+    
+    outcome = {'success': True, 'error': None}
+    
+    def send_messages_detailed(self, email_messages):
+        return [dict(StubBatchEmailBackend.outcome) for _ in email_messages]
+
+
+@override_settings(
+    OUTBOUND_EMAIL_BACKEND='assets.tests.StubEmailBackend', OUTBOUND_EMAIL_RETRY_BASE=60, OUTBOUND_EMAIL_RETRY_MAX=3600,
+)
+class EmailQueueTests(TestCase):
+    def setUp(self):
+        StubEmailBackend.sent = []
+        StubEmailBackend.error = None
+        self.user = User.objects.create_user('it-admin')
+        self.employee = Employee.objects.create(name='Jana Meyer', email='jana.meyer@example.com')
+    
+    def enqueue(self, **kwargs):
+        kwargs.setdefault('kind', 'other')
+        return enqueue_email(['jana.meyer@example.com'], 'Your handover', 'Please sign.', **kwargs)
+    
+    def make_due(self, email):
+        OutboundEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+    
+    def test_enqueue_is_idempotent(self):
+        email = self.enqueue()
+        self.assertEqual(self.enqueue(), email)
+        self.assertNotEqual(enqueue_email(['jana.meyer@example.com'], 'Reminder', 'Please sign.'), email)
+        
+        recipients = [f'person{number}@harren-group.example.com' for number in range(20)]
+        long_key = enqueue_email(recipients, 'Maintenance ' * 40, '').idempotency_key
+        self.assertLessEqual(len(long_key), OutboundEmail._meta.get_field('idempotency_key').max_length)
+    
+    def test_sent_email_is_only_deduplicated_for_a_while(self):
+        email = self.enqueue()
+        deliver_pending_emails()
+        self.assertEqual(self.enqueue(), email)
+        OutboundEmail.objects.filter(pk=email.pk).update(sent_at=timezone.now() - timedelta(hours=1))
+        self.assertNotEqual(self.enqueue(), email)
+    
+    def test_pending_key_is_unique_in_the_database(self):
+        email = self.enqueue()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            OutboundEmail.objects.create(idempotency_key=email.idempotency_key, to=email.to, subject='Copy')
+        # A concurrent enqueue that missed the first lookup gets the existing email
+        with mock.patch('assets.email_queue.find_duplicate_email', side_effect=[None, email]):
+            self.assertEqual(self.enqueue(), email)
+        self.assertEqual(OutboundEmail.objects.count(), 1)
+    
+    def test_failures_back_off_until_max_attempts(self):
+        self.assertEqual([get_retry_delay(attempts) for attempts in (1, 2, 3, 10)], [60, 120, 240, 3600])
+        email = self.enqueue()
+        OutboundEmail.objects.filter(pk=email.pk).update(max_attempts=3)
+        StubEmailBackend.error = OSError('Connection refused')
+        
+        for attempt, delay in [(1, 60), (2, 120)]:
+            before = timezone.now()
+            with self.assertLogs('assets.email_queue', 'WARNING'):
+                self.assertEqual(deliver_pending_emails(), {'sent': 0, 'retrying': 1, 'failed': 0})
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts, email.last_error), ('queued', attempt, 'Connection refused'))
+            self.assertGreaterEqual(email.next_attempt_at, before + timedelta(seconds=delay))
+            # Not due yet
+            self.assertEqual(deliver_pending_emails(), {'sent': 0, 'retrying': 0, 'failed': 0})
+            self.make_due(email)
+        
+        with self.assertLogs('assets.email_queue', 'ERROR'):
+            self.assertEqual(deliver_pending_emails(), {'sent': 0, 'retrying': 0, 'failed': 1})
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('failed', 3))
+        self.assertEqual(StubEmailBackend.sent, [])
+    
+    def test_delivery_flags_handover_and_welcome_pack(self):
+        handover = Handover.objects.create(employee=self.employee, created_by=self.user)
+        welcome_pack = WelcomePack.objects.create(employee=self.employee, generated_by=self.user)
+        self.enqueue(kind='handover_signature', handover=handover)
+        self.enqueue(kind='welcome_employee', welcome_pack=welcome_pack)
+        enqueue_email(['helpdesk@example.com'], 'New employee', '', kind='welcome_it', welcome_pack=welcome_pack)
+        
+        self.assertEqual(deliver_pending_emails(), {'sent': 3, 'retrying': 0, 'failed': 0})
+        self.assertEqual(len(StubEmailBackend.sent), 3)
+        handover.refresh_from_db()
+        welcome_pack.refresh_from_db()
+        self.assertTrue(handover.email_sent)
+        self.assertIsNotNone(handover.email_sent_at)
+        self.assertTrue(welcome_pack.email_sent_to_employee and welcome_pack.email_sent_to_it)
+        self.assertFalse(OutboundEmail.objects.exclude(status='sent').exists())
+    
+    @override_settings(OUTBOUND_EMAIL_BACKEND='assets.tests.StubBatchEmailBackend')
+    def test_unknown_outcome_is_not_retried(self):
+        handover = Handover.objects.create(employee=self.employee, created_by=self.user)
+        email = self.enqueue(kind='handover_signature', handover=handover)
+        StubBatchEmailBackend.outcome = {'success': False, 'unknown': True, 'error': 'Read timed out'}
+        self.addCleanup(setattr, StubBatchEmailBackend, 'outcome', {'success': True, 'error': None})
+        
+        with self.assertLogs('assets.email_queue', 'ERROR'):
+            self.assertEqual(deliver_pending_emails(), {'sent': 0, 'retrying': 0, 'failed': 1})
+        email.refresh_from_db()
+        self.assertEqual(email.status, 'failed')
+        self.assertIn('Outcome unknown', email.last_error)
+        handover.refresh_from_db()
+        self.assertFalse(handover.email_sent)
+
+
+class EmployeePhotoTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        photo_root = override_settings(EMPLOYEE_PHOTO_ROOT=directory.name)
+        photo_root.enable()
+        self.addCleanup(photo_root.disable)
+        self.client.force_login(User.objects.create_user('it-admin'))
+        self.employee = Employee.objects.create(
+            name='Jana Meyer', email='jana.meyer@example.com', azure_ad_id='5f2c1e7a', photo_checked_at=timezone.now(),
+        )
+    
+    def test_cached_photo_is_served(self):
+        from . import photo_store
+        data = b'\xff\xd8 not really a jpeg'
+        photo_hash = photo_store.compute_photo_hash(data)
+        path = photo_store.get_photo_path(photo_hash)
+        path.parent.mkdir(parents=True)
+        path.write_bytes(data)
+        Employee.objects.filter(pk=self.employee.pk).update(photo_hash=photo_hash)
+        response = self.client.get(reverse('assets:employee_photo', args=[self.employee.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], f'"{photo_hash}"')
+    
+    def test_missing_file_is_a_404_when_azure_ad_fails(self):
+        Employee.objects.filter(pk=self.employee.pk).update(photo_hash='ab' * 32)
+        # Lookup failed: the integration keeps the recorded hash
+        with mock.patch('assets.azure_ad_integration.AzureADIntegration.get_user_photo_metadata', return_value=False):
+            response = self.client.get(reverse('assets:employee_photo', args=[self.employee.pk]))
+        self.assertEqual(response.status_code, 404)
+
+
+class RaisingSession:
+    """Stands in for the Graph requests session; every post raises ``error``"""
+    
+    def __init__(self, error):
+        self.error = error
+        self.posts = 0
+    
+    def post(self, *args, **kwargs):
+        self.posts += 1
+        raise self.error
+
+
+@override_settings(GRAPH_EMAIL_MAX_RETRIES=2)
+class GraphBatchFailureTests(TestCase):
+    def send(self, error):
+        backend = MicrosoftGraphEmailBackend()
+        backend.session = RaisingSession(error)
+        with mock.patch.object(MicrosoftGraphEmailBackend, 'get_access_token', return_value='token'), \
+                mock.patch('assets.microsoft_graph_email.time.sleep'):
+            results = backend.send_messages_detailed([EmailMessage('Handover', 'Please sign.', to=['jana@example.com'])])
+        return backend.session.posts, results[0]
+    
+    def test_connect_failures_are_retried(self):
+        refused = requests.exceptions.ConnectionError(
+            MaxRetryError(None, '/v1.0/$batch', NewConnectionError(None, 'Connection refused')),
+        )
+        for error in [refused, requests.exceptions.ConnectTimeout('connect timed out')]:
+            posts, result = self.send(error)
+            self.assertEqual(posts, 3, error)
+            self.assertFalse(result['success'] or result['unknown'], error)
+    
+    def test_failures_after_sending_are_not_retried(self):
+        reset = requests.exceptions.ConnectionError(ProtocolError('Connection aborted.', ConnectionResetError(104)))
+        for error in [reset, requests.exceptions.ReadTimeout('read timed out')]:
+            posts, result = self.send(error)
+            self.assertEqual(posts, 1, error)
+            self.assertTrue(result['unknown'], error)
+            self.assertFalse(result['success'], error)
@@ -58,6 +58,7 @@ urlpatterns = [
     path('handovers/<uuid:handover_id>/edit/', views.edit_handover, name='edit_handover'),
     path('handovers/<uuid:handover_id>/send-email/', views.send_handover_email, name='send_handover_email'),
     path('handovers/<uuid:handover_id>/pdf/', views.handover_pdf, name='handover_pdf'),
+    path('handovers/export/pdf/', views.export_handover_pdfs, name='export_handover_pdfs'),
     path('handovers/<uuid:handover_id>/approve/', views.approve_handover, name='approve_handover'),
     
     # Public handover access (no authentication required)
@@ -78,6 +79,7 @@ urlpatterns = [
     path('users/<int:user_id>/delete/', views.delete_user, name='delete_user'),
     path('users/<int:user_id>/toggle-status/', views.toggle_user_status, name='toggle_user_status'),
     path('welcome-packs/new/', views.new_welcome_pack, name='new_welcome_pack'),
+    path('welcome-packs/cohort/', views.welcome_pack_cohort, name='welcome_pack_cohort'),
     path('welcome-packs/<uuid:pack_id>/', views.welcome_pack_detail, name='welcome_pack_detail'),
     path('welcome-packs/<uuid:pack_id>/edit/', views.edit_welcome_pack, name='edit_welcome_pack'),
     path('welcome-packs/<uuid:pack_id>/delete/', views.delete_welcome_pack, name='delete_welcome_pack'),
@@ -89,15 +91,20 @@ urlpatterns = [
     
     # API endpoints
     path('api/save-signature/', views.save_signature, name='save_signature'),
+    path('api/handovers/bulk/', views.bulk_create_handovers, name='bulk_create_handovers'),
     
     # Employee photos
     path('employees/<uuid:employee_id>/photo/', views.employee_photo, name='employee_photo'),
+    path('signatures/<str:signature_hash>/', views.signature_image, name='signature_image'),
     
     # Privacy Policy
     path('privacy-policy/', views.privacy_policy, name='privacy_policy'),
     
     # Notifications
     path('notifications/', views.notifications, name='notifications'),
+    path('notifications/feed/', views.notifications_feed, name='notifications_feed'),
+    path('notifications/unread-count/', views.notifications_unread_count, name='notifications_unread_count'),
+    path('notifications/stream/', views.notifications_stream, name='notifications_stream'),
     path('notifications/<int:notification_id>/mark-read/', views.mark_notification_read, name='mark_notification_read'),
     path('notifications/mark-all-read/', views.mark_all_notifications_read, name='mark_all_notifications_read'),
     
@@ -106,6 +113,7 @@ urlpatterns = [
     
     # AI Assistant
     path('ai-chat/', views.ai_chat, name='ai_chat'),
+    path('ai-chat/cache-metrics/', views.ai_cache_metrics, name='ai_cache_metrics'),
     path('ai/quick-insights/', views.ai_quick_insights, name='ai_quick_insights'),
     path('ai/search/', views.ai_search, name='ai_search'),
 ]
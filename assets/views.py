@@ -5,7 +5,7 @@ from django.contrib.auth import update_session_auth_hash, authenticate, login
 from django.contrib.auth.forms import PasswordChangeForm, UserCreationForm
 from django.contrib.auth.models import User
 from django.core.paginator import Paginator
-from django.http import JsonResponse
+from django.http import JsonResponse, Http404
 from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
 from django.db.models import Q, Count
@@ -15,10 +15,27 @@ from django.urls import reverse
 from django.conf import settings
 import json
 import random
+from asgiref.sync import sync_to_async
 
-from .models import Employee, Asset, Handover, WelcomePack, HandoverToken, Notification
+from .models import Employee, Asset, Handover, WelcomePack, Notification, NotificationCounter
 from .azure_ad_integration import AzureADIntegration
+from .graph_auth import get_token_fetch_metrics
+from .email_queue import enqueue_email, find_duplicate_email
+from .handover_service import create_handover, create_handovers, HandoverCreationError
+from .handover_search import search_handovers
+from .notification_feed import astream_notifications, get_feed, get_feed_state, invalidate_feed_state, stream_notifications
+from .notification_service import notify_group
+from .welcome_packs import (
+    build_employee_welcome_email, build_it_notification_email, get_it_notification_email,
+    get_upcoming_starters, create_welcome_pack_cohort,
+)
+from .public_links import check_public_access, get_public_handover_url, PublicLinkError, PublicLinkExpired
+from .access_counters import record_access
 from .ai_assistant import AssetTrackAI
+from .ai_gateway import get_gateway, stream_answer
+from .ai_cache import get_ai_cache_metrics
+from .insights import get_latest_insights
+from .inventory_snapshot import get_inventory_snapshot
 import secrets
 
 def get_user_office(request):
@@ -366,7 +383,8 @@ def azure_ad_status_api(request):
                 }
             },
             'employees': employees_data,
-            'assets': assets_data
+            'assets': assets_data,
+            'token_metrics': get_token_fetch_metrics(),
         })
     
     # Return HTML view for browser requests
@@ -396,17 +414,18 @@ def dashboard(request):
         messages.success(request, '🎉 Welcome to AssetTrack! Message system is working perfectly!')
         request.session['test_message_shown'] = True
     
-    # Calculate statistics
-    assets_in_stock = Asset.objects.filter(status='available').count()
-    pending_signatures = Handover.objects.filter(status='Pending').count()
-    pending_scans = Handover.objects.filter(status='Pending Scan').count()
-    recent_handovers_count = Handover.objects.count()
+    # Calculate statistics (cached inventory snapshot, shared with the AI assistant)
+    snapshot = get_inventory_snapshot()
+    assets_in_stock = snapshot['assets']['available']
+    pending_signatures = snapshot['handovers']['pending']
+    pending_scans = snapshot['handovers']['pending_scan']
+    recent_handovers_count = snapshot['stats']['total_handovers']
     
     # Calculate trends (simplified for demo)
     assets_trend = 12  # Mock data
     overdue_signatures = 3  # Mock data
     last_scan_time = "15 min ago"  # Mock data
-    today_handovers = Handover.objects.filter(created_at__date=timezone.now().date()).count()
+    today_handovers = snapshot['handovers']['today']
     
     # Get recent handovers with pagination
     recent_handovers_list = Handover.objects.select_related('employee').prefetch_related('assets')[:10]
@@ -1670,26 +1689,29 @@ def handovers(request):
     if employee_filter:
         handovers = handovers.filter(employee__name__icontains=employee_filter)
     
-    # Search functionality
+    # Search functionality (handover id, employee, assets and notes in one column)
     search_query = request.GET.get('search')
     if search_query:
-        handovers = handovers.filter(
-            Q(employee__name__icontains=search_query) |
-            Q(notes__icontains=search_query) |
-            Q(assets__name__icontains=search_query)
-        ).distinct()
-    
-    # Pagination
+        handovers = search_handovers(handovers, search_query)
+    
+    # Get statistics in one query
+    stats = handovers.order_by().aggregate(
+        total=Count('id'),
+        pending=Count('id', filter=Q(status='Pending')),
+        completed=Count('id', filter=Q(status='Completed')),
+        pending_scan=Count('id', filter=Q(status='Pending Scan')),
+    )
+    total_handovers = stats['total']
+    pending_handovers = stats['pending']
+    completed_handovers = stats['completed']
+    pending_scan_handovers = stats['pending_scan']
+    
+    # Pagination (the total is already known, no second COUNT)
     paginator = Paginator(handovers, 10)
+    paginator.count = total_handovers
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
-    # Get statistics
-    total_handovers = handovers.count()
-    pending_handovers = handovers.filter(status='Pending').count()
-    completed_handovers = handovers.filter(status='Completed').count()
-    pending_scan_handovers = handovers.filter(status='Pending Scan').count()
-    
     # Get unique employees for filter dropdown
     employees = Employee.objects.filter(is_active=True).order_by('name')
     
@@ -1703,6 +1725,7 @@ def handovers(request):
         'status_filter': status_filter,
         'employee_filter': employee_filter,
         'search_query': search_query,
+        'office_choices': Employee.OFFICE_CHOICES,
     }
     return render(request, 'handovers.html', context)
 
@@ -1717,28 +1740,14 @@ def new_handover(request):
         notes = request.POST.get('notes', '')
         
         try:
-            employee = Employee.objects.get(id=employee_id)
-            handover = Handover.objects.create(
-                employee=employee,
-                mode=mode,
-                notes=notes,
-                created_by=request.user
-            )
-            
-            # Add assets to handover
-            for asset_id in asset_ids:
-                asset = Asset.objects.get(id=asset_id)
-                handover.assets.add(asset)
-                # Update asset status to assigned
-                asset.status = 'assigned'
-                asset.assigned_to = employee
-                asset.save()
+            # Validates all assets at once and assigns them in one transaction
+            handover = create_handover(employee_id, asset_ids, request.user, mode=mode, notes=notes)
             
             messages.success(request, f'Handover {handover.handover_id} created successfully.')
             return redirect('assets:handover_detail', handover_id=handover.id)
             
-        except (Employee.DoesNotExist, Asset.DoesNotExist):
-            messages.error(request, 'Invalid employee or asset selected.')
+        except HandoverCreationError as e:
+            messages.error(request, f'Invalid employee or asset selected: {str(e)}')
         except Exception as e:
             messages.error(request, f'Error creating handover: {str(e)}')
     
@@ -1762,6 +1771,55 @@ def new_handover(request):
     }
     return render(request, 'new_handover.html', context)
 
+@login_required
+def bulk_create_handovers(request):
+    """
+    API endpoint to create handovers for several employees in one call.
+    Expects JSON: {"handovers": [{"employee_id": ..., "asset_ids": [...], "mode": ..., "notes": ...}],
+    "send_email": false}. Either all handovers are created or none.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid request method'}, status=405)
+    
+    try:
+        data = json.loads(request.body or '{}')
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON'}, status=400)
+    
+    entries = data.get('handovers')
+    if not isinstance(entries, list) or not entries:
+        return JsonResponse({'status': 'error', 'message': 'handovers must be a non-empty list'}, status=400)
+    if not all(isinstance(entry, dict) for entry in entries):
+        return JsonResponse({'status': 'error', 'message': 'Each handover must be an object'}, status=400)
+    
+    try:
+        handovers = create_handovers(entries, request.user)
+    except HandoverCreationError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    
+    emails_queued = 0
+    if data.get('send_email'):
+        for handover in handovers:
+            try:
+                send_handover_signature_email(handover)
+                emails_queued += 1
+            except Exception as e:
+                print(f"Error queueing handover email for {handover.handover_id}: {str(e)}")
+    
+    return JsonResponse({
+        'status': 'success',
+        'handovers': [
+            {
+                'id': str(handover.id),
+                'handover_id': handover.handover_id,
+                'employee_id': str(handover.employee_id),
+                'url': reverse('assets:handover_detail', args=[handover.id]),
+            }
+            for handover in handovers
+        ],
+        'emails_queued': emails_queued,
+    })
+
 @login_required
 def handover_detail(request, handover_id):
     """Handover detail view with signature functionality"""
@@ -1773,8 +1831,12 @@ def handover_detail(request, handover_id):
         it_signature = request.POST.get('it_signature')
         employee_acknowledgment = request.POST.get('employee_acknowledgment') == 'on'
         
-        handover.employee_signature = employee_signature
-        handover.it_signature = it_signature
+        try:
+            handover.employee_signature = employee_signature
+            handover.it_signature = it_signature
+        except ValueError as e:
+            messages.error(request, f'Invalid signature: {str(e)}')
+            return redirect('assets:handover_detail', handover_id=handover.id)
         handover.employee_acknowledgment = employee_acknowledgment
         
         # Update status based on completion
@@ -1792,6 +1854,7 @@ def handover_detail(request, handover_id):
     
     context = {
         'handover': handover,
+        'signature_email': handover.outbound_emails.filter(kind='handover_signature').first(),
     }
     return render(request, 'handover_detail.html', context)
 
@@ -1904,6 +1967,45 @@ def new_welcome_pack(request):
     }
     return render(request, 'new_welcome_pack.html', context)
 
+@login_required
+def welcome_pack_cohort(request):
+    """Create welcome packs for all upcoming starters from the Azure AD directory at once"""
+    try:
+        days_ahead = max(1, min(int(request.GET.get('days', 14)), 90))
+    except ValueError:
+        days_ahead = 14
+    starters = get_upcoming_starters(days_ahead)
+    
+    if request.method == 'POST':
+        selected_ids = request.POST.getlist('employees')
+        employees = starters.filter(id__in=selected_ids)
+        pack_defaults = {
+            'it_contact_person': request.POST.get('it_contact_person', ''),
+            'it_helpdesk_email': request.POST.get('it_helpdesk_email', ''),
+            'it_phone_number': request.POST.get('it_phone_number', ''),
+            'department_info': request.POST.get('department_info', ''),
+            'notes': request.POST.get('notes', ''),
+        }
+        try:
+            packs = create_welcome_pack_cohort(
+                employees, request.user, pack_defaults,
+                send_emails=request.POST.get('send_emails') == 'on',
+            )
+            if packs:
+                messages.success(request, f'{len(packs)} welcome pack(s) created successfully!')
+            else:
+                messages.warning(request, 'No welcome packs were created. Select at least one employee without a pack.')
+            return redirect('assets:welcome_packs')
+        except Exception as e:
+            messages.error(request, f'Error creating welcome packs: {str(e)}')
+    
+    context = {
+        'starters': starters,
+        'days_ahead': days_ahead,
+        'day_options': sorted({7, 14, 30, 60, days_ahead}),
+    }
+    return render(request, 'welcome_pack_cohort.html', context)
+
 @login_required
 def add_welcome_pack(request):
     """Add new welcome pack view"""
@@ -1998,7 +2100,8 @@ def save_signature(request):
             data = json.loads(request.body)
             handover_id = data.get('handover_id')
             signature_type = data.get('signature_type')  # 'employee', 'it', or 'acknowledgment'
-            signature_data = data.get('signature_data')
+            # Vector strokes from the signature pads; PNG data URLs are still accepted
+            signature_data = data.get('signature_strokes') or data.get('signature_data')
             send_email = data.get('send_email', False)
             token = data.get('token')  # For public access
             
@@ -2007,10 +2110,10 @@ def save_signature(request):
             # If token is provided, validate it for public access
             if token:
                 try:
-                    handover_token = HandoverToken.objects.get(handover=handover, token=token)
-                    if not handover_token.is_valid():
-                        return JsonResponse({'status': 'error', 'message': 'Invalid or expired token'})
-                except HandoverToken.DoesNotExist:
+                    check_public_access(handover, token)
+                except PublicLinkExpired:
+                    return JsonResponse({'status': 'error', 'message': 'Invalid or expired token'})
+                except PublicLinkError:
                     return JsonResponse({'status': 'error', 'message': 'Invalid token'})
             
             if signature_type == 'employee':
@@ -2031,14 +2134,18 @@ def save_signature(request):
             
             handover.save()
             
-            # Send email if requested
+            # Queue email if requested
             if send_email and signature_type == 'employee':
                 try:
-                    send_handover_signature_email(handover)
-                    return JsonResponse({'status': 'success', 'email_sent': True})
+                    outbound_email = send_handover_signature_email(handover)
+                    return JsonResponse({
+                        'status': 'success',
+                        'email_queued': True,
+                        'email_status': outbound_email.status,
+                    })
                 except Exception as email_error:
                     # Still return success for handover preparation, but note email error
-                    return JsonResponse({'status': 'success', 'email_sent': False, 'email_error': str(email_error)})
+                    return JsonResponse({'status': 'success', 'email_queued': False, 'email_error': str(email_error)})
             
             return JsonResponse({'status': 'success'})
         except Exception as e:
@@ -2093,25 +2200,22 @@ def create_welcome_pack_token(welcome_pack):
         return None
 
 def send_welcome_pack_emails(welcome_pack):
-    """Send welcome pack emails to employee and IT team using Microsoft Graph"""
+    """Queue welcome pack emails to employee and IT team (delivered by the deliver_emails worker)"""
     try:
-        # No need for email settings check - using Microsoft Graph directly
-        print("Sending welcome pack emails using Microsoft Graph...")
-        
-        # Send employee welcome email
+        # Queue employee welcome email
         employee_success = send_employee_welcome_email(welcome_pack)
         
-        # Send IT team notification email
+        # Queue IT team notification email
         it_success = send_it_team_notification_email(welcome_pack)
         
         return employee_success and it_success
         
     except Exception as e:
-        print(f"Error sending welcome pack emails: {str(e)}")
+        print(f"Error queueing welcome pack emails: {str(e)}")
         return False
 
 def send_employee_welcome_email(welcome_pack):
-    """Send welcome email to employee"""
+    """Queue welcome email to employee"""
     try:
         # Use employee's email from welcome pack or employee record
         employee_email = welcome_pack.employee_email or welcome_pack.employee.email
@@ -2119,6 +2223,11 @@ def send_employee_welcome_email(welcome_pack):
             print("No employee email found")
             return False
         
+        # Don't queue the same email twice (double submit)
+        idempotency_key = f"welcome_employee:{welcome_pack.id}"
+        if find_duplicate_email(idempotency_key):
+            return True
+        
         # Get the public welcome pack URL - no password required
         welcome_pack_url = get_public_welcome_pack_url(welcome_pack)
         if not welcome_pack_url:
@@ -2126,222 +2235,54 @@ def send_employee_welcome_email(welcome_pack):
             domain = getattr(settings, 'EMAIL_DOMAIN', settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else '172.27.2.43')
             welcome_pack_url = f"https://{domain}{reverse('assets:welcome_pack_detail', args=[welcome_pack.id])}"
         
-        # Email subject and content
-        subject = f"Welcome to Harren Group - {welcome_pack.employee.name}"
-        
-        # HTML email content
-        html_content = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                <h2 style="color: #2c3e50; border-bottom: 2px solid #3498db; padding-bottom: 10px;">
-                    Welcome to Harren Group - {welcome_pack.employee.name}
-                </h2>
-                
-                <p>Dear {welcome_pack.employee.name},</p>
-                
-                <p>Welcome to Harren Group! We're excited to have you join our team. Your welcome pack has been prepared with all the necessary information for your first day.</p>
-                
-                <div style="background-color: #e8f4f8; padding: 15px; border-radius: 5px; margin: 20px 0;">
-                    <h3 style="color: #2c3e50; margin-top: 0;">🔑 Your Login Information:</h3>
-                    <p><strong>Your login credentials are included in your welcome pack.</strong></p>
-                    <p style="color: #666; font-size: 14px; margin-bottom: 0;">
-                        <strong>🔒 Security:</strong> Click the link below to view your secure welcome pack with login details.
-                    </p>
-                </div>
-                
-                <div style="text-align: center; margin: 30px 0;">
-                    <a href="{welcome_pack_url}" 
-                       style="background-color: #3498db; color: white; padding: 12px 30px; text-decoration: none; border-radius: 5px; display: inline-block; font-weight: bold;">
-                        View Your Welcome Pack
-                    </a>
-                </div>
-                
-                <p style="color: #666; font-size: 14px;">
-                    If the button doesn't work, you can copy and paste this link into your browser:<br>
-                    <a href="{welcome_pack_url}" style="color: #3498db;">{welcome_pack_url}</a>
-                </p>
-                
-                <div style="background-color: #f8f9fa; padding: 15px; border-left: 4px solid #3498db; margin: 20px 0;">
-                    <h3 style="margin-top: 0; color: #2c3e50;">📋 Next Steps:</h3>
-                    <ol style="margin: 10px 0; padding-left: 20px;">
-                        <li>Log in to your computer using the credentials above</li>
-                        <li>Change your password immediately</li>
-                        <li>Check your assigned assets and equipment</li>
-                        <li>Contact IT if you need any assistance</li>
-                    </ol>
-                </div>
-                
-                <div style="background-color: #fff3cd; padding: 15px; border-radius: 5px; margin: 20px 0;">
-                    <h3 style="margin-top: 0; color: #856404;">📞 IT Support Contact:</h3>
-                    <p><strong>IT Contact:</strong> {welcome_pack.it_contact_person}</p>
-                    <p><strong>Email:</strong> {welcome_pack.it_helpdesk_email}</p>
-                    <p><strong>Phone:</strong> {welcome_pack.it_phone_number}</p>
-                </div>
-                
-                <hr style="border: none; border-top: 1px solid #eee; margin: 30px 0;">
-                <p style="color: #666; font-size: 12px;">
-                    This is an automated message from Harren Group AssetTrack. Please do not reply to this email.
-                </p>
-            </div>
-        </body>
-        </html>
-        """
-        
-        # Plain text version
-        text_content = f"""
-        Welcome to Harren Group - {welcome_pack.employee.name}
-        
-        Dear {welcome_pack.employee.name},
-        
-        Welcome to Harren Group! We're excited to have you join our team. Your welcome pack has been prepared with all the necessary information for your first day.
-        
-        Your Login Information:
-        - Your login credentials are included in your welcome pack
-        - Click the link below to view your secure welcome pack with login details
-        
-        To view your complete welcome pack, please visit:
-        {welcome_pack_url}
-        
-        Next Steps:
-        1. Log in to your computer using the credentials above
-        2. Change your password immediately
-        3. Check your assigned assets and equipment
-        4. Contact IT if you need any assistance
-        
-        IT Support Contact:
-        - IT Contact: {welcome_pack.it_contact_person}
-        - Email: {welcome_pack.it_helpdesk_email}
-        - Phone: {welcome_pack.it_phone_number}
-        
-        This is an automated message from Harren Group AssetTrack.
-        """
+        subject, text_content, html_content = build_employee_welcome_email(welcome_pack, welcome_pack_url)
         
-        # Send email using Microsoft Graph backend
-        from assets.microsoft_graph_email import MicrosoftGraphEmailBackend
-        backend = MicrosoftGraphEmailBackend()
-        msg = EmailMultiAlternatives(subject, text_content, settings.DEFAULT_FROM_EMAIL, [employee_email])
-        msg.attach_alternative(html_content, "text/html")
-        backend.send_messages([msg])
+        enqueue_email(
+            [employee_email], subject, text_content, html_content,
+            kind='welcome_employee', idempotency_key=idempotency_key, welcome_pack=welcome_pack,
+        )
         
-        print(f"Employee welcome email sent to: {employee_email}")
+        print(f"Employee welcome email queued for: {employee_email}")
         return True
         
     except Exception as e:
-        print(f"Error sending employee welcome email: {str(e)}")
+        print(f"Error queueing employee welcome email: {str(e)}")
         return False
 
 def send_it_team_notification_email(welcome_pack):
-    """Send notification email to IT team"""
+    """Queue notification email to IT team"""
     try:
-        # Use it-office-assettrack@harren-group.com for IT team notification
-        it_email = "it-office-assettrack@harren-group.com"
-        
-        # Email subject and content
-        subject = f"New Employee Setup Required - {welcome_pack.employee.name}"
-        
-        # HTML email content
-        html_content = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                <h2 style="color: #2c3e50; border-bottom: 2px solid #3498db; padding-bottom: 10px;">
-                    New Employee Setup Required - {welcome_pack.employee.name}
-                </h2>
-                
-                <p>Dear IT Team,</p>
-                
-                <p>A new employee has been added to the system and requires IT setup. Please review the details below and complete the necessary setup tasks.</p>
-                
-                <div style="background-color: #e8f4f8; padding: 15px; border-radius: 5px; margin: 20px 0;">
-                    <h3 style="color: #2c3e50; margin-top: 0;">👤 Employee Information:</h3>
-                    <p><strong>Name:</strong> {welcome_pack.employee.name}</p>
-                    <p><strong>Email:</strong> {welcome_pack.employee.email}</p>
-                    <p><strong>Start Date:</strong> {welcome_pack.start_date or 'Not specified'}</p>
-                    <p><strong>Office Location:</strong> {welcome_pack.office_location or 'Not specified'}</p>
-                </div>
-                
-                <div style="background-color: #f8f9fa; padding: 15px; border-left: 4px solid #3498db; margin: 20px 0;">
-                    <h3 style="margin-top: 0; color: #2c3e50;">🔧 Setup Tasks Required:</h3>
-                    <ol style="margin: 10px 0; padding-left: 20px;">
-                        <li>Verify computer access and login credentials</li>
-                        <li>Set up email account and Teams access</li>
-                        <li>Configure assigned assets and equipment</li>
-                        <li>Provide initial training and support</li>
-                        <li>Verify all systems are working correctly</li>
-                    </ol>
-                </div>
-                
-                <div style="background-color: #fff3cd; padding: 15px; border-radius: 5px; margin: 20px 0;">
-                    <h3 style="margin-top: 0; color: #856404;">📋 Employee Details:</h3>
-                    <p><strong>Department Info:</strong> {welcome_pack.department_info or 'Not specified'}</p>
-                    <p><strong>Teams Username:</strong> {welcome_pack.teams_username or 'Not specified'}</p>
-                    <p><strong>Teams Email:</strong> {welcome_pack.teams_email or 'Not specified'}</p>
-                    <p><strong>Notes:</strong> {welcome_pack.notes or 'No additional notes'}</p>
-                </div>
-                
-                <hr style="border: none; border-top: 1px solid #eee; margin: 30px 0;">
-                <p style="color: #666; font-size: 12px;">
-                    This is an automated message from Harren Group AssetTrack. Please do not reply to this email.
-                </p>
-            </div>
-        </body>
-        </html>
-        """
-        
-        # Plain text version
-        text_content = f"""
-        New Employee Setup Required - {welcome_pack.employee.name}
-        
-        Dear IT Team,
-        
-        A new employee has been added to the system and requires IT setup. Please review the details below and complete the necessary setup tasks.
-        
-        Employee Information:
-        - Name: {welcome_pack.employee.name}
-        - Email: {welcome_pack.employee.email}
-        - Start Date: {welcome_pack.start_date or 'Not specified'}
-        - Office Location: {welcome_pack.office_location or 'Not specified'}
+        it_email = get_it_notification_email()
         
-        Setup Tasks Required:
-        1. Verify computer access and login credentials
-        2. Set up email account and Teams access
-        3. Configure assigned assets and equipment
-        4. Provide initial training and support
-        5. Verify all systems are working correctly
+        idempotency_key = f"welcome_it:{welcome_pack.id}"
+        if find_duplicate_email(idempotency_key):
+            return True
         
-        Employee Details:
-        - Department Info: {welcome_pack.department_info or 'Not specified'}
-        - Teams Username: {welcome_pack.teams_username or 'Not specified'}
-        - Teams Email: {welcome_pack.teams_email or 'Not specified'}
-        - Notes: {welcome_pack.notes or 'No additional notes'}
+        subject, text_content, html_content = build_it_notification_email(welcome_pack)
         
-        This is an automated message from Harren Group AssetTrack.
-        """
-        
-        # Send email using Microsoft Graph backend
-        from assets.microsoft_graph_email import MicrosoftGraphEmailBackend
-        backend = MicrosoftGraphEmailBackend()
-        msg = EmailMultiAlternatives(subject, text_content, settings.DEFAULT_FROM_EMAIL, [it_email])
-        msg.attach_alternative(html_content, "text/html")
-        backend.send_messages([msg])
+        enqueue_email(
+            [it_email], subject, text_content, html_content,
+            kind='welcome_it', idempotency_key=idempotency_key, welcome_pack=welcome_pack,
+        )
         
-        print(f"IT team notification email sent to: {it_email}")
+        print(f"IT team notification email queued for: {it_email}")
         return True
         
     except Exception as e:
-        print(f"Error sending IT team notification email: {str(e)}")
+        print(f"Error queueing IT team notification email: {str(e)}")
         return False
 
 def send_handover_signature_email(handover):
-    """Send email to employee with handover signature link"""
+    """Queue email to employee with handover signature link"""
     try:
+        # A pending email already carries a valid link, don't queue a second one
+        idempotency_key = f"handover_signature:{handover.id}"
+        existing = find_duplicate_email(idempotency_key)
+        if existing:
+            return existing
+        
         # Get the public handover URL - no password required
         handover_url = get_public_handover_url(handover)
-        if not handover_url:
-            # Fallback to regular URL if public URL creation fails
-            domain = getattr(settings, 'EMAIL_DOMAIN', settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else '172.27.2.43')
-            handover_url = f"https://{domain}{reverse('assets:handover_detail', args=[handover.id])}"
         
         # Email subject and content
         subject = f"Asset Handover Signature Required - {handover.handover_id} - Harren Group"
@@ -2429,20 +2370,14 @@ def send_handover_signature_email(handover):
         This is an automated message from Harren Group AssetTrack.
         """
         
-        # Send email
-        msg = EmailMultiAlternatives(subject, text_content, settings.DEFAULT_FROM_EMAIL, [handover.employee.email])
-        msg.attach_alternative(html_content, "text/html")
-        msg.send()
-        
-        # Update handover email tracking
-        handover.email_sent = True
-        handover.email_sent_at = timezone.now()
-        handover.save()
-        
-        return True
+        # Queue email; handover.email_sent is set once the worker delivers it
+        return enqueue_email(
+            [handover.employee.email], subject, text_content, html_content,
+            kind='handover_signature', idempotency_key=idempotency_key, handover=handover,
+        )
         
     except Exception as e:
-        print(f"Error sending email: {str(e)}")
+        print(f"Error queueing email: {str(e)}")
         raise e
 
 # Placeholder views for other pages
@@ -2500,19 +2435,13 @@ def send_welcome_pack_email(request, pack_id):
     
     if request.method == 'POST':
         try:
-            # Send actual emails using Microsoft Graph (like handover signatures)
+            # Queue emails; the delivery flags are set by the deliver_emails worker
             success = send_welcome_pack_emails(welcome_pack)
             
             if success:
-                # Mark emails as sent
-                welcome_pack.email_sent_to_employee = True
-                welcome_pack.email_sent_to_it = True
-                welcome_pack.email_sent_at = timezone.now()
-                welcome_pack.save()
-                
-                messages.success(request, f'Welcome pack emails sent successfully to {welcome_pack.employee.name} and IT team!')
+                messages.success(request, f'Welcome pack emails queued for {welcome_pack.employee.name} and IT team. They will be delivered shortly.')
             else:
-                messages.error(request, 'Error sending welcome pack emails. Please try again.')
+                messages.error(request, 'Error queueing welcome pack emails. Please try again.')
             
             return redirect('assets:welcome_packs')
             
@@ -2565,6 +2494,8 @@ def welcome_pack_detail(request, pack_id):
     
     context = {
         'welcome_pack': welcome_pack,
+        'employee_email_status': welcome_pack.outbound_emails.filter(kind='welcome_employee').first(),
+        'it_email_status': welcome_pack.outbound_emails.filter(kind='welcome_it').first(),
     }
     return render(request, 'welcome_pack_detail.html', context)
 
@@ -2615,16 +2546,62 @@ def send_handover_email(request, handover_id):
 
 @login_required
 def handover_pdf(request, handover_id):
-    """Generate PDF for handover"""
-    handover = get_object_or_404(Handover, id=handover_id)
-    
-    # Here you would implement PDF generation
-    # For now, we'll redirect to the detail page with a print-friendly version
-    context = {
-        'handover': handover,
-        'print_mode': True
-    }
-    return render(request, 'handover_pdf.html', context)
+    """Serve the handover as a PDF (cached on disk until the handover changes)"""
+    from django.http import FileResponse
+    from .handover_documents import get_handover_pdf_path, get_pdf_filename
+
+    handover = get_object_or_404(
+        Handover.objects.select_related('employee', 'created_by', 'employee_signature_blob', 'it_signature_blob'),
+        id=handover_id,
+    )
+
+    # The browser print page is still available with ?view=print
+    if request.GET.get('view') == 'print':
+        context = {
+            'handover': handover,
+            'print_mode': True
+        }
+        return render(request, 'handover_pdf.html', context)
+
+    path = get_handover_pdf_path(handover)
+    return FileResponse(
+        open(path, 'rb'),
+        content_type='application/pdf',
+        as_attachment=request.GET.get('download') == '1',
+        filename=get_pdf_filename(handover),
+    )
+
+@login_required
+def export_handover_pdfs(request):
+    """Stream a ZIP of handover PDFs filtered by date range and office"""
+    from django.http import StreamingHttpResponse
+    from .handover_documents import get_export_queryset, stream_handover_pdf_zip
+
+    start_date = request.GET.get('start_date') or None
+    end_date = request.GET.get('end_date') or None
+    office = request.GET.get('office') or None
+    try:
+        start_date = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+        end_date = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+    except ValueError:
+        messages.error(request, 'Invalid date range for the PDF export.')
+        return redirect('assets:handovers')
+    if office and office not in dict(Employee.OFFICE_CHOICES):
+        messages.error(request, 'Unknown office for the PDF export.')
+        return redirect('assets:handovers')
+
+    handovers = get_export_queryset(start_date, end_date, office)
+    if not handovers.exists():
+        messages.warning(request, 'No handovers match the selected export filters.')
+        return redirect('assets:handovers')
+
+    parts = ['handovers', office, start_date and start_date.isoformat(), end_date and end_date.isoformat()]
+    filename = '-'.join(part for part in parts if part) + '.zip'
+    response = StreamingHttpResponse(stream_handover_pdf_zip(handovers), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    # Let nginx pass chunks straight through instead of buffering the whole archive
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 @csrf_exempt
 def approve_handover(request, handover_id):
@@ -3224,32 +3201,91 @@ def user_profile(request):
 
 @login_required
 def employee_photo(request, employee_id):
-    """Proxy view to serve employee photos from Azure AD"""
-    from django.http import HttpResponse
+    """
+    Serve an employee's photo from the local photo store.
+    Azure AD is only contacted when the photo is not cached yet or the cached
+    copy is older than EMPLOYEE_PHOTO_MAX_AGE; responses carry a strong ETag
+    so browsers revalidate with If-None-Match and get 304 Not Modified.
+    """
+    from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+    from django.utils.cache import patch_cache_control
     from .azure_ad_integration import AzureADIntegration
+    from . import photo_store
     
     try:
         employee = get_object_or_404(Employee, id=employee_id)
         
-        if not employee.azure_ad_id:
+        if not employee.azure_ad_id and not employee.photo_hash:
             # Return default avatar if no Azure AD ID
             return HttpResponse(status=404)
         
-        # Get photo data from Azure AD
-        azure_ad = AzureADIntegration()
-        photo_data = azure_ad.get_user_photo_data(employee.azure_ad_id)
+        max_age = getattr(settings, 'EMPLOYEE_PHOTO_MAX_AGE', 7 * 24 * 3600)
+        is_stale = (
+            employee.azure_ad_id
+            and (not employee.photo_checked_at
+                 or timezone.now() - employee.photo_checked_at > timedelta(seconds=max_age))
+        )
+        has_photo = photo_store.has_photo(employee.photo_hash)
+        if not has_photo or is_stale:
+            # Cache miss or stale entry - refresh from Azure AD
+            azure_ad = AzureADIntegration()
+            azure_ad.cache_employee_photo(employee)
+            has_photo = photo_store.has_photo(employee.photo_hash)
         
-        if photo_data:
-            response = HttpResponse(photo_data, content_type='image/jpeg')
-            response['Cache-Control'] = 'public, max-age=3600'  # Cache for 1 hour
-            return response
-        else:
+        # No photo, or the file is gone and Azure AD couldn't provide it again
+        if not has_photo:
             return HttpResponse(status=404)
+        
+        etag = f'"{employee.photo_hash}"'
+        if_none_match = request.headers.get('If-None-Match', '')
+        if etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*':
+            response = HttpResponseNotModified()
+        else:
+            response = FileResponse(open(photo_store.get_photo_path(employee.photo_hash), 'rb'), content_type='image/jpeg')
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, max_age=3600)
+        return response
             
+    except Http404:
+        raise
     except Exception as e:
         print(f"Error serving photo for employee {employee_id}: {e}")
         return HttpResponse(status=500)
 
+@login_required
+def signature_image(request, signature_hash):
+    """
+    Serve a stored signature image. The URL contains the SHA-256 of the
+    content, so the response never changes and can be cached indefinitely;
+    the hash also serves as the ETag for conditional requests.
+    """
+    from django.http import HttpResponse, HttpResponseNotModified
+    from django.utils.cache import patch_cache_control
+    from .models import SignatureBlob
+    from .signature_strokes import render_cached
+    
+    # Vector signatures are rendered as SVG, or PNG with ?format=png
+    fmt = 'png' if request.GET.get('format') == 'png' else 'svg'
+    etag = f'"{signature_hash}-{fmt}"'
+    if_none_match = request.headers.get('If-None-Match', '')
+    if etag in [tag.strip() for tag in if_none_match.split(',')]:
+        response = HttpResponseNotModified()
+    else:
+        blob = get_object_or_404(SignatureBlob, sha256=signature_hash)
+        if blob.is_strokes:
+            data, content_type = render_cached(blob.sha256, blob.data, fmt)
+            if data is None:
+                data, content_type = render_cached(blob.sha256, blob.data, 'svg')
+        else:
+            data, content_type = bytes(blob.data), blob.content_type
+        response = HttpResponse(data, content_type=content_type)
+        if content_type == 'image/svg+xml':
+            # Never let an SVG run scripts in our origin
+            response['Content-Security-Policy'] = "default-src 'none'; style-src 'unsafe-inline'"
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, max_age=365 * 24 * 3600, immutable=True)
+    return response
+
 def privacy_policy(request):
     """Privacy Policy page view"""
     return render(request, 'privacy_policy.html')
@@ -3383,32 +3419,26 @@ def department_assets(request, department):
 def public_handover_detail(request, handover_id, token):
     """Public handover detail view - no authentication required"""
     try:
-        # Get handover
-        handover = get_object_or_404(Handover, id=handover_id)
+        handover = get_object_or_404(Handover.objects.select_related('employee'), id=handover_id)
         
-        # Try to get the token
+        # Signed links are checked without a token lookup; older random tokens still work
         try:
-            handover_token = HandoverToken.objects.get(handover=handover, token=token)
-        except HandoverToken.DoesNotExist:
-            # Token doesn't exist, create one
-            handover_token = create_handover_token(handover)
-            if not handover_token or handover_token.token != token:
-                return render(request, 'public_handover_error.html', {
-                    'error': 'Invalid handover link or token'
-                })
-        
-        # Check if token is valid
-        if not handover_token.is_valid():
+            check_public_access(handover, token)
+        except PublicLinkExpired as e:
             return render(request, 'public_handover_expired.html', {
                 'handover': handover,
-                'error': 'Token has expired or is no longer valid'
+                'error': str(e)
+            })
+        except PublicLinkError:
+            return render(request, 'public_handover_error.html', {
+                'error': 'Invalid handover link or token'
             })
         
         # Record access
-        handover_token.record_access()
+        record_access('handover', handover.id)
         
         # Get handover assets
-        handover_assets = handover.handoverasset_set.all()
+        handover_assets = handover.handoverasset_set.select_related('asset')
         
         context = {
             'handover': handover,
@@ -3425,53 +3455,6 @@ def public_handover_detail(request, handover_id, token):
             'error': 'Invalid handover link or token'
         })
 
-def create_handover_token(handover):
-    """Create a public access token for handover"""
-    try:
-        # Generate unique token
-        token = secrets.token_urlsafe(32)
-        
-        # Create or update token
-        handover_token, created = HandoverToken.objects.get_or_create(
-            handover=handover,
-            defaults={
-                'token': token,
-                'is_active': True,
-                'expires_at': timezone.now() + timedelta(days=30)  # 30 days expiration
-            }
-        )
-        
-        if not created:
-            # Update existing token
-            handover_token.token = token
-            handover_token.is_active = True
-            handover_token.expires_at = timezone.now() + timedelta(days=30)
-            handover_token.save()
-        
-        return handover_token
-        
-    except Exception as e:
-        print(f"Error creating handover token: {e}")
-        return None
-
-def get_public_handover_url(handover):
-    """Get public handover URL with token"""
-    try:
-        # Get or create token
-        handover_token = create_handover_token(handover)
-        if handover_token:
-            # Build public URL
-            domain = getattr(settings, 'EMAIL_DOMAIN', settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else '172.27.2.43')
-            base_url = f"https://{domain}"
-            
-            return f"{base_url}/handover/public/{handover.id}/{handover_token.token}/"
-        
-        return None
-        
-    except Exception as e:
-        print(f"Error getting public handover URL: {e}")
-        return None
-
 # User Management Views
 @login_required
 @user_passes_test(lambda u: u.is_superuser)
@@ -3660,7 +3643,7 @@ def toggle_user_status(request, user_id):
 def notifications(request):
     """View user notifications"""
     notifications = Notification.objects.filter(user=request.user).order_by('-created_at')[:20]
-    unread_count = Notification.objects.filter(user=request.user, is_read=False).count()
+    unread_count = get_feed_state(request.user.id)['unread']
     
     context = {
         'notifications': notifications,
@@ -3670,6 +3653,59 @@ def notifications(request):
     return render(request, 'notifications.html', context)
 
 
+@login_required
+def notifications_feed(request):
+    """JSON feed for the notification dropdown (?before=<id> pages back, ?after=<id> only newer)"""
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 20)), 50))
+        before_id = int(request.GET['before']) if request.GET.get('before') else None
+        after_id = int(request.GET['after']) if request.GET.get('after') else None
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid parameters'}, status=400)
+    
+    state = get_feed_state(request.user.id)
+    return JsonResponse({
+        'success': True,
+        'notifications': get_feed(request.user.id, limit, before_id, after_id),
+        'unread_count': state['unread'],
+        'latest_id': state['latest_id'],
+    })
+
+
+@login_required
+def notifications_unread_count(request):
+    """Unread notification count from the cached feed state"""
+    state = get_feed_state(request.user.id)
+    return JsonResponse({'unread_count': state['unread'], 'latest_id': state['latest_id']})
+
+
+async def notifications_stream(request):
+    """Server-Sent Events stream of new notifications and unread-count changes"""
+    from django.core.handlers.asgi import ASGIRequest
+    from django.http import StreamingHttpResponse
+    
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    
+    last_id = request.headers.get('Last-Event-ID') or request.GET.get('last_id')
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        last_id = None
+    
+    # Served by the ASGI process (see notification_feed.py); under WSGI each
+    # stream holds a worker thread
+    if isinstance(request, ASGIRequest):
+        events = astream_notifications(user.id, last_id)
+    else:
+        events = stream_notifications(user.id, last_id)
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @login_required
 def mark_notification_read(request, notification_id):
     """Mark a notification as read"""
@@ -3687,10 +3723,15 @@ def mark_notification_read(request, notification_id):
 def mark_all_notifications_read(request):
     """Mark all notifications as read"""
     try:
-        Notification.objects.filter(user=request.user, is_read=False).update(
+        updated = Notification.objects.filter(user=request.user, is_read=False).update(
             is_read=True, 
             read_at=timezone.now()
         )
+        # update() sends no signals; subtract what was actually marked, so a
+        # notification created meanwhile stays counted
+        if updated:
+            NotificationCounter.adjust([request.user.id], -updated)
+            invalidate_feed_state([request.user.id])
         return JsonResponse({'success': True})
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
@@ -3734,6 +3775,15 @@ def contact_support(request):
                     priority=priority
                 )
                 
+                # Let the administrators know as well
+                notify_group(
+                    'superusers',
+                    f"Support Request from {request.user.get_full_name() or request.user.username}: {subject}",
+                    f"Category: {category}\nPriority: {priority}\n\nMessage: {message}",
+                    exclude_user_ids=[request.user.id],
+                    priority=priority,
+                )
+                
                 # Send email to support team
                 from django.core.mail import send_mail
                 from django.conf import settings
@@ -3782,25 +3832,81 @@ This message was sent from the AssetTrack application.
 # AI Assistant Views
 from django.views.decorators.csrf import csrf_exempt
 
+def _parse_ai_chat_request(request):
+    """(query, current_page, no_cache) from a JSON or form-encoded chat POST"""
+    query = ''
+    current_page = ''
+    no_cache = False
+    if request.content_type and 'application/json' in request.content_type:
+        try:
+            import json as _json
+            body = _json.loads(request.body or '{}')
+            query = (body.get('message') or body.get('query') or '').strip()
+            current_page = body.get('current_page', '')
+            no_cache = bool(body.get('no_cache'))
+        except Exception:
+            query = ''
+    else:
+        query = (request.POST.get('message') or request.POST.get('query') or '').strip()
+        current_page = request.POST.get('current_page', '')
+        no_cache = request.POST.get('no_cache') in ('1', 'true', 'on')
+    return query, current_page, no_cache
+
 @csrf_exempt
-def ai_chat(request):
+async def ai_chat(request):
     """AI Chat interface"""
+    from django.core.handlers.asgi import ASGIRequest
+    
+    if not isinstance(request, ASGIRequest):
+        # Under WSGI there is no event loop to queue in; answer synchronously
+        return await sync_to_async(ai_chat_sync)(request)
+    
+    # Served by the AI gateway's ASGI process (see ai_gateway.py)
+    if request.method != 'POST':
+        get_gateway()  # starts warming up the model
+        return await sync_to_async(render)(request, 'ai_chat.html')
+    
+    try:
+        query, current_page, no_cache = await sync_to_async(_parse_ai_chat_request)(request)
+        if not query:
+            return JsonResponse({'error': 'Please enter a question'})
+        
+        user = await request.auser()
+        user_key = f"user:{user.pk}" if user.is_authenticated else f"ip:{request.META.get('HTTP_X_REAL_IP') or request.META.get('REMOTE_ADDR')}"
+        events = stream_answer(AssetTrackAI(), query, user_key, use_cache=not no_cache)
+        
+        if 'text/event-stream' in request.headers.get('Accept', ''):
+            return ai_chat_stream_response(events)
+        
+        # Plain JSON: collect the streamed answer
+        tokens = []
+        search_results = {'assets': [], 'employees': []}
+        cached = False
+        async for event, data in events:
+            if event == 'results':
+                search_results = data
+            elif event in ('token', 'error'):
+                tokens.append(data)
+            elif event == 'done':
+                cached = data.get('cached', False)
+        return JsonResponse({
+            'success': True,
+            'response': ''.join(tokens) or 'I apologize, but I could not generate a response.',
+            'search_results': search_results,
+            'cached': cached,
+        })
+    
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': f'AI processing error: {str(e)}'
+        })
+
+def ai_chat_sync(request):
+    """ai_chat for WSGI: each answer holds this worker thread until it is complete"""
     if request.method == 'POST':
         try:
-            # Support both JSON and form-encoded payloads
-            query = ''
-            current_page = ''
-            if request.content_type and 'application/json' in request.content_type:
-                try:
-                    import json as _json
-                    body = _json.loads(request.body or '{}')
-                    query = (body.get('message') or body.get('query') or '').strip()
-                    current_page = body.get('current_page', '')
-                except Exception:
-                    query = ''
-            else:
-                query = (request.POST.get('message') or request.POST.get('query') or '').strip()
-                current_page = request.POST.get('current_page', '')
+            query, current_page, no_cache = _parse_ai_chat_request(request)
             
             if not query:
                 return JsonResponse({'error': 'Please enter a question'})
@@ -3808,13 +3914,18 @@ def ai_chat(request):
             # Initialize AI assistant
             ai = AssetTrackAI()
             
+            # Stream the answer as Server-Sent Events while Ollama generates it
+            if 'text/event-stream' in request.headers.get('Accept', ''):
+                return ai_chat_stream_response(ai.stream_query(query, current_page, request.user, use_cache=not no_cache))
+            
             # Process query
-            result = ai.process_query(query, current_page, request.user)
+            result = ai.process_query(query, current_page, request.user, use_cache=not no_cache)
             
             return JsonResponse({
                 'success': True,
                 'response': result['response'],
-                'search_results': result['search_results']
+                'search_results': result['search_results'],
+                'cached': result.get('cached', False),
             })
             
         except Exception as e:
@@ -3825,16 +3936,55 @@ def ai_chat(request):
     
     return render(request, 'ai_chat.html')
 
+def ai_chat_stream_response(events):
+    """
+    StreamingHttpResponse sending the (event, data) pairs of
+    AssetTrackAI.stream_query, or of ai_gateway.stream_answer (async), as SSE
+    """
+    from django.http import StreamingHttpResponse
+    from django.core.serializers.json import DjangoJSONEncoder
+    
+    def format_event(event, data):
+        return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+    
+    if hasattr(events, '__aiter__'):
+        async def event_stream():
+            async for event, data in events:
+                yield format_event(event, data)
+    else:
+        def event_stream():
+            for event, data in events:
+                yield format_event(event, data)
+    
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required
+@user_passes_test(lambda u: u.is_superuser)
+def ai_cache_metrics(request):
+    """AI answer cache hit/miss statistics"""
+    try:
+        hours = max(1, min(int(request.GET.get('hours', 24)), 168))
+    except ValueError:
+        hours = 24
+    return JsonResponse(get_ai_cache_metrics(hours))
+
+
 @login_required
 def ai_quick_insights(request):
     """Get quick AI insights about the system"""
     try:
-        ai = AssetTrackAI()
-        insights = ai.get_quick_insights()
+        # Precomputed by the compute_insights command; a single cached read
+        insights = get_latest_insights()
         
         return JsonResponse({
             'success': True,
-            'insights': insights
+            'insights': insights['messages'],
+            'signals': insights['signals'],
+            'computed_at': insights['computed_at'],
         })
     except Exception as e:
         return JsonResponse({
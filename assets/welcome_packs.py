@@ -0,0 +1,172 @@
+"""
+Welcome pack emails and cohort generation.
+
+The employee and IT emails are rendered from ``templates/emails/welcome_*``,
+both for single packs (views.send_welcome_pack_emails) and for cohorts.
+
+``create_welcome_pack_cohort`` prepares packs for a whole onboarding week at
+once: upcoming starters come from the Azure AD sync (``Employee.start_date``
+is filled from Graph ``employeeHireDate``), and all packs, public tokens and
+outbound emails are written with one ``bulk_create`` each, followed by a single
+summary notification. The emails are delivered in batches by the
+deliver_emails worker.
+"""
+
+import logging
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.template.loader import get_template
+from django.urls import reverse
+from django.utils import timezone
+
+from .inventory_snapshot import bump_data_generation
+from .models import Employee, Notification, OutboundEmail, WelcomePack, WelcomePackToken
+
+logger = logging.getLogger(__name__)
+
+TOKEN_LIFETIME = timedelta(days=30)
+
+
+def get_it_notification_email():
+    return getattr(settings, 'WELCOME_PACK_IT_EMAIL', 'it-office-assettrack@harren-group.com')
+
+
+def build_employee_welcome_email(welcome_pack, welcome_pack_url):
+    """(subject, text, html) of the welcome email to the new employee"""
+    context = {'welcome_pack': welcome_pack, 'welcome_pack_url': welcome_pack_url}
+    return (
+        f"Welcome to Harren Group - {welcome_pack.employee.name}",
+        get_template('emails/welcome_employee.txt').render(context),
+        get_template('emails/welcome_employee.html').render(context),
+    )
+
+
+def build_it_notification_email(welcome_pack):
+    """(subject, text, html) of the setup request to the IT team"""
+    context = {'welcome_pack': welcome_pack}
+    return (
+        f"New Employee Setup Required - {welcome_pack.employee.name}",
+        get_template('emails/welcome_it.txt').render(context),
+        get_template('emails/welcome_it.html').render(context),
+    )
+
+
+def get_upcoming_starters(days_ahead=14, today=None):
+    """Active employees starting within ``days_ahead`` days that have no active welcome pack yet"""
+    today = today or timezone.localdate()
+    has_pack = WelcomePack.objects.filter(employee=OuterRef('pk'), is_active=True)
+    return Employee.objects.filter(
+        is_active=True,
+        start_date__gte=today,
+        start_date__lte=today + timedelta(days=days_ahead),
+    ).exclude(
+        Q(email__isnull=True) | Q(email='')
+    ).filter(
+        ~Exists(has_pack)
+    ).order_by('start_date', 'name')
+
+
+def create_welcome_pack_cohort(employees, generated_by, pack_defaults=None, send_emails=True):
+    """
+    Create welcome packs for ``employees`` (skipping those that already have an
+    active pack), with public tokens and, if ``send_emails``, queued employee
+    and IT emails. ``pack_defaults`` sets the shared WelcomePack fields (IT
+    contact, department info, notes). Returns the created packs.
+    """
+    pack_defaults = pack_defaults or {}
+    now = timezone.now()
+    employees = list(employees)
+    already_have_pack = set(
+        WelcomePack.objects.filter(employee__in=employees, is_active=True).values_list('employee_id', flat=True)
+    )
+    employees = [employee for employee in employees if employee.id not in already_have_pack]
+    if not employees:
+        return []
+
+    with transaction.atomic():
+        # bulk_create skips WelcomePack.save(), so its defaults are applied here
+        packs = [
+            WelcomePack(
+                employee=employee,
+                employee_email=employee.email,
+                teams_username=employee.azure_ad_username or '',
+                teams_email=employee.email,
+                office_location=employee.get_office_location_display(),
+                start_date=employee.start_date,
+                generated_by=generated_by,
+                **pack_defaults,
+            )
+            for employee in employees
+        ]
+        WelcomePack.objects.bulk_create(packs, batch_size=500)
+
+        tokens = [
+            WelcomePackToken(
+                welcome_pack=pack,
+                token=secrets.token_urlsafe(32),
+                expires_at=now + TOKEN_LIFETIME,
+            )
+            for pack in packs
+        ]
+        WelcomePackToken.objects.bulk_create(tokens, batch_size=500)
+
+        if send_emails:
+            OutboundEmail.objects.bulk_create(_build_cohort_emails(packs, tokens, now), batch_size=500)
+
+        start_dates = sorted(pack.start_date for pack in packs if pack.start_date)
+        message = f"{len(packs)} welcome pack(s) created"
+        if start_dates:
+            message += f" for starters between {start_dates[0]:%d.%m.%Y} and {start_dates[-1]:%d.%m.%Y}"
+        if send_emails:
+            message += f"; {len(packs) * 2} email(s) queued"
+        Notification.objects.create(
+            user=generated_by,
+            title='Welcome pack cohort created',
+            message=message + '.',
+            notification_type='welcome_pack_sent',
+            priority='medium',
+        )
+
+    # bulk_create sends no signals
+    bump_data_generation([])
+    logger.info(f"Created welcome pack cohort of {len(packs)} employee(s)")
+    return packs
+
+
+def _build_cohort_emails(packs, tokens, now):
+    domain = getattr(settings, 'EMAIL_DOMAIN', settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else '172.27.2.43')
+    from_email = settings.DEFAULT_FROM_EMAIL
+    it_email = get_it_notification_email()
+
+    emails = []
+    for pack, token in zip(packs, tokens):
+        url = f"https://{domain}{reverse('assets:public_welcome_pack_detail', args=[pack.id, token.token])}"
+        subject, text, html = build_employee_welcome_email(pack, url)
+        emails.append(OutboundEmail(
+            idempotency_key=f"welcome_employee:{pack.id}",
+            kind='welcome_employee',
+            from_email=from_email,
+            to=[pack.employee_email],
+            subject=subject,
+            body_text=text,
+            body_html=html,
+            welcome_pack=pack,
+            next_attempt_at=now,
+        ))
+        subject, text, html = build_it_notification_email(pack)
+        emails.append(OutboundEmail(
+            idempotency_key=f"welcome_it:{pack.id}",
+            kind='welcome_it',
+            from_email=from_email,
+            to=[it_email],
+            subject=subject,
+            body_text=text,
+            body_html=html,
+            welcome_pack=pack,
+            next_attempt_at=now,
+        ))
+    return emails
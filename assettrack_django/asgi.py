@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'assettrack_django.settings')
 
 application = get_asgi_application()
+
+# Served only by the AI process (assettrack-ai.service)
+from assets.ai_gateway import require_shared_cache  # noqa: E402
+
+require_shared_cache()
@@ -169,6 +169,20 @@ STATICFILES_FINDERS = [
     'django.contrib.staticfiles.finders.AppDirectoriesFinder',
 ]
 
+# Media files (locally cached employee photos etc.)
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Content-addressed employee photo store, filled by the Azure AD sync.
+# Files never change once written, so nginx can serve them with long expiry.
+EMPLOYEE_PHOTO_ROOT = os.path.join(MEDIA_ROOT, 'employee_photos')
+EMPLOYEE_PHOTO_URL = MEDIA_URL + 'employee_photos/'
+EMPLOYEE_PHOTO_MAX_AGE = int(os.getenv('EMPLOYEE_PHOTO_MAX_AGE', 7 * 24 * 3600))  # Re-validate against Azure AD weekly
+
+# Generated handover PDFs, cached per handover version. Kept outside MEDIA_ROOT
+# because nginx serves /media/ without authentication.
+HANDOVER_PDF_ROOT = os.path.join(BASE_DIR, 'private', 'handover_pdfs')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -187,6 +201,28 @@ MESSAGE_STORAGE = 'django.contrib.messages.storage.session.SessionStorage'
 # Microsoft Graph backend for real email delivery
 EMAIL_BACKEND = 'assets.microsoft_graph_email.MicrosoftGraphEmailBackend'
 DEFAULT_FROM_EMAIL = 'it-office-assettrack@harren-group.com'
+GRAPH_EMAIL_SENDER = 'it-office-assettrack@harren-group.com'  # Mailbox used for Graph sendMail
+GRAPH_EMAIL_TIMEOUT = (5, 30)  # (connect, read) seconds per Graph request
+GRAPH_EMAIL_MAX_RETRIES = 3  # Retries for throttled (429) or unavailable batches
+GRAPH_HTTP_POOL_SIZE = 10  # Keep-alive connections to graph.microsoft.com per process
+
+# Outbound email queue (assets/email_queue.py, drained by `manage.py deliver_emails --loop`)
+OUTBOUND_EMAIL_BACKEND = None  # None = use EMAIL_BACKEND
+OUTBOUND_EMAIL_RETRY_BASE = 60  # First retry after 1 minute, doubled on every attempt
+OUTBOUND_EMAIL_RETRY_MAX = 6 * 3600  # Never wait more than 6 hours between attempts
+OUTBOUND_EMAIL_DEDUPE_SECONDS = 300  # Collapse identical enqueues within 5 minutes of delivery
+OUTBOUND_EMAIL_SENDING_TIMEOUT = 600  # Requeue emails stuck in 'sending' after 10 minutes
+
+# Handover signature reminders (`manage.py send_handover_reminders`, e.g. daily from cron)
+HANDOVER_REMINDER_AFTER_DAYS = 3  # First reminder once a handover has been pending this long
+HANDOVER_REMINDER_INTERVAL_DAYS = 3  # Minimum gap between reminders for the same handover
+HANDOVER_REMINDER_MAX = 3  # Stop reminding after this many reminders
+
+# Mailbox that receives the new employee setup requests for welcome packs
+WELCOME_PACK_IT_EMAIL = 'it-office-assettrack@harren-group.com'
+
+# Public handover links are signed with SECRET_KEY and expire after this many days
+PUBLIC_HANDOVER_LINK_DAYS = 30
 
 # AI Assistant settings - Ollama (Free, Self-hosted)
 # Support multiple env var names for robustness
@@ -200,6 +236,73 @@ OLLAMA_MODEL = (
     or os.getenv('AI_MODEL')
     or 'gemma2:2b'
 )
+# Keep the model loaded between chat requests so answers start streaming right away
+OLLAMA_KEEP_ALIVE = os.getenv('OLLAMA_KEEP_ALIVE', '30m')
+
+# AI answer cache (per worker process). Answers are also dropped as soon as
+# assets, employees, handovers or welcome packs change.
+AI_CACHE_ENABLED = os.getenv('AI_CACHE_ENABLED', 'True').lower() == 'true'
+AI_CACHE_TTL = 3600
+AI_CACHE_MAX_ENTRIES = 256
+
+# Local retrieval index that puts the records most relevant to a question into
+# the AI prompt (see assets/retrieval_index.py)
+AI_INDEX_PATH = os.path.join(BASE_DIR, 'private', 'ai_index.npz')
+AI_CONTEXT_MAX_RECORDS = 8
+AI_CONTEXT_TOKEN_BUDGET = 600
+
+# AI gateway (assets/ai_gateway.py): the ASGI process that serves the chat
+# (assettrack-ai.service) queues questions for Ollama instead of tying up
+# the WSGI worker threads
+AI_GATEWAY_CONCURRENCY = int(os.getenv('AI_GATEWAY_CONCURRENCY', '2'))
+AI_GATEWAY_MAX_QUEUE = 20
+AI_RATE_LIMIT_PER_MINUTE = 10
+AI_WARMUP_INTERVAL = 600
+
+# Insights computed by the compute_insights command (see assets/insights.py)
+INSIGHTS_EXPIRY_DAYS = 30
+INSIGHTS_UNSIGNED_HANDOVER_DAYS = 7
+INSIGHTS_STALE_SIGNIN_DAYS = 30
+INSIGHTS_RETENTION_DAYS = 30
+
+# Cache - shared state such as the Microsoft Graph access token lives here.
+# Set REDIS_URL so all gunicorn workers share one cache; otherwise each
+# worker process keeps its own in-memory cache. Production needs it: the AI
+# process (assettrack-ai.service) refuses to start without a shared cache.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'assettrack',
+        }
+    }
+
+# Notification streams (Server-Sent Events) end after this many seconds and
+# the browser reconnects. nginx routes them to the ASGI process
+# (assettrack-ai.service); beyond the per-process limits pages fall back to
+# polling the unread count. The WSGI limit keeps runserver and gunicorn
+# threads free for page requests.
+NOTIFICATION_STREAM_SECONDS = 25
+NOTIFICATION_ASGI_MAX_STREAMS = 500
+NOTIFICATION_WSGI_MAX_STREAMS = 2
+
+# `manage.py prune_notifications` deletes read notifications older than this
+NOTIFICATION_RETENTION_DAYS = 90
+
+# Buffer public token access counts in the cache and flush them with
+# `manage.py flush_token_access`. Needs the shared Redis cache; with the
+# per-process LocMem cache every access is written directly.
+TOKEN_ACCESS_BUFFERING = bool(os.getenv('REDIS_URL'))
+
+# Microsoft Graph token provider (assets/graph_auth.py)
+GRAPH_TOKEN_REFRESH_MARGIN = 300  # Refresh tokens 5 minutes before they expire
 
 # Azure AD credentials for Microsoft Graph
 AZURE_TENANT_ID = os.getenv('AZURE_TENANT_ID')
@@ -18,6 +18,8 @@ from django.contrib import admin
 from django.urls import path, include
 from django.contrib.auth import views as auth_views
 from django.contrib.auth.views import LogoutView
+from django.conf import settings
+from django.conf.urls.static import static
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -25,3 +27,6 @@ urlpatterns = [
     path('accounts/', include('allauth.urls')),
     path('', include('assets.urls')),
 ]
+
+# Serve cached employee photos directly in development (nginx serves /media/ in production)
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,93 @@
+/*
+ * Streaming client for the AI chat endpoint.
+ *
+ * ai_chat answers requests sent with "Accept: text/event-stream" as
+ * Server-Sent Events while the model generates the reply:
+ *   event: results  data: {assets: [...], employees: [...]}
+ *   event: queued   data: {position: n}  (AI gateway only, while waiting in line)
+ *   event: token    data: "<next piece of text>"
+ *   event: done     data: {cached, eval_count, total_duration_ms}
+ *   event: error    data: "<message>"
+ * Pass noCache to ask for a fresh answer instead of a cached one.
+ * EventSource can't POST, so the body is read with fetch and parsed here.
+ * Returns an AbortController; aborting closes the connection and the server
+ * stops generating.
+ */
+function streamAIChat(url, query, currentPage, handlers, noCache = false) {
+    const controller = new AbortController();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let finished = false;
+
+    function dispatch(frame) {
+        let event = 'message';
+        const data = [];
+        frame.split('\n').forEach(line => {
+            if (line.startsWith('event:')) {
+                event = line.slice(6).trim();
+            } else if (line.startsWith('data:')) {
+                data.push(line.slice(5).replace(/^ /, ''));
+            }
+        });
+        if (!data.length) {
+            return;
+        }
+        const payload = JSON.parse(data.join('\n'));
+        if (event === 'done' || event === 'error') {
+            finished = true;
+        }
+        const handler = handlers[event];
+        if (handler) {
+            handler(payload);
+        }
+    }
+
+    function read(reader) {
+        return reader.read().then(({done, value}) => {
+            if (done) {
+                if (!finished && handlers.error) {
+                    handlers.error('The connection to the AI assistant was interrupted. Please try again.');
+                }
+                return;
+            }
+            buffer += decoder.decode(value, {stream: true});
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                dispatch(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+            }
+            return read(reader);
+        });
+    }
+
+    fetch(url, {
+        method: 'POST',
+        headers: {
+            'Accept': 'text/event-stream',
+            'Content-Type': 'application/x-www-form-urlencoded',
+            'X-CSRFToken': getCookie('csrftoken')
+        },
+        body: `query=${encodeURIComponent(query)}&current_page=${encodeURIComponent(currentPage)}${noCache ? '&no_cache=1' : ''}`,
+        signal: controller.signal
+    })
+    .then(response => {
+        const contentType = response.headers.get('Content-Type') || '';
+        if (!contentType.startsWith('text/event-stream')) {
+            // Validation errors still come back as JSON
+            return response.json().then(data => {
+                finished = true;
+                if (handlers.error) {
+                    handlers.error(data.error || 'Unexpected response from the AI assistant');
+                }
+            });
+        }
+        return read(response.body.getReader());
+    })
+    .catch(error => {
+        if (error.name !== 'AbortError' && handlers.error) {
+            handlers.error(error.message);
+        }
+    });
+
+    return controller;
+}
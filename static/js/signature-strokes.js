@@ -0,0 +1,44 @@
+/*
+ * Compact vector encoding for signature pads.
+ *
+ * Strokes are sent to save_signature as
+ *   {v: 1, w: <width>, h: <height>, s: [[x0, y0, dx1, dy1, ...], ...]}
+ * with integer coordinates relative to the canvas' on-screen box: the first
+ * point of each stroke is absolute, the rest are deltas to the previous point.
+ * Points closer than one pixel to the previous one are dropped.
+ */
+function encodeSignatureStrokes(strokes, width, height) {
+    const w = Math.max(1, Math.round(width));
+    const h = Math.max(1, Math.round(height));
+    const clamp = (value, max) => Math.min(max, Math.max(0, Math.round(value)));
+
+    const encoded = [];
+    strokes.forEach(points => {
+        if (!points.length) {
+            return;
+        }
+        let lastX = clamp(points[0].x, w);
+        let lastY = clamp(points[0].y, h);
+        const stroke = [lastX, lastY];
+        for (let i = 1; i < points.length; i++) {
+            const x = clamp(points[i].x, w);
+            const y = clamp(points[i].y, h);
+            if (x === lastX && y === lastY) {
+                continue;
+            }
+            stroke.push(x - lastX, y - lastY);
+            lastX = x;
+            lastY = y;
+        }
+        encoded.push(stroke);
+    });
+
+    return {v: 1, w: w, h: h, s: encoded};
+}
+
+/* Convert signature_pad's toData() point groups into encoded strokes */
+function encodeSignaturePad(signaturePad, canvas) {
+    const rect = canvas.getBoundingClientRect();
+    const strokes = signaturePad.toData().map(group => group.points || []);
+    return encodeSignatureStrokes(strokes, rect.width, rect.height);
+}